@@ -0,0 +1,224 @@
+"""
+Nearest-neighbour search over the background embeddings ("training drawings
+most similar to yours").
+
+Below ANN_MIN_ROWS background rows (the shipped CSV has 180) the search is
+exact: one matrix product over the cached embedding matrix, well under a
+millisecond. Above it, an NN-descent index (pynndescent) is used, persisted
+next to the CSV:
+
+    background_embedding_5per_class.nnd.joblib      the prepared index
+    background_embedding_5per_class.nnd.meta.json   source sha256, metric, parameters
+
+and reused while the sidecar matches the CSV contents and the configured
+parameters. Building or even loading it takes tens of seconds (numba
+compilation), so it is prepared in a background thread on first use while
+queries are answered exactly meanwhile; nothing of it runs at startup.
+Under numba's TBB threading layer a build on a non-main thread can hang
+interpreter exit: run large indexes with NUMBA_THREADING_LAYER=workqueue or omp.
+benchmarks/ann_recall.py measures recall against brute force.
+"""
+
+import os
+import json
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import joblib
+
+from config import ANN_METRIC, ANN_N_NEIGHBORS, ANN_MAX_K, ANN_MIN_ROWS
+from metrics import stage_timer
+
+_exact = None
+_index = None
+_index_lock = threading.Lock()
+_index_thread = None
+
+
+def index_paths(raw_embedding_csv: str) -> Dict[str, str]:
+    base = os.path.splitext(raw_embedding_csv)[0]
+    return {"index": base + ".nnd.joblib", "meta": base + ".nnd.meta.json"}
+
+
+class ExactIndex:
+    """Brute-force k-NN over background embedding rows (same interface as BackgroundIndex)."""
+
+    def __init__(self, matrix: np.ndarray, classes: np.ndarray, metric: str = ANN_METRIC):
+        if metric not in ("cosine", "euclidean"):
+            raise ValueError(f"Exact search not implemented for metric {metric}")
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        if metric == "cosine":
+            self.matrix /= np.maximum(np.linalg.norm(self.matrix, axis=1, keepdims=True), 1e-12)
+        self.classes = np.asarray(classes)
+        self.meta = {"metric": metric, "num_rows": int(len(matrix)), "dim": int(matrix.shape[1]), "exact": True}
+
+    @property
+    def dim(self) -> int:
+        return int(self.meta["dim"])
+
+    def query(self, embeddings: np.ndarray, k: int = 5) -> Dict[str, np.ndarray]:
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if embeddings.shape[1] != self.dim:
+            raise ValueError(f"Embedding has {embeddings.shape[1]} dimensions, index has {self.dim}")
+        k = max(1, min(k, self.meta["num_rows"]))
+        with stage_timer("ann_query"):
+            if self.meta["metric"] == "cosine":
+                norms = np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+                distances = 1.0 - (embeddings / norms) @ self.matrix.T
+            else:
+                squared = (embeddings ** 2).sum(1)[:, None] + (self.matrix ** 2).sum(1)[None, :] \
+                    - 2 * embeddings @ self.matrix.T
+                distances = np.sqrt(np.maximum(squared, 0))
+            nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            order = np.take_along_axis(distances, nearest, axis=1).argsort(axis=1)
+            indices = np.take_along_axis(nearest, order, axis=1)
+        return {"indices": indices, "distances": np.take_along_axis(distances, indices, axis=1)}
+
+
+class BackgroundIndex:
+    """k-NN index over background embedding rows, with their class labels."""
+
+    def __init__(self, index: Any, classes: np.ndarray, meta: Dict[str, Any]):
+        self.index = index
+        self.classes = classes
+        self.meta = meta
+
+    @property
+    def dim(self) -> int:
+        return int(self.meta["dim"])
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, classes: np.ndarray, metric: str = ANN_METRIC,
+              n_neighbors: int = ANN_N_NEIGHBORS, random_state: int = 42,
+              meta: Optional[Dict[str, Any]] = None) -> "BackgroundIndex":
+        from pynndescent import NNDescent
+
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        index = NNDescent(
+            matrix,
+            metric=metric,
+            n_neighbors=min(n_neighbors, len(matrix) - 1),
+            random_state=random_state,
+            low_memory=True,
+        )
+        index.prepare()    # search graph built now instead of on the first query
+        meta = {
+            **(meta or {}),
+            "metric": metric,
+            "n_neighbors": n_neighbors,
+            "num_rows": int(len(matrix)),
+            "dim": int(matrix.shape[1]),
+        }
+        return cls(index, np.asarray(classes), meta)
+
+    def save(self, index_path: str, meta_path: str) -> None:
+        # Written to temporary files and renamed: other workers may load concurrently
+        joblib.dump({"index": self.index, "classes": self.classes}, index_path + ".tmp")
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(index_path + ".tmp", index_path)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def load(cls, index_path: str, meta_path: str) -> "BackgroundIndex":
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        stored = joblib.load(index_path)
+        return cls(stored["index"], stored["classes"], meta)
+
+    def query(self, embeddings: np.ndarray, k: int = 5) -> Dict[str, np.ndarray]:
+        """Batch query: {"indices": (n, k), "distances": (n, k)}."""
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if embeddings.shape[1] != self.dim:
+            raise ValueError(f"Embedding has {embeddings.shape[1]} dimensions, index has {self.dim}")
+        k = max(1, min(k, self.meta["num_rows"]))
+        with stage_timer("ann_query"):
+            indices, distances = self.index.query(embeddings, k=k)
+        return {"indices": indices, "distances": distances}
+
+
+def load_or_build_index(params: Dict[str, Any], metric: str = ANN_METRIC,
+                        n_neighbors: int = ANN_N_NEIGHBORS) -> BackgroundIndex:
+    """Load the persisted index if it matches the CSV and parameters, else build and save it."""
+    from umap_auto import load_background_embeddings, _file_sha256
+
+    csv_path = params["raw_embedding_csv"]
+    paths = index_paths(csv_path)
+    digest = _file_sha256(csv_path)
+    expected = {"source_sha256": digest, "metric": metric, "n_neighbors": n_neighbors}
+
+    if os.path.exists(paths["index"]) and os.path.exists(paths["meta"]):
+        try:
+            index = BackgroundIndex.load(paths["index"], paths["meta"])
+            if all(index.meta.get(k) == v for k, v in expected.items()):
+                print(f"[ANN] Loaded index from {paths['index']} ({index.meta['num_rows']} rows)")
+                return index
+        except Exception as e:
+            print(f"[ANN] Could not load {paths['index']}: {e}")
+
+    background = load_background_embeddings(
+        csv_path,
+        feature_cols=params["feature_cols"],
+        bg_class_col=params["bg_class_col"],
+        normalize_class_space=params["normalize_class_space"],
+    )
+    with stage_timer("ann_build"):
+        index = BackgroundIndex.build(
+            background["matrix"], background["classes"], metric=metric, n_neighbors=n_neighbors,
+            meta={"source": os.path.basename(csv_path), "source_sha256": digest},
+        )
+    try:
+        index.save(paths["index"], paths["meta"])
+        print(f"[ANN] Built and saved index to {paths['index']} ({index.meta['num_rows']} rows)")
+    except OSError as e:
+        print(f"[ANN] Could not save index to {paths['index']}: {e}")
+    return index
+
+
+def _prepare_ann_index(params: Dict[str, Any]) -> None:
+    global _index
+    try:
+        _index = load_or_build_index(params)
+    except Exception as e:
+        print(f"[ANN] Index unavailable, staying on exact search: {e}")
+
+
+def get_background_index():
+    """
+    Process-wide search over the UMAP background embeddings: exact, or the
+    NN-descent index once it is ready when there are ANN_MIN_ROWS rows or more.
+    """
+    global _exact, _index_thread
+    if _index is not None:
+        return _index
+    with _index_lock:
+        if _exact is None:
+            from plotting_api import UMAP_ARTIFACT_PARAMS as P
+            from umap_auto import load_background_embeddings
+            background = load_background_embeddings(
+                P["raw_embedding_csv"], feature_cols=P["feature_cols"],
+                bg_class_col=P["bg_class_col"], normalize_class_space=P["normalize_class_space"],
+            )
+            _exact = ExactIndex(background["matrix"], background["classes"])
+            if len(background["matrix"]) >= ANN_MIN_ROWS:
+                _index_thread = threading.Thread(target=_prepare_ann_index, args=(P,), daemon=True)
+                _index_thread.start()
+    return _index if _index is not None else _exact
+
+
+def similar_drawings(embeddings: List[List[float]], k: int = 5) -> List[List[Dict[str, Any]]]:
+    """
+    k nearest background drawings of each drawing embedding, in one batch
+    query (blocking: call off the event loop).
+    """
+    index = get_background_index()
+    k = max(1, min(int(k), ANN_MAX_K))
+    result = index.query(np.asarray(embeddings), k)
+    return [
+        [
+            {"rank": rank + 1, "row": int(row), "class": str(index.classes[row]), "distance": float(dist)}
+            for rank, (row, dist) in enumerate(zip(rows, dists))
+        ]
+        for rows, dists in zip(result["indices"], result["distances"])
+    ]
@@ -1,26 +1,89 @@
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Request
+from fastapi.responses import FileResponse, Response, JSONResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 import json
 import numpy as np
 import os
 import base64
+import asyncio
 
 
 # Import utility functions and global objects
+# (lightweight: matplotlib and TensorFlow are only loaded by init_resources)
 from redis_utils import get_redis
-from ml_utils import process_image_to_model_input, CLASSES, load_model
-from game_logic import build_rounds
 from plotting_api import plotting_api
-import pandas as pd
+import plot_jobs
+import leaderboard
+from render_pool import RenderPoolBusy
+from image_output import normalize_output, mime_type, to_base64, DEFAULT_TIER, DEFAULT_FORMAT
+from ml_utils import process_image_to_model_input, CLASSES, model_registry, model_version_id
+import model_rollout
+from game_logic import build_rounds
+from config import NUM_ROUNDS, ANN_MAX_K, MODEL_PATH, UMAP_BACKGROUND_SAMPLES_PER_CLASS
+from startup import startup_report
+from memory_stats import process_memory
+from metrics import stage_timer, record_batch, render_latest
+from profiling import is_trusted, profile_stats_text
+from realtime_queue import realtime_queue
+from inference_scheduler import inference_scheduler
+from ann_index import similar_drawings
 
 router = APIRouter()
 
-print("[API] Loading models...")
-model, embed_model = load_model()
-print(f"[API] Model loading completed. Model loaded: {model is not None}")
+
+def init_resources(report=startup_report):
+    """
+    Staged startup, run from the FastAPI lifespan. Order matters: render
+    workers are forked after matplotlib is imported (shared with the parent)
+    but before TensorFlow is, which must not be forked.
+    """
+    if report.completed:
+        return
+
+    with report.stage("redis", "init"):
+        try:
+            get_redis().ping()
+        except Exception as e:
+            print(f"[API] Redis not reachable at startup: {e}")
+
+    report.import_modules("plotting (matplotlib/seaborn)", "umap_auto", "radar_chart_auto")
+
+    print("[API] Starting render workers...")
+    with report.stage("render pool", "init"):
+        plotting_api.render_pool.start()
+
+    report.import_modules("tensorflow/keras", "tensorflow", "keras")
+
+    print("[API] Loading models...")
+    with report.stage("model", "init"):
+        load_initial_model()
+    print(f"[API] Model loading completed. Model loaded: {model_registry.active is not None}")
+
+    report.completed = True
+    report.log()
+
+
+def load_initial_model():
+    """Serve the model last deployed to all workers (model:desired), else MODEL_PATH."""
+    paths = [MODEL_PATH]
+    try:
+        desired = model_rollout.read_desired(get_redis())
+        if desired and desired["active"]["path"] != MODEL_PATH:
+            paths.insert(0, desired["active"]["path"])
+    except Exception as e:
+        print(f"[API] Could not read the deployed model version: {e}")
+    for path in paths:
+        try:
+            # Not warmed here: the warm-up step times it
+            model_registry.activate(model_registry.load(path, warm=False))
+            return
+        except Exception as e:
+            print(f"[Model] Error loading model from {path}: {e}")
+
+def shutdown_resources():
+    plotting_api.render_pool.shutdown()
 
 
 class PlayerInfo(BaseModel):
@@ -56,10 +119,31 @@ async def create_session(player: PlayerInfo):
 class PredictRealtimeRequest(BaseModel):
     image_data: str
     choices: List[str] = []
-    
+    session_id: Optional[str] = None  # lets a newer frame of the session replace a waiting one
+
+def realtime_predictions(image_data: str, round_choices: List[str], session_id: Optional[str] = None):
+    """Decode, preprocess and classify one preview frame (runs in a thread)."""
+    with stage_timer("base64"):
+        image_bytes = base64.b64decode(image_data)
+    with stage_timer("preprocess"):
+        processed_image = process_image_to_model_input(image_bytes)
+    input_tensor = np.expand_dims(processed_image, axis=0)
+    record_batch("classifier", len(input_tensor))
+    with model_registry.use(session_id) as version, stage_timer("inference"):
+        predictions = version.model.predict(input_tensor, verbose=0).squeeze()
+    if round_choices:
+        probs_map = {choice: float(predictions[CLASSES.index(choice)]) for choice in round_choices if choice in CLASSES}
+        total_prob = sum(probs_map.values())
+        if total_prob > 0:
+            for choice in probs_map:
+                probs_map[choice] /= total_prob
+    else:
+        probs_map = {class_name: float(predictions[i]) for i, class_name in enumerate(CLASSES)}
+    return probs_map
+
 @router.post("/api/predict-realtime")
 async def predict_realtime(data: PredictRealtimeRequest):
-    if not model:
+    if model_registry.active is None:
         raise HTTPException(status_code=500, detail="Model not loaded")
     try:
         image_data = data.image_data
@@ -68,23 +152,71 @@ async def predict_realtime(data: PredictRealtimeRequest):
             raise HTTPException(status_code=400, detail="No image data provided")
         if image_data.startswith('data:image'):
             image_data = image_data.split(',')[1]
-        import base64
-        image_bytes = base64.b64decode(image_data)
-        processed_image = process_image_to_model_input(image_bytes)
-        input_tensor = np.expand_dims(processed_image, axis=0)
-        predictions = model.predict(input_tensor, verbose=0).squeeze()
-        if round_choices:
-            probs_map = {choice: float(predictions[CLASSES.index(choice)]) for choice in round_choices if choice in CLASSES}
-            total_prob = sum(probs_map.values())
-            if total_prob > 0:
-                for choice in probs_map:
-                    probs_map[choice] /= total_prob
-        else:
-            probs_map = {class_name: float(predictions[i]) for i, class_name in enumerate(CLASSES)}
-        return {"predictions": probs_map, "success": True}
+        # Latest frame wins per session; skipped when the inference backlog is full
+        queued = await realtime_queue.run(data.session_id, realtime_predictions, image_data, round_choices, data.session_id)
+        # next_poll_ms: when the client should send its next frame, given the current load
+        next_poll_ms = realtime_queue.advised_poll_ms()
+        if queued["status"] == "skipped":
+            return {"predictions": {}, "success": False, "skipped": True, "reason": queued["reason"], "next_poll_ms": next_poll_ms}
+        return {"predictions": queued["result"], "success": True, "next_poll_ms": next_poll_ms}
     except Exception as e:
         return {"predictions": {}, "success": False, "error": str(e)}
 
+def final_predictions(image_data: bytes, round_choices: List[str], session_id: Optional[str] = None):
+    """Predictions, embedding and model version of a submitted drawing (runs in a thread)."""
+    # Process image using the same method as predict-realtime
+    with stage_timer("preprocess"):
+        processed_image = process_image_to_model_input(image_data)
+    input_tensor = np.expand_dims(processed_image, axis=0)
+    # Both outputs come from the same version, even if another is swapped in meanwhile
+    with model_registry.use(session_id) as version:
+        probs_map, embedding = _classify_and_embed(version, input_tensor, round_choices)
+    return probs_map, embedding, version.version
+
+def _classify_and_embed(version, input_tensor: np.ndarray, round_choices: List[str]):
+    record_batch("classifier", len(input_tensor))
+    with stage_timer("inference"):
+        predictions = version.model.predict(input_tensor, verbose=0).squeeze()
+    
+    # Use identical prediction filtering logic as predict-realtime
+    if round_choices:
+        probs_map = {choice: float(predictions[CLASSES.index(choice)]) for choice in round_choices if choice in CLASSES}
+        total_prob = sum(probs_map.values())
+        if total_prob > 0:
+            for choice in probs_map:
+                probs_map[choice] /= total_prob
+    else:
+        probs_map = {class_name: float(predictions[i]) for i, class_name in enumerate(CLASSES)}
+    
+    # Generate embeddings (this is unique to predict endpoint)
+    embedding = []
+    if version.embed_model:
+        try:
+            record_batch("embedding", len(input_tensor))
+            with stage_timer("embedding"):
+                embed_output = version.embed_model.predict(input_tensor, verbose=0)
+            embedding = embed_output.flatten().tolist()
+        except Exception as e:
+            print(f"Error getting embedding: {e}")
+    return probs_map, embedding
+
+def store_drawing(r, drawing_data: dict, probs_map: dict, session_data: dict, total_rounds: int) -> None:
+    """
+    Everything /api/predict writes for a scored drawing: the drawing hash, the
+    session's drawing list, invalidation of the session's cached plots and
+    the leaderboard update.
+    """
+    session_id, round_no = drawing_data["session_id"], drawing_data["round"]
+    drawing_id = f"drawing:{session_id}:{round_no}"
+    r.hset(drawing_id, mapping=drawing_data)
+    r.lpush(f"session:{session_id}:drawings", drawing_id)
+    plotting_api.invalidate_session_plots(session_id)
+    try:
+        leaderboard.record_drawing(r, session_id, round_no, drawing_data["prompt"], probs_map, session_data,
+                                   total_rounds)
+    except Exception as e:
+        print(f"Error updating leaderboard: {e}")
+
 @router.post("/api/predict")
 async def predict_drawing(
     session_id: str = Form(...),
@@ -95,7 +227,7 @@ async def predict_drawing(
     drawing: UploadFile = File(...),
     original_image_data: UploadFile = File(...),
 ):
-    if not model:
+    if model_registry.active is None:
         raise HTTPException(status_code=500, detail="Model not loaded")
     try:
         # Get session data to retrieve round choices
@@ -112,40 +244,20 @@ async def predict_drawing(
         original_image_data = await original_image_data.read()
         
         # Convert to base64 for consistent processing with predict-realtime
-        image_base64 = base64.b64encode(image_data).decode('utf-8')
-        original_image_base64 = base64.b64encode(original_image_data).decode('utf-8')
+        with stage_timer("base64"):
+            image_base64 = base64.b64encode(image_data).decode('utf-8')
+            original_image_base64 = base64.b64encode(original_image_data).decode('utf-8')
 
 
         # Use the same image processing logic as predict-realtime
         if not image_data:
             raise HTTPException(status_code=400, detail="No image data provided")
         
-        # Process image using the same method as predict-realtime
-        processed_image = process_image_to_model_input(image_data)
-        input_tensor = np.expand_dims(processed_image, axis=0)
-        predictions = model.predict(input_tensor, verbose=0).squeeze()
-        
-        # Use identical prediction filtering logic as predict-realtime
-        if round_choices:
-            probs_map = {choice: float(predictions[CLASSES.index(choice)]) for choice in round_choices if choice in CLASSES}
-            total_prob = sum(probs_map.values())
-            if total_prob > 0:
-                for choice in probs_map:
-                    probs_map[choice] /= total_prob
-        else:
-            probs_map = {class_name: float(predictions[i]) for i, class_name in enumerate(CLASSES)}
-        
-        # Generate embeddings (this is unique to predict endpoint)
-        embedding = []
-        if embed_model:
-            try:
-                embed_output = embed_model.predict(input_tensor, verbose=0)
-                embedding = embed_output.flatten().tolist()
-            except Exception as e:
-                print(f"Error getting embedding: {e}")
+        # Highest inference priority: queued previews never delay a final submission
+        probs_map, embedding, model_version = await inference_scheduler.run(
+            "final", final_predictions, image_data, round_choices, session_id)
         
         # Store data in Redis (unique to predict endpoint)
-        drawing_id = f"drawing:{session_id}:{round}"
         drawing_data = {
             "session_id": session_id,
             "round": round,
@@ -156,11 +268,16 @@ async def predict_drawing(
             "predictions": json.dumps(probs_map),
             "round_choices": json.dumps(round_choices),
             "embedding": json.dumps(embedding),
+            "model_version": model_version,
             "timestamp": datetime.now().isoformat(),
             "original_image_data": original_image_base64  # Store original image data for visualization
         }
-        r.hset(drawing_id, mapping=drawing_data)
-        r.lpush(f"session:{session_id}:drawings", drawing_id)
+        total_rounds = len(json.loads(session_data.get("rounds", "[]"))) if session_data else 0
+        store_drawing(r, drawing_data, probs_map, session_data, total_rounds or NUM_ROUNDS)
+        
+        # Final round: everything the score page needs is known, render plots now
+        if round >= (total_rounds or NUM_ROUNDS):
+            schedule_session_plots(session_id)
         
         # Return response in same format as predict-realtime (with additional embedding)
         return {
@@ -184,6 +301,31 @@ async def get_results(session_id: str):
     session_data["prompts"] = json.loads(session_data.get("prompts", "[]"))
     return {"session": session_data}
 
+@router.get("/api/leaderboard")
+async def get_leaderboard(n: int = 10, prompt: Optional[str] = None):
+    """Top n completed games, or the top n drawings of one prompt"""
+    if not 1 <= n <= 100:
+        raise HTTPException(status_code=400, detail="n must be between 1 and 100")
+    r = get_redis()
+    if prompt:
+        return {"prompt": prompt, "top": leaderboard.top_drawings(r, prompt, n)}
+    return {"top": leaderboard.top_games(r, n)}
+
+@router.get("/api/leaderboard/stats")
+async def get_leaderboard_stats():
+    """Drawings, completed games and average score per difficulty and age band"""
+    return leaderboard.group_stats(get_redis())
+
+@router.get("/api/leaderboard/{session_id}")
+async def get_session_standing(session_id: str):
+    """Total score, rank and percentile of a session, and the percentile of each drawing for its prompt"""
+    r = get_redis()
+    prompts = r.hget(f"session:{session_id}", "prompts")
+    if prompts is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    drawings = [{"round": i, "prompt": p} for i, p in enumerate(json.loads(prompts), 1)]
+    return leaderboard.session_standing(r, session_id, drawings)
+
 @router.get("/api/drawing/{session_id}")
 async def get_drawing(session_id: str):
     r = get_redis()
@@ -201,160 +343,351 @@ async def get_drawing(session_id: str):
     drawings.sort(key=lambda x: x["round"])
     return {"drawing": drawings}
 
+@router.get("/api/drawing/{session_id}/similar")
+async def get_similar_drawings(session_id: str, k: int = 5, round: Optional[int] = None):
+    """Background (training) drawings nearest to each of the session's drawings"""
+    if not 1 <= k <= ANN_MAX_K:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {ANN_MAX_K}")
+    r = get_redis()
+    drawing_ids = r.lrange(f"session:{session_id}:drawings", 0, -1)
+    if not drawing_ids:
+        raise HTTPException(status_code=404, detail="No drawings found for this session")
+
+    drawings, embeddings = [], []
+    for drawing_id in drawing_ids:
+        # Only the fields needed here, not the stored images
+        drawing_round, prompt, embedding = r.hmget(drawing_id, "round", "prompt", "embedding")
+        if drawing_round is None or (round is not None and int(drawing_round) != round):
+            continue
+        embedding = json.loads(embedding or "[]")
+        if embedding:
+            drawings.append({"round": int(drawing_round), "prompt": prompt})
+            embeddings.append(embedding)
+    if not embeddings:
+        raise HTTPException(status_code=404, detail="No embeddings found for this session")
+
+    try:
+        neighbors = await asyncio.to_thread(similar_drawings, embeddings, k)
+    except (ImportError, OSError) as e:
+        print(f"Similarity index unavailable: {e}")
+        raise HTTPException(status_code=503, detail="Similarity index unavailable")
+    except ValueError as e:
+        # Stored by a model version whose embedding space differs from the background's
+        raise HTTPException(status_code=422, detail=f"Drawing embeddings do not match the background: {e}")
+    for drawing, found in zip(drawings, neighbors):
+        drawing["similar"] = found
+    drawings.sort(key=lambda x: x["round"])
+    return {"session_id": session_id, "k": k, "drawings": drawings}
+
+def collect_session_embeddings(r, session_id: str):
+    """Return (embeddings matrix, prompts) for a session's stored drawings."""
+    # Get all drawing IDs for this session
+    drawing_ids = r.lrange(f"session:{session_id}:drawings", 0, -1)
+    if not drawing_ids:
+        raise HTTPException(status_code=404, detail="No drawings found for this session")
+
+    # Collect embeddings and prompts
+    embeddings, prompts = [], []
+    for drawing_id in drawing_ids:
+        drawing_data = r.hgetall(drawing_id)
+        if drawing_data and "embedding" in drawing_data and "prompt" in drawing_data:
+            emb = json.loads(drawing_data.get("embedding", "[]"))
+            if emb:  # Only add non-empty embeddings
+                embeddings.append(emb)
+                prompts.append(drawing_data.get("prompt", "unknown"))
+
+    if not embeddings:
+        raise HTTPException(status_code=404, detail="No embeddings found for this session")
+    return np.asarray(embeddings, dtype=np.float64), prompts
+
+@router.get("/api/umap-background")
+async def get_umap_background(request: Request, samples_per_class: int = UMAP_BACKGROUND_SAMPLES_PER_CLASS):
+    """Packed background point cloud for client-side UMAP rendering (float32 xy + uint8 cluster)"""
+    # Every value would be reduced and cached for the life of the worker: serve the configured one only
+    if samples_per_class != UMAP_BACKGROUND_SAMPLES_PER_CLASS:
+        raise HTTPException(status_code=400, detail=f"samples_per_class must be {UMAP_BACKGROUND_SAMPLES_PER_CLASS}")
+    # The first call reduces and packs ~67k rows: off the event loop
+    asset = await asyncio.to_thread(
+        plotting_api.get_umap_background_asset, max_background_samples_per_class=samples_per_class
+    )
+    headers = {
+        "ETag": f'"{asset["etag"]}"',
+        "Cache-Control": "public, max-age=86400",
+        "X-Point-Count": str(asset["count"]),
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=asset["content"], media_type="application/octet-stream", headers=headers)
+
+def plot_output_fields(tier: str, fmt: str) -> dict:
+    return {"size": tier, "image_format": fmt, "mime_type": mime_type(fmt)}
+
+def parse_plot_output(size: str, image_format: str):
+    try:
+        return normalize_output(size, image_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def plot_image_base64(redis_key: str, image_base64: str, tier: str, fmt: str) -> str:
+    """Base64 image for the requested tier/format, given a freshly rendered master."""
+    if (tier, fmt) == (DEFAULT_TIER, DEFAULT_FORMAT):
+        return image_base64
+    image_bytes = await plotting_api.get_plot_image_async(
+        redis_key, tier, fmt, master=base64.b64decode(image_base64)
+    )
+    if image_bytes is None:
+        raise HTTPException(status_code=500, detail="Could not encode plot image")
+    return to_base64(image_bytes)
+
+async def render_session_umap(session_id: str) -> dict:
+    """Render a session's UMAP plot into Redis (used by the UMAP endpoint and precompute)."""
+    embeddings, prompts = collect_session_embeddings(get_redis(), session_id)
+    
+    # Generate UMAP visualization using new plotting API
+    result = await plotting_api.create_umap_plot_async(
+        user_embeddings=embeddings,
+        user_prompts=prompts,
+        session_id=session_id,
+        max_background_samples_per_class=UMAP_BACKGROUND_SAMPLES_PER_CLASS,
+        figsize=(10, 7),
+        user_marker="^",
+        user_color="black",
+        user_size=120,
+        annotate=True
+    )
+    if result["status"] == "success":
+        result = {**result, "embeddings_count": len(embeddings)}
+    return result
+
+async def render_session_radar(session_id: str) -> dict:
+    """Render a session's radar chart into Redis (used by the radar endpoint and precompute)."""
+    r = get_redis()
+    # Get session data
+    session_data = r.hgetall(f"session:{session_id}")
+    if not session_data:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    # Get all drawings for this session
+    drawing_ids = r.lrange(f"session:{session_id}:drawings", 0, -1)
+    if not drawing_ids:
+        raise HTTPException(status_code=404, detail="No drawings found for this session")
+
+    # Collect drawing data
+    session_drawings = []
+    for drawing_id in drawing_ids:
+        drawing_data = r.hgetall(drawing_id)
+        if drawing_data:
+            prompt = drawing_data.get("prompt", "")
+            predictions_str = drawing_data.get("predictions", "{}")
+
+            try:
+                predictions = json.loads(predictions_str) if predictions_str else {}
+            except json.JSONDecodeError:
+                print(f"Error parsing predictions for {drawing_id}: {predictions_str}")
+                continue
+
+            session_drawings.append({
+                "prompt": prompt,
+                "predictions": predictions
+            })
+
+    if not session_drawings:
+        raise HTTPException(status_code=404, detail="No valid drawing data found")
+
+    # Generate radar chart using new plotting API
+    result = await plotting_api.create_radar_plot_async(
+        session_drawings=session_drawings,
+        session_id=session_id
+    )
+    if result["status"] == "success":
+        result = {**result, "drawings_count": len(session_drawings)}
+    return result
+
+def schedule_session_plots(session_id: str) -> None:
+    """Start rendering the UMAP and radar plots in the background (final round submitted)."""
+    renders = {
+        "umap": lambda: render_session_umap(session_id),
+        "radar": lambda: render_session_radar(session_id),
+    }
+    for kind, render in renders.items():
+        if plotting_api.lookup_cached_plot(kind, session_id, count=False) is None:
+            plot_jobs.start_job(kind, session_id, render)
+    print(f"[API] Scheduled plot precompute for session {session_id}")
+
+async def cached_plot_response(kind: str, session_id: str, tier: str, fmt: str):
+    """Endpoint response for the plot of the session's current drawings, or None if not cached."""
+    cached = plotting_api.lookup_cached_plot(kind, session_id)
+    if cached is None:
+        return None
+    existing_plot = await plotting_api.get_plot_image_async(cached["redis_key"], tier, fmt)
+    if not existing_plot:
+        return None
+    metadata = plotting_api.get_metadata_from_redis(cached["metadata_key"])
+    return {
+        "status": "success",
+        "image_base64": to_base64(existing_plot),
+        **plot_output_fields(tier, fmt),
+        "from_cache": True,
+        "metadata": metadata
+    }
+
+@router.get("/api/plot-image/{kind}/{session_id}")
+async def get_plot_image(kind: str, session_id: str, size: str = DEFAULT_TIER, image_format: str = DEFAULT_FORMAT):
+    """Raw image bytes of an already rendered UMAP or radar plot (no base64)"""
+    if kind not in ("umap", "radar"):
+        raise HTTPException(status_code=404, detail="Unknown plot type")
+    tier, fmt = parse_plot_output(size, image_format)
+    cached = plotting_api.lookup_cached_plot(kind, session_id)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Plot not found")
+    try:
+        image_bytes = await plotting_api.get_plot_image_async(cached["redis_key"], tier, fmt)
+    except RenderPoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if image_bytes is None:
+        raise HTTPException(status_code=404, detail="Plot not found")
+    return Response(content=image_bytes, media_type=mime_type(fmt), headers={"Cache-Control": "private, max-age=3600"})
+
 @router.get("/api/umap/{session_id}")
-async def generate_umap_visualization(session_id: str):
-    """Generate UMAP visualization for a session's embeddings and store in Redis"""
+async def generate_umap_visualization(
+    session_id: str,
+    mode: str = "image",
+    size: str = DEFAULT_TIER,
+    image_format: str = DEFAULT_FORMAT,
+):
+    """Generate UMAP visualization for a session's embeddings and store in Redis.
+    mode=data returns projected user points for client-side rendering instead of a PNG.
+    size / image_format pick the output tier ("thumbnail", "screen", "print") and format ("png", "webp")."""
     try:
         r = get_redis()
+        tier, fmt = parse_plot_output(size, image_format)
+
+        if mode == "data":
+            embeddings, prompts = collect_session_embeddings(r, session_id)
+            # The projection is CPU-bound (and loads the reducer on a cold worker): keep it off the loop
+            result = await asyncio.to_thread(
+                plotting_api.create_umap_data,
+                user_embeddings=embeddings,
+                user_prompts=prompts,
+                session_id=session_id,
+                max_background_samples_per_class=UMAP_BACKGROUND_SAMPLES_PER_CLASS,
+            )
+            if result["status"] != "success":
+                raise HTTPException(status_code=500, detail=f"UMAP projection failed: {result.get('error', 'Unknown error')}")
+            result["mode"] = "data"
+            result["embeddings_count"] = len(embeddings)
+            result["background"]["url"] = f"/api/umap-background?samples_per_class={UMAP_BACKGROUND_SAMPLES_PER_CLASS}"
+            return result
         
         # Check if already exists in Redis
-        redis_key = f"umap_plot:{session_id}"
-        existing_plot = plotting_api.get_plot_from_redis(redis_key)
-        if existing_plot:
-            metadata = plotting_api.get_metadata_from_redis(f"umap_metadata:{session_id}")
-            return {
-                "status": "success",
-                "image_base64": existing_plot,
-                "from_cache": True,
-                "metadata": metadata
-            }
+        cached = await cached_plot_response("umap", session_id, tier, fmt)
+        if cached:
+            return cached
         
-        # Get all drawing IDs for this session
-        drawing_ids = r.lrange(f"session:{session_id}:drawings", 0, -1)
-        if not drawing_ids:
-            raise HTTPException(status_code=404, detail="No drawings found for this session")
-
-        # Collect embeddings and prompts
-        embeddings_data = []
-        for drawing_id in drawing_ids:
-            drawing_data = r.hgetall(drawing_id)
-            if drawing_data and "embedding" in drawing_data and "prompt" in drawing_data:
-                emb = json.loads(drawing_data.get("embedding", "[]"))
-                if emb:  # Only add non-empty embeddings
-                    prompt = drawing_data.get("prompt", "unknown")
-                    row_data = {"prompt": prompt}
-                    # Add embedding features
-                    for i, val in enumerate(emb):
-                        row_data[f"emb_{i}"] = val
-                    embeddings_data.append(row_data)
-
-        if not embeddings_data:
-            raise HTTPException(status_code=404, detail="No embeddings found for this session")
-        
-        # Create DataFrame for the new API
-        user_embedding_df = pd.DataFrame(embeddings_data)
-        
-        # Generate UMAP visualization using new plotting API
-        result = plotting_api.create_umap_plot(
-            user_embedding_df=user_embedding_df,
-            session_id=session_id,
-            max_background_samples_per_class=500,  # 500 samples per class
-            figsize=(10, 7),
-            user_marker="^",
-            user_color="black",
-            user_size=120,
-            annotate=True
-        )
+        # Render, or join the render already running for this session
+        result = await plot_jobs.run_job("umap", session_id, lambda: render_session_umap(session_id))
+        if result["status"] == "shared":
+            # Rendered by another API worker
+            cached = await cached_plot_response("umap", session_id, tier, fmt)
+            if cached:
+                return cached
+            raise HTTPException(status_code=500, detail="Plot rendered by another worker is not available")
         
         if result["status"] == "success":
             return {
                 "status": "success",
-                "image_base64": result["image_base64"],
+                "image_base64": await plot_image_base64(result["redis_key"], result["image_base64"], tier, fmt),
+                **plot_output_fields(tier, fmt),
                 "redis_key": result["redis_key"],
-                "embeddings_count": len(embeddings_data),
+                "embeddings_count": result["embeddings_count"],
                 "skipped_classes": result["skipped_classes"],
                 "background_samples_per_class": result["background_samples_per_class"],
                 "from_cache": False
             }
+        elif result.get("busy"):
+            raise HTTPException(status_code=503, detail=f"UMAP generation busy: {result.get('error')}")
         else:
             raise HTTPException(status_code=500, detail=f"UMAP generation failed: {result.get('error', 'Unknown error')}")
 
+    except HTTPException:
+        raise
+    except RenderPoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"Error generating UMAP visualization: {e}")
         raise HTTPException(status_code=500, detail=f"Error generating UMAP visualization: {str(e)}")
 
 @router.get("/api/radar/{session_id}")
-async def generate_radar_chart(session_id: str):
+async def generate_radar_chart(
+    session_id: str,
+    size: str = DEFAULT_TIER,
+    image_format: str = DEFAULT_FORMAT,
+):
     """Generate radar chart for a session and store in Redis"""
     try:
-        r = get_redis()
+        tier, fmt = parse_plot_output(size, image_format)
         
         # Check if already exists in Redis
-        redis_key = f"radar_plot:{session_id}"
-        existing_plot = plotting_api.get_plot_from_redis(redis_key)
-        if existing_plot:
-            metadata = plotting_api.get_metadata_from_redis(f"radar_metadata:{session_id}")
-            return {
-                "status": "success", 
-                "image_base64": existing_plot,
-                "from_cache": True,
-                "metadata": metadata
-            }
+        cached = await cached_plot_response("radar", session_id, tier, fmt)
+        if cached:
+            return cached
         
-        # Get session data
-        session_data = r.hgetall(f"session:{session_id}")
-        if not session_data:
-            raise HTTPException(status_code=404, detail="Session not found")
-        
-        # Get all drawings for this session
-        drawing_ids = r.lrange(f"session:{session_id}:drawings", 0, -1)
-        if not drawing_ids:
-            raise HTTPException(status_code=404, detail="No drawings found for this session")
-        
-        # Collect drawing data
-        session_drawings = []
-        for drawing_id in drawing_ids:
-            drawing_data = r.hgetall(drawing_id)
-            if drawing_data:
-                prompt = drawing_data.get("prompt", "")
-                predictions_str = drawing_data.get("predictions", "{}")
-                
-                try:
-                    predictions = json.loads(predictions_str) if predictions_str else {}
-                except json.JSONDecodeError:
-                    print(f"Error parsing predictions for {drawing_id}: {predictions_str}")
-                    continue
-                
-                session_drawings.append({
-                    "prompt": prompt,
-                    "predictions": predictions
-                })
-        
-        if not session_drawings:
-            raise HTTPException(status_code=404, detail="No valid drawing data found")
-        
-        # Generate radar chart using new plotting API
-        result = plotting_api.create_radar_plot(
-            session_drawings=session_drawings,
-            session_id=session_id
-        )
+        # Render, or join the render already running for this session
+        result = await plot_jobs.run_job("radar", session_id, lambda: render_session_radar(session_id))
+        if result["status"] == "shared":
+            # Rendered by another API worker
+            cached = await cached_plot_response("radar", session_id, tier, fmt)
+            if cached:
+                return cached
+            raise HTTPException(status_code=500, detail="Plot rendered by another worker is not available")
         
         if result["status"] == "success":
             return {
                 "status": "success",
-                "image_base64": result["image_base64"],
+                "image_base64": await plot_image_base64(result["redis_key"], result["image_base64"], tier, fmt),
+                **plot_output_fields(tier, fmt),
                 "redis_key": result["redis_key"],
                 "prompts": result["prompts"],
                 "probabilities": result["probabilities"],
-                "drawings_count": len(session_drawings),
+                "drawings_count": result["drawings_count"],
                 "from_cache": False
             }
+        elif result.get("busy"):
+            raise HTTPException(status_code=503, detail=f"Radar chart generation busy: {result.get('error')}")
         else:
             raise HTTPException(status_code=500, detail=f"Radar chart generation failed: {result.get('error', 'Unknown error')}")
 
     except HTTPException:
         raise
+    except RenderPoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"Error generating radar chart: {e}")
         raise HTTPException(status_code=500, detail=f"Error generating radar chart: {str(e)}")
 
+@router.get("/api/plot-cache/stats")
+async def get_plot_cache_stats():
+    """Hit / miss counts of the versioned plot cache"""
+    return plotting_api.get_cache_stats()
+
+@router.get("/api/plots/{session_id}/status")
+async def get_plot_status(session_id: str):
+    """Precompute job status of a session's plots"""
+    return {"session_id": session_id, "jobs": plot_jobs.get_job_status(session_id)}
+
 @router.get("/api/plots/{session_id}")
-async def generate_both_plots(session_id: str):
+async def generate_both_plots(
+    session_id: str,
+    size: str = DEFAULT_TIER,
+    image_format: str = DEFAULT_FORMAT,
+):
     """Generate both UMAP and radar charts by calling existing endpoints"""
     try:
-        # Call existing UMAP and radar endpoints
-        umap_result = await generate_umap_visualization(session_id)
-        radar_result = await generate_radar_chart(session_id)
+        # Call existing UMAP and radar endpoints concurrently
+        umap_result, radar_result = await asyncio.gather(
+            generate_umap_visualization(session_id, size=size, image_format=image_format),
+            generate_radar_chart(session_id, size=size, image_format=image_format),
+        )
         
         return {
             "status": "success",
@@ -369,13 +702,107 @@ async def generate_both_plots(session_id: str):
         print(f"Error generating plots: {e}")
         raise HTTPException(status_code=500, detail=f"Error generating plots: {str(e)}")
 
+@router.get("/api/startup")
+async def get_startup_report():
+    """Import / initialisation time per startup stage of this worker"""
+    return startup_report.summary()
+
+@router.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return Response(content=render_latest(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/api/memory")
+async def get_worker_memory():
+    """RSS / PSS / USS of this API worker (MB); PSS summed over workers is the real total"""
+    return {"pid": os.getpid(), "memory": process_memory()}
+
+@router.get("/api/debug/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request, sort: str = "cumulative"):
+    """pstats report of a profile taken with the X-Debug-Profile header (trusted clients only)"""
+    if not is_trusted(request):
+        raise HTTPException(status_code=403, detail="Profiles are only available to trusted clients")
+    if sort not in ("cumulative", "tottime", "calls"):
+        raise HTTPException(status_code=400, detail="sort must be cumulative, tottime or calls")
+    text = profile_stats_text(profile_id, sort=sort)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(content=text, media_type="text/plain; charset=utf-8")
+
+class ModelDeployRequest(BaseModel):
+    path: str
+    candidate_percent: int = 0  # 0: replace the active model; 1..99: canary share of the traffic
+
+def _require_trusted(request: Request):
+    if not is_trusted(request):
+        raise HTTPException(status_code=403, detail="Model deploys are only available to trusted clients")
+
+@router.post("/api/debug/models", status_code=202)
+async def deploy_model(deploy: ModelDeployRequest, request: Request):
+    """
+    Deploy a model file to all workers, as the active model or as a candidate
+    for a share of the sessions. Workers load and warm it in the background
+    and switch within MODEL_WATCH_INTERVAL_SEC; progress in /api/health.
+    """
+    _require_trusted(request)
+    if not 0 <= deploy.candidate_percent <= 99:
+        raise HTTPException(status_code=400, detail="candidate_percent must be between 0 and 99")
+    if not os.path.isfile(deploy.path):
+        raise HTTPException(status_code=400, detail=f"Model file not found: {deploy.path}")
+    r = get_redis()
+    desired = model_rollout.read_desired(r) or model_rollout.desired_from_registry(model_registry)
+    target = {"path": deploy.path, "version": await asyncio.to_thread(model_version_id, deploy.path)}
+    if deploy.candidate_percent:
+        desired["candidate"] = {**target, "percent": deploy.candidate_percent}
+    else:
+        desired = {"active": target, "candidate": None}
+    model_rollout.write_desired(r, desired)
+    return {"status": "accepted", "desired": desired}
+
+@router.post("/api/debug/models/promote", status_code=202)
+async def promote_model(request: Request):
+    """Make the candidate model the active model on all workers"""
+    _require_trusted(request)
+    r = get_redis()
+    desired = model_rollout.read_desired(r)
+    if not desired or not desired.get("candidate"):
+        raise HTTPException(status_code=409, detail="No candidate model deployed")
+    candidate = desired["candidate"]
+    desired = {"active": {"path": candidate["path"], "version": candidate["version"]}, "candidate": None}
+    model_rollout.write_desired(r, desired)
+    return {"status": "accepted", "desired": desired}
+
+@router.delete("/api/debug/models/candidate", status_code=202)
+async def remove_candidate_model(request: Request):
+    """Send all traffic back to the active model"""
+    _require_trusted(request)
+    r = get_redis()
+    desired = model_rollout.read_desired(r)
+    if not desired or not desired.get("candidate"):
+        raise HTTPException(status_code=409, detail="No candidate model deployed")
+    desired["candidate"] = None
+    model_rollout.write_desired(r, desired)
+    return {"status": "accepted", "desired": desired}
+
+@router.get("/api/ready")
+async def readiness_check():
+    """Readiness (503 until warm-up has finished); /api/health only reports liveness"""
+    summary = startup_report.summary()
+    body = {
+        "ready": summary["ready"],
+        "model_loaded": model_registry.active is not None,
+        "warmup": [s for s in summary["stages"] if s["kind"] == "warmup"],
+    }
+    return JSONResponse(status_code=200 if summary["ready"] else 503, content=body)
+
 @router.get("/api/health")
 async def health_check():
     return {
         "status": "healthy",
-        "model_loaded": model is not None,
-        "embed_model_loaded": embed_model is not None,
-        "classes_count": len(CLASSES)
+        "model_loaded": model_registry.active is not None,
+        "embed_model_loaded": model_registry.active is not None and model_registry.active.embed_model is not None,
+        "classes_count": len(CLASSES),
+        "models": model_registry.status(),
     }
 
 @router.get("/api/qr-code/{session_id}")
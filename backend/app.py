@@ -1,16 +1,48 @@
 # app.py
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from api import router
+from startup import startup_report
+from config import WARMUP_ENABLED, WARMUP_BLOCKING
+from ml_utils import model_registry
+from redis_utils import get_redis
+import model_rollout
+from metrics import metrics_middleware
+from profiling import server_timing_middleware
 
+with startup_report.stage("api module", "import"):
+    import api
+    from api import router
 
-model = None
-embed_model = None
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    api.init_resources(startup_report)
 
-app = FastAPI(title="QuickDraw API")
+    warmup_task = None
+    if not WARMUP_ENABLED:
+        startup_report.ready = True
+    elif not startup_report.ready:
+        from warmup import run_warmup
+        if WARMUP_BLOCKING:
+            await run_warmup(*model_registry.models(), startup_report)
+        else:
+            warmup_task = asyncio.create_task(run_warmup(*model_registry.models(), startup_report))
+    # Follows model deploys (POST /api/debug/models) without a restart
+    model_watch_task = asyncio.create_task(model_rollout.watch(model_registry, get_redis))
+    yield
+    model_watch_task.cancel()
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    api.shutdown_resources()
+
+
+app = FastAPI(title="QuickDraw API", lifespan=lifespan)
 app.include_router(router)
+app.middleware("http")(metrics_middleware)
+app.middleware("http")(server_timing_middleware)
 
 # Enable CORS
 app.add_middleware(
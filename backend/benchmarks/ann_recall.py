@@ -0,0 +1,119 @@
+"""
+Recall and latency of the similar-drawings index (ann_index.py) against
+brute-force search.
+
+Queries are background rows with small Gaussian noise (like a new drawing of
+a known class); recall@k is the share of the exact k nearest rows the index
+returns. The background CSV is small, so --synthetic N adds a clustered
+random set of N rows to see how the index behaves at larger sizes.
+
+Run from backend/:
+    python -m benchmarks.ann_recall --k 5 --queries 500
+    python -m benchmarks.ann_recall --synthetic 50000
+"""
+
+import time
+import argparse
+from typing import Any, Dict
+
+import numpy as np
+
+from ann_index import BackgroundIndex
+from config import ANN_METRIC, ANN_N_NEIGHBORS
+
+
+def pairwise_distances(queries: np.ndarray, data: np.ndarray, metric: str) -> np.ndarray:
+    if metric == "cosine":
+        q = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        d = data / np.linalg.norm(data, axis=1, keepdims=True)
+        return 1.0 - q @ d.T
+    if metric == "euclidean":
+        sq = (queries ** 2).sum(1)[:, None] + (data ** 2).sum(1)[None, :] - 2 * queries @ data.T
+        return np.sqrt(np.maximum(sq, 0))
+    raise ValueError(f"Brute force not implemented for metric {metric}")
+
+
+def brute_force(queries: np.ndarray, data: np.ndarray, k: int, metric: str) -> np.ndarray:
+    distances = pairwise_distances(queries, data, metric)
+    nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(distances, nearest, axis=1).argsort(axis=1)
+    return np.take_along_axis(nearest, order, axis=1)
+
+
+def synthetic_embeddings(n: int, dim: int, n_clusters: int = 340, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim))
+    labels = rng.integers(0, n_clusters, size=n)
+    return (centers[labels] + rng.normal(scale=0.5, size=(n, dim))).astype(np.float32)
+
+
+def run(data: np.ndarray, k: int, n_queries: int, metric: str, n_neighbors: int, seed: int = 0) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(data), size=n_queries)
+    scale = 0.05 * float(np.std(data))
+    queries = (data[rows] + rng.normal(scale=scale, size=(n_queries, data.shape[1]))).astype(np.float32)
+
+    t0 = time.perf_counter()
+    index = BackgroundIndex.build(data, np.zeros(len(data)), metric=metric, n_neighbors=n_neighbors)
+    build_s = time.perf_counter() - t0
+    index.query(queries[:1], k)    # numba compilation
+
+    t0 = time.perf_counter()
+    exact = brute_force(queries, data, k, metric)
+    brute_ms = (time.perf_counter() - t0) * 1000 / n_queries
+
+    single_ms = []
+    for q in queries:
+        t0 = time.perf_counter()
+        index.query(q, k)
+        single_ms.append((time.perf_counter() - t0) * 1000)
+    t0 = time.perf_counter()
+    approx = index.query(queries, k)["indices"]
+    batch_ms = (time.perf_counter() - t0) * 1000 / n_queries
+
+    recall = np.mean([len(set(a) & set(e)) / k for a, e in zip(approx, exact)])
+    return {
+        "rows": len(data),
+        "k": k,
+        "queries": n_queries,
+        "recall": round(float(recall), 4),
+        "build_s": round(build_s, 3),
+        "ann_query_ms_p50": round(float(np.percentile(single_ms, 50)), 3),
+        "ann_query_ms_p95": round(float(np.percentile(single_ms, 95)), 3),
+        "ann_batch_ms_per_query": round(batch_ms, 4),
+        "brute_ms_per_query": round(brute_ms, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--metric", default=ANN_METRIC)
+    parser.add_argument("--n-neighbors", type=int, default=ANN_N_NEIGHBORS)
+    parser.add_argument("--synthetic", type=int, default=0, help="also test on N synthetic clustered rows")
+    args = parser.parse_args()
+
+    from umap_auto import load_background_embeddings
+    from plotting_api import UMAP_ARTIFACT_PARAMS as P
+
+    background = load_background_embeddings(
+        P["raw_embedding_csv"], feature_cols=P["feature_cols"],
+        bg_class_col=P["bg_class_col"], normalize_class_space=P["normalize_class_space"],
+    )["matrix"].astype(np.float32)
+
+    datasets = [("background", background)]
+    if args.synthetic:
+        datasets.append(("synthetic", synthetic_embeddings(args.synthetic, background.shape[1])))
+
+    print(f"metric={args.metric} n_neighbors={args.n_neighbors} k={args.k}")
+    print(f"{'dataset':<11} {'rows':>7} {'recall':>7} {'build s':>8} {'ann p50 ms':>11} {'ann p95 ms':>11} "
+          f"{'ann batch ms/q':>15} {'brute ms/q':>11}")
+    for name, data in datasets:
+        r = run(data, args.k, args.queries, args.metric, args.n_neighbors)
+        print(f"{name:<11} {r['rows']:>7} {r['recall']:>7.3f} {r['build_s']:>8.2f} {r['ann_query_ms_p50']:>11.3f} "
+              f"{r['ann_query_ms_p95']:>11.3f} {r['ann_batch_ms_per_query']:>15.4f} {r['brute_ms_per_query']:>11.4f}")
+
+
+if __name__ == "__main__":
+    main()
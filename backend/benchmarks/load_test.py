@@ -0,0 +1,297 @@
+"""
+Load test: replay synthetic game sessions and report latency per endpoint.
+
+Every virtual player does what the frontend does:
+
+    POST /api/sessions                      (rounds from game_logic.build_rounds)
+    6 rounds of:
+        POST /api/predict-realtime          every 900 ms while drawing (sketch.js preview),
+                                            or at the server's next_poll_ms with --adaptive
+        POST /api/predict                   the submitted drawing
+    GET /api/session, /api/drawing, /api/plots   (score page)
+
+Drawings are synthetic: random strokes that grow over the round, rendered
+once up front so the client does not compete with the server for CPU.
+
+    # in-process (ASGI transport, lifespan included) against fakeredis
+    python -m benchmarks.load_test --fake-redis --players 10
+
+    # in-process against the Redis at REDIS_HOST / REDIS_PORT
+    python -m benchmarks.load_test --players 10
+
+    # a running server (python serve.py --workers 4), for capacity numbers
+    python -m benchmarks.load_test --url http://localhost:8000 --players 50 --ramp 30
+
+In-process mode shares one event loop and CPU between client and server, so
+use it to compare changes; use --url to measure what a box can sustain.
+Needs httpx (and fakeredis for --fake-redis).
+"""
+
+import io
+import sys
+import base64
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from config import NUM_ROUNDS
+
+DIFFICULTIES = ("easy", "hard")
+CANVAS_SIZE = 280
+MODEL_SIZE = 28
+
+
+class Recorder:
+    """Latencies and failures per endpoint (route template)."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.skipped: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, ok: bool, skipped: bool = False) -> None:
+        self.latencies[endpoint].append(seconds)
+        if not ok:
+            self.errors[endpoint] += 1
+        if skipped:
+            self.skipped[endpoint] += 1
+
+    def summary(self, wall_seconds: float) -> Dict[str, Any]:
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            ms = np.array(values) * 1000
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "errors": self.errors[endpoint],
+                "skipped": self.skipped[endpoint],
+                "rps": round(len(values) / wall_seconds, 2),
+                "p50_ms": round(float(np.percentile(ms, 50)), 1),
+                "p95_ms": round(float(np.percentile(ms, 95)), 1),
+                "p99_ms": round(float(np.percentile(ms, 99)), 1),
+                "max_ms": round(float(ms.max()), 1),
+            }
+        total = sum(e["requests"] for e in endpoints.values())
+        return {
+            "wall_seconds": round(wall_seconds, 2),
+            "requests": total,
+            "errors": sum(e["errors"] for e in endpoints.values()),
+            "rps": round(total / wall_seconds, 2),
+            "endpoints": endpoints,
+        }
+
+
+def _png(image: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def make_drawing_frames(frames: int, seed: int) -> List[Tuple[bytes, bytes]]:
+    """
+    Progressive frames of one synthetic drawing: (28x28 model input PNG,
+    full canvas PNG), one more stroke per frame like a player drawing.
+    """
+    rng = random.Random(seed)
+    canvas = Image.new("RGB", (CANVAS_SIZE, CANVAS_SIZE), "white")
+    draw = ImageDraw.Draw(canvas)
+    result = []
+    for _ in range(frames):
+        points = [(rng.randint(20, CANVAS_SIZE - 20), rng.randint(20, CANVAS_SIZE - 20)) for _ in range(rng.randint(3, 8))]
+        draw.line(points, fill="black", width=8, joint="curve")
+        small = canvas.resize((MODEL_SIZE, MODEL_SIZE), Image.LANCZOS)
+        result.append((_png(small), _png(canvas)))
+    return result
+
+
+class Player:
+    """One virtual player going through a full game."""
+
+    def __init__(self, client, recorder: Recorder, drawings: List[List[Tuple[bytes, bytes]]],
+                 draw_seconds: float, preview_interval: float, rng: random.Random, adaptive: bool = False):
+        self.client = client
+        self.recorder = recorder
+        self.drawings = drawings
+        self.draw_seconds = draw_seconds
+        self.preview_interval = preview_interval
+        self.rng = rng
+        self.adaptive = adaptive
+
+    async def request(self, endpoint: str, method: str, url: str, **kwargs) -> Optional[Any]:
+        t0 = time.perf_counter()
+        ok, skipped, body = False, False, None
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+            if ok and response.headers.get("content-type", "").startswith("application/json"):
+                body = response.json()
+                # predict endpoints report failures in the body with a 200;
+                # a skipped realtime frame (superseded / overloaded) is not a failure
+                if isinstance(body, dict):
+                    skipped = bool(body.get("skipped"))
+                    ok = body.get("success") is not False or skipped
+        except Exception as e:
+            print(f"[Load] {endpoint} failed: {e}")
+        self.recorder.record(endpoint, time.perf_counter() - t0, ok, skipped)
+        return body if ok else None
+
+    async def draw_round(self, session_id: str, index: int, prompt: str, choices: List[str]) -> None:
+        frames = self.rng.choice(self.drawings)
+        started = time.perf_counter()
+        # Previews fire on a fixed interval while the player draws (setInterval), or
+        # with --adaptive the advised interval after each response (like sketch.js now)
+        interval = self.preview_interval
+        next_at = started + interval
+        i = 0
+        while i == 0 or next_at <= started + self.draw_seconds:
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            small, _ = frames[min(i, len(frames) - 1)]
+            data_url = "data:image/png;base64," + base64.b64encode(small).decode()
+            body = await self.request("POST /api/predict-realtime", "POST", "/api/predict-realtime",
+                                      json={"image_data": data_url, "choices": choices, "session_id": session_id})
+            i += 1
+            if self.adaptive:
+                if body and body.get("next_poll_ms"):
+                    interval = body["next_poll_ms"] / 1000
+                next_at = time.perf_counter() + interval
+            else:
+                next_at += interval
+
+        small, full = frames[-1]
+        await self.request(
+            "POST /api/predict", "POST", "/api/predict",
+            data={
+                "session_id": session_id,
+                "round": str(index + 1),
+                "prompt": prompt,
+                "time_spent_sec": f"{time.perf_counter() - started:.2f}",
+                "timed_out": "0",
+            },
+            files={
+                "drawing": (f"{session_id}_round{index + 1}.png", small, "image/png"),
+                "original_image_data": (f"{session_id}_round{index + 1}_original.png", full, "image/png"),
+            },
+        )
+
+    async def play(self, player_id: int) -> bool:
+        session = await self.request("POST /api/sessions", "POST", "/api/sessions", json={
+            "player_name": f"load-{player_id}",
+            "gender": self.rng.choice(["male", "female"]),
+            "age": self.rng.randint(8, 60),
+            "difficulty": self.rng.choice(DIFFICULTIES),
+        })
+        if session is None:
+            return False
+        session_id = session["session_id"]
+        for index, (prompt, choices) in enumerate(zip(session["prompts"], session["rounds"])):
+            await self.draw_round(session_id, index, prompt, choices)
+
+        # Score page
+        await self.request("GET /api/session/{session_id}", "GET", f"/api/session/{session_id}")
+        await self.request("GET /api/drawing/{session_id}", "GET", f"/api/drawing/{session_id}")
+        plots = await self.request("GET /api/plots/{session_id}", "GET", f"/api/plots/{session_id}")
+        return plots is not None
+
+
+def use_fake_redis() -> None:
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("--fake-redis needs fakeredis (pip install fakeredis)")
+    import redis_utils
+    server = fakeredis.FakeServer()
+    redis_utils._redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    redis_utils._redis_binary_client = fakeredis.FakeRedis(server=server)
+
+
+async def run_players(client, args, recorder: Recorder) -> Tuple[int, float]:
+    frames = max(2, int(args.draw_seconds / args.preview_interval))
+    drawings = [make_drawing_frames(frames, seed) for seed in range(args.drawings)]
+    rng = random.Random(args.seed)
+
+    async def start(player_id: int) -> bool:
+        if args.ramp > 0:
+            await asyncio.sleep(args.ramp * player_id / args.players)
+        player = Player(client, recorder, drawings, args.draw_seconds, args.preview_interval,
+                        random.Random(rng.random()), adaptive=args.adaptive)
+        return await player.play(player_id)
+
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*[start(i) for i in range(args.players)])
+    return sum(results), time.perf_counter() - t0
+
+
+async def run(args) -> Dict[str, Any]:
+    try:
+        import httpx
+    except ImportError:
+        sys.exit("load_test needs httpx (pip install httpx)")
+
+    recorder = Recorder()
+    timeout = httpx.Timeout(args.timeout)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout) as client:
+            completed, wall = await run_players(client, args, recorder)
+    else:
+        if args.fake_redis:
+            use_fake_redis()
+        import app as app_module
+        app = app_module.app
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout) as client:
+                completed, wall = await run_players(client, args, recorder)
+
+    summary = recorder.summary(wall)
+    summary.update({
+        "target": args.url or "in-process",
+        "players": args.players,
+        "sessions_completed": completed,
+        "sessions_per_min": round(completed / wall * 60, 2),
+    })
+    return summary
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    print(f"\n{summary['players']} players against {summary['target']}: "
+          f"{summary['sessions_completed']} sessions completed in {summary['wall_seconds']}s "
+          f"({summary['sessions_per_min']} sessions/min), {summary['requests']} requests "
+          f"({summary['rps']} req/s), {summary['errors']} errors\n")
+    print(f"{'endpoint':<34} {'reqs':>6} {'errs':>5} {'skip':>5} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for endpoint, e in summary["endpoints"].items():
+        print(f"{endpoint:<34} {e['requests']:>6} {e['errors']:>5} {e['skipped']:>5} {e['rps']:>7.2f} "
+              f"{e['p50_ms']:>8.1f} {e['p95_ms']:>8.1f} {e['p99_ms']:>8.1f} {e['max_ms']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running server (default: in-process)")
+    parser.add_argument("--fake-redis", action="store_true", help="in-process only: use fakeredis instead of Redis")
+    parser.add_argument("--players", type=int, default=10, help="concurrent virtual players")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which players start")
+    parser.add_argument("--draw-seconds", type=float, default=6.0, help="drawing time per round")
+    parser.add_argument("--preview-interval", type=float, default=0.9, help="realtime preview interval (s)")
+    parser.add_argument("--adaptive", action="store_true", help="follow the server's next_poll_ms hint")
+    parser.add_argument("--drawings", type=int, default=8, help="distinct synthetic drawings")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the summary to this file")
+    args = parser.parse_args()
+
+    print(f"[Load] {args.players} players x {NUM_ROUNDS} rounds, previews every {args.preview_interval}s "
+          f"for {args.draw_seconds}s per round")
+    summary = asyncio.run(run(args))
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Memory per worker: per-worker artifact loading vs preload-then-fork (serve.py).
+
+Each mode runs in a fresh interpreter that forks N workers. The workers import
+the plotting libraries, hold the UMAP artifacts (background embeddings,
+reduced background, reducer, packed background asset) and read them once like
+a request would. Memory is then read from /proc/<pid>/smaps_rollup.
+
+    per-worker  every worker loads its own copy (today: `uvicorn --workers N`)
+    preload     the parent loads once and forks (serve.py)
+
+PSS summed over the parent and the workers is the real memory in use.
+The Keras model is loaded per worker in both modes (--with-model) because
+TensorFlow is not fork-safe.
+
+Run from backend/ (Linux only):
+    python -m benchmarks.memory_report --workers 4
+"""
+
+import os
+import sys
+import gc
+import json
+import argparse
+import subprocess
+from typing import Any, Dict, List
+
+from memory_stats import process_memory
+
+MODES = ("per-worker", "preload")
+
+
+def load_artifacts() -> None:
+    from umap_auto import preload_umap_artifacts
+    from plotting_api import plotting_api, UMAP_ARTIFACT_PARAMS
+    import radar_chart_auto  # noqa: F401
+
+    preload_umap_artifacts(UMAP_ARTIFACT_PARAMS, samples_per_class=500)
+    plotting_api.get_umap_background_asset(max_background_samples_per_class=500)
+
+
+def use_artifacts() -> None:
+    """Read the cached arrays the way a projection / data-mode request does."""
+    from umap_auto import load_background_embeddings, load_reduced_background_umap
+    from plotting_api import UMAP_ARTIFACT_PARAMS as P
+
+    background = load_background_embeddings(
+        P["raw_embedding_csv"], feature_cols=P["feature_cols"],
+        bg_class_col=P["bg_class_col"], normalize_class_space=P["normalize_class_space"],
+    )
+    float(background["matrix"].sum())
+    reduced = load_reduced_background_umap(
+        P["umap_background_csv"], samples_per_class=500, random_state=P["random_state"],
+        strategy=P["background_sample_strategy"], normalize_class_space=P["normalize_class_space"],
+    )
+    float(reduced.select_dtypes("number").to_numpy().sum())
+
+
+def run_mode(mode: str, workers: int, with_model: bool) -> Dict[str, Any]:
+    """Body of one measurement subprocess."""
+    if mode == "preload":
+        load_artifacts()
+        gc.collect()
+        gc.freeze()
+
+    children: List[int] = []
+    ready_fds = []
+    go_r, go_w = os.pipe()
+    for _ in range(workers):
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(go_w)
+            if mode == "per-worker":
+                load_artifacts()
+            use_artifacts()
+            if with_model:
+                from ml_utils import load_model
+                load_model()
+            os.write(ready_w, b"1")
+            os.read(go_r, 1)    # stay alive until measured
+            os._exit(0)
+        children.append(pid)
+        ready_fds.append(ready_r)
+
+    for fd in ready_fds:
+        os.read(fd, 1)
+    result = {
+        "mode": mode,
+        "workers": workers,
+        "parent": process_memory(),
+        "children": [process_memory(pid) for pid in children],
+    }
+    os.close(go_w)    # EOF releases the workers
+    for pid in children:
+        os.waitpid(pid, 0)
+    return result
+
+
+def summarize(result: Dict[str, Any]) -> Dict[str, Any]:
+    children = result["children"]
+    n = len(children)
+    avg = lambda k: round(sum(c[k] for c in children) / n, 2)
+    return {
+        "mode": result["mode"],
+        "workers": n,
+        "worker_rss": avg("rss"),
+        "worker_pss": avg("pss"),
+        "worker_uss": avg("uss"),
+        "parent_pss": result["parent"]["pss"],
+        "total_pss": round(result["parent"]["pss"] + sum(c["pss"] for c in children), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--with-model", action="store_true", help="also load the Keras model in every worker")
+    parser.add_argument("--json", help="write the summary to this file")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)   # internal: one measurement
+    args = parser.parse_args()
+
+    if process_memory() is None:
+        sys.exit("memory_report needs /proc/<pid>/smaps_rollup (Linux)")
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.workers, args.with_model)))
+        return
+
+    summaries = []
+    for mode in MODES:
+        cmd = [sys.executable, "-m", "benchmarks.memory_report", "--mode", mode, "--workers", str(args.workers)]
+        if args.with_model:
+            cmd.append("--with-model")
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        summaries.append(summarize(json.loads(out.strip().splitlines()[-1])))
+
+    print(f"{'mode':<11} {'workers':>7} {'RSS/worker':>11} {'PSS/worker':>11} {'USS/worker':>11} {'parent PSS':>11} {'total PSS':>10}  (MB)")
+    for s in summaries:
+        print(f"{s['mode']:<11} {s['workers']:>7} {s['worker_rss']:>11.1f} {s['worker_pss']:>11.1f} "
+              f"{s['worker_uss']:>11.1f} {s['parent_pss']:>11.1f} {s['total_pss']:>10.1f}")
+    base, pre = summaries
+    saved = base["total_pss"] - pre["total_pss"]
+    print(f"\npreload saves {saved:.1f} MB in total ({saved / base['workers']:.1f} MB per worker, "
+          f"USS per worker {base['worker_uss']:.1f} -> {pre['worker_uss']:.1f} MB)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"modes": summaries, "saved_total_mb": round(saved, 2)}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
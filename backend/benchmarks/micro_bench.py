@@ -0,0 +1,417 @@
+"""
+Micro-benchmarks of the backend hot functions, compared against a JSON baseline.
+
+    process_image_to_model_input     PNG bytes -> 28x28x1 model input
+    model_forward_single / _batch    classifier forward pass (1 and --batch drawings)
+    reduce_background_umap_samples   per-class background sampling
+    sample_and_smooth_embeddings     user rows smoothed with background rows
+    plot_umap_with_user              full layered UMAP render to PNG bytes
+    create_radar_chart               radar chart (original renderer)
+    build_rounds                     easy + hard round generation
+    get_drawing_redis_read           GET /api/drawing for a six-drawing session
+    predict_store_drawing            api.store_drawing: what /api/predict writes (drawing
+                                     hash and list, plot cache invalidation, leaderboard)
+
+Runs on CPU only and offline. Benchmarks whose inputs are missing (model
+file, UMAP reducer) are reported as skipped. The Redis benchmarks use the
+Redis at REDIS_HOST / REDIS_PORT, or fakeredis when it is not reachable (the
+backend is recorded, and results on different backends are not compared).
+
+Run from backend/:
+    python -m benchmarks.micro_bench --save-baseline          # record a baseline
+    python -m benchmarks.micro_bench                          # compare, exit 1 on regression
+    python -m benchmarks.micro_bench --only build_rounds,create_radar_chart --threshold 0.3
+    python -m benchmarks.micro_bench --threshold-for plot_umap_with_user=0.5
+
+A benchmark regresses when its median exceeds the baseline median by more
+than its threshold (default per benchmark, overridable). Baselines are
+machine specific; record one per machine (or CI runner type).
+"""
+
+import os
+
+# CPU only, before TensorFlow can be imported
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+import io
+import sys
+import json
+import time
+import asyncio
+import platform
+import argparse
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "micro.json")
+DEFAULT_THRESHOLD = 0.20
+
+
+class SkipBenchmark(Exception):
+    """Raised by a setup function when the benchmark cannot run here."""
+
+
+class Benchmark:
+    def __init__(self, name: str, setup: Callable[[], Callable[[], Any]], repeat: int, threshold: float):
+        self.name = name
+        self.setup = setup
+        self.repeat = repeat
+        self.threshold = threshold
+
+
+BENCHMARKS: List[Benchmark] = []
+
+
+def benchmark(name: str, repeat: int = 50, threshold: float = DEFAULT_THRESHOLD):
+    """Register a setup function; it returns the zero-argument callable to time."""
+    def decorator(setup):
+        BENCHMARKS.append(Benchmark(name, setup, repeat, threshold))
+        return setup
+    return decorator
+
+
+# ---------- Shared inputs ----------
+
+_cache: Dict[str, Any] = {}
+
+
+def drawing_png(size: int = 280, seed: int = 0) -> bytes:
+    from PIL import Image, ImageDraw
+
+    rng = np.random.default_rng(seed)
+    image = Image.new("RGB", (size, size), "white")
+    draw = ImageDraw.Draw(image)
+    for _ in range(6):
+        points = [tuple(int(v) for v in p) for p in rng.integers(10, size - 10, size=(5, 2))]
+        draw.line(points, fill="black", width=max(1, size // 35))
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def models():
+    if "models" not in _cache:
+        from ml_utils import load_model
+        _cache["models"] = load_model()
+    model, embed_model = _cache["models"]
+    if model is None:
+        raise SkipBenchmark("model not available")
+    return model, embed_model
+
+
+def umap_params() -> Dict[str, Any]:
+    from plotting_api import UMAP_ARTIFACT_PARAMS
+    for key in ("raw_embedding_csv", "umap_background_csv"):
+        if not os.path.exists(UMAP_ARTIFACT_PARAMS[key]):
+            raise SkipBenchmark(f"{UMAP_ARTIFACT_PARAMS[key]} not found")
+    return UMAP_ARTIFACT_PARAMS
+
+
+def background_embeddings():
+    if "background" not in _cache:
+        import pandas as pd
+        df = pd.read_csv(umap_params()["raw_embedding_csv"])
+        df["class"] = df["class"].astype(str).str.replace(" ", "_")
+        _cache["background"] = df
+    return _cache["background"]
+
+
+def user_session(n: int = 6):
+    """Six fake user drawings: one background row per class plus noise."""
+    import pandas as pd
+    params = umap_params()
+    bg = background_embeddings()
+    rng = np.random.default_rng(0)
+    classes = list(dict.fromkeys(bg["class"]))[:n]
+    rows = bg.groupby("class").head(1).set_index("class").loc[classes, params["feature_cols"]]
+    user = pd.DataFrame(rows.to_numpy() + rng.normal(0, 0.01, rows.shape), columns=params["feature_cols"])
+    user.insert(0, "prompt", classes)
+    return user
+
+
+def redis_client():
+    if "redis" not in _cache:
+        import redis_utils
+        r = redis_utils.get_redis()
+        try:
+            r.ping()
+            _cache["redis_backend"] = "redis"
+        except Exception:
+            try:
+                import fakeredis
+            except ImportError:
+                raise SkipBenchmark("Redis not reachable and fakeredis not installed")
+            server = fakeredis.FakeServer()
+            redis_utils._redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+            redis_utils._redis_binary_client = fakeredis.FakeRedis(server=server)
+            r = redis_utils._redis_client
+            _cache["redis_backend"] = "fakeredis"
+        _cache["redis"] = r
+    return _cache["redis"]
+
+
+def drawing_record(session_id: str, round_no: int, prompt: str) -> Dict[str, Any]:
+    """A drawing hash as /api/predict stores it (base64 images, 512-d embedding)."""
+    import base64
+    rng = np.random.default_rng(round_no)
+    return {
+        "session_id": session_id,
+        "round": round_no,
+        "prompt": prompt,
+        "time_spent_sec": 7.5,
+        "timed_out": 0,
+        "image_base64": base64.b64encode(drawing_png(28, round_no)).decode(),
+        "predictions": json.dumps({prompt: 0.7, "other": 0.3}),
+        "round_choices": json.dumps([prompt, "other"]),
+        "embedding": json.dumps(rng.normal(size=512).tolist()),
+        "timestamp": datetime.now().isoformat(),
+        "original_image_data": base64.b64encode(drawing_png(280, round_no)).decode(),
+    }
+
+
+# ---------- Benchmarks ----------
+
+@benchmark("process_image_to_model_input", repeat=200)
+def bench_preprocess():
+    from ml_utils import process_image_to_model_input
+    data = drawing_png(28)
+    return lambda: process_image_to_model_input(data)
+
+
+@benchmark("model_forward_single", repeat=50)
+def bench_forward_single():
+    model, _ = models()
+    x = np.random.default_rng(0).random((1, 28, 28, 1), dtype=np.float32)
+    return lambda: model.predict(x, verbose=0)
+
+
+@benchmark("model_forward_batch", repeat=20)
+def bench_forward_batch():
+    model, _ = models()
+    x = np.random.default_rng(0).random((_cache["batch"], 28, 28, 1), dtype=np.float32)
+    return lambda: model.predict(x, verbose=0)
+
+
+@benchmark("reduce_background_umap_samples", repeat=20)
+def bench_reduce_background():
+    import pandas as pd
+    from umap_auto import reduce_background_umap_samples
+    params = umap_params()
+    df = pd.read_csv(params["umap_background_csv"])
+    return lambda: reduce_background_umap_samples(df, samples_per_class=500, random_state=42, strategy="uniform")
+
+
+@benchmark("sample_and_smooth_embeddings", repeat=50)
+def bench_sample_and_smooth():
+    from umap_auto import sample_and_smooth_embeddings
+    params = umap_params()
+    bg = background_embeddings()
+    user = user_session()
+    return lambda: sample_and_smooth_embeddings(user, bg, params["feature_cols"], sample_size=1, random_state=42)
+
+
+@benchmark("plot_umap_with_user", repeat=5, threshold=0.35)
+def bench_plot_umap():
+    from umap_auto import plot_umap_with_user
+    from plotting_api import plotting_api
+    params = umap_params()
+    if not os.path.exists(params["umap_reducer_path"]):
+        raise SkipBenchmark(f"{params['umap_reducer_path']} not found")
+    user = user_session()
+    kwargs = plotting_api._umap_params(user, "bench", 500, None, None, {})
+    return lambda: plot_umap_with_user(**kwargs)
+
+
+@benchmark("create_radar_chart", repeat=10, threshold=0.35)
+def bench_radar():
+    from radar_chart_auto import create_radar_chart
+    prompts = ["car", "bus", "crab", "tree", "map", "clock"]
+    probs = [0.9, 0.4, 0.7, 0.2, 0.55, 0.8]
+
+    def run():
+        result = create_radar_chart(prompts=prompts, probabilities=list(probs))
+        if result["status"] != "success":
+            raise RuntimeError(result.get("error"))
+    return run
+
+
+@benchmark("build_rounds", repeat=500)
+def bench_build_rounds():
+    from game_logic import build_rounds
+
+    def run():
+        build_rounds("easy")
+        build_rounds("hard")
+    return run
+
+
+@benchmark("get_drawing_redis_read", repeat=100)
+def bench_get_drawing():
+    r = redis_client()
+    import api
+    session_id = "bench-read"
+    r.delete(f"session:{session_id}:drawings")
+    for i, prompt in enumerate(["car", "bus", "crab", "tree", "map", "clock"], 1):
+        drawing_id = f"drawing:{session_id}:{i}"
+        r.hset(drawing_id, mapping=drawing_record(session_id, i, prompt))
+        r.lpush(f"session:{session_id}:drawings", drawing_id)
+    # One loop for all iterations: creating a loop per call costs about as much as the read
+    loop = asyncio.new_event_loop()
+    return lambda: loop.run_until_complete(api.get_drawing(session_id))
+
+
+@benchmark("predict_store_drawing", repeat=100)
+def bench_predict_write():
+    r = redis_client()
+    import api
+    session_id = "bench-write"
+    record = drawing_record(session_id, 1, "car")
+    probs_map = json.loads(record["predictions"])
+    session_data = {"session_id": session_id, "difficulty": "easy", "age": "30"}
+
+    def run():
+        api.store_drawing(r, record, probs_map, session_data, 6)
+        r.ltrim(f"session:{session_id}:drawings", 0, 5)
+    return run
+
+
+# ---------- Runner ----------
+
+def time_benchmark(bench: Benchmark, repeat: Optional[int] = None) -> Dict[str, Any]:
+    fn = bench.setup()
+    fn()    # warm-up: lazy imports, caches, graph tracing
+    times = []
+    for _ in range(repeat or bench.repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    ms = np.array(times) * 1000
+    return {
+        "repeat": len(times),
+        "median_ms": round(float(np.median(ms)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "min_ms": round(float(ms.min()), 4),
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], thresholds: Dict[str, float]) -> List[Dict[str, Any]]:
+    """Per benchmark: change of the median vs the baseline and whether it regressed."""
+    rows = []
+    same_redis = baseline.get("redis_backend") == results.get("redis_backend")
+    for name, current in results["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if "median_ms" not in current or not base or "median_ms" not in base:
+            continue
+        if "redis" in name and not same_redis:
+            continue
+        change = current["median_ms"] / base["median_ms"] - 1 if base["median_ms"] > 0 else 0.0
+        rows.append({
+            "name": name,
+            "baseline_ms": base["median_ms"],
+            "current_ms": current["median_ms"],
+            "change": round(change, 4),
+            "threshold": thresholds[name],
+            "regressed": change > thresholds[name],
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--output", help="also write the results (and comparison) to this JSON file")
+    parser.add_argument("--only", help="comma separated benchmark names")
+    parser.add_argument("--repeat", type=int, help="override the repeat count of every benchmark")
+    parser.add_argument("--batch", type=int, default=32, help="batch size of model_forward_batch")
+    parser.add_argument("--threshold", type=float, help="regression threshold for every benchmark (0.2 = +20%%)")
+    parser.add_argument("--threshold-for", action="append", default=[], metavar="NAME=FRACTION",
+                        help="threshold for one benchmark (repeatable)")
+    args = parser.parse_args()
+
+    _cache["batch"] = args.batch
+    selected = BENCHMARKS
+    if args.only:
+        names = {n.strip() for n in args.only.split(",")}
+        unknown = names - {b.name for b in BENCHMARKS}
+        if unknown:
+            sys.exit(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+        selected = [b for b in BENCHMARKS if b.name in names]
+
+    thresholds = {b.name: args.threshold if args.threshold is not None else b.threshold for b in BENCHMARKS}
+    for item in args.threshold_for:
+        name, _, value = item.partition("=")
+        if name not in thresholds or not value:
+            sys.exit(f"Invalid --threshold-for {item!r}")
+        thresholds[name] = float(value)
+
+    results: Dict[str, Any] = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+        },
+        "benchmarks": {},
+    }
+    failures: List[str] = []
+    print(f"{'benchmark':<32} {'repeat':>6} {'median ms':>10} {'p95 ms':>10} {'min ms':>10}")
+    for bench in selected:
+        try:
+            stats = time_benchmark(bench, args.repeat)
+            print(f"{bench.name:<32} {stats['repeat']:>6} {stats['median_ms']:>10.3f} "
+                  f"{stats['p95_ms']:>10.3f} {stats['min_ms']:>10.3f}")
+        except SkipBenchmark as e:
+            stats = {"skipped": str(e)}
+            print(f"{bench.name:<32} skipped: {e}")
+        except Exception as e:
+            stats = {"error": str(e)}
+            failures.append(bench.name)
+            print(f"{bench.name:<32} failed: {e}")
+        results["benchmarks"][bench.name] = stats
+    results["redis_backend"] = _cache.get("redis_backend")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, thresholds)
+        results["comparison"] = rows
+        print(f"\nvs baseline {args.baseline} ({baseline.get('created')})")
+        print(f"{'benchmark':<32} {'baseline ms':>11} {'current ms':>11} {'change':>8} {'limit':>7}")
+        for row in rows:
+            flag = "  REGRESSION" if row["regressed"] else ""
+            print(f"{row['name']:<32} {row['baseline_ms']:>11.3f} {row['current_ms']:>11.3f} "
+                  f"{row['change']:>+8.1%} {row['threshold']:>+7.0%}{flag}")
+        regressions = [row["name"] for row in rows if row["regressed"]]
+    elif not args.save_baseline:
+        print(f"\nNo baseline at {args.baseline}; record one with --save-baseline")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        if os.path.exists(args.baseline):
+            # Keep the entries of benchmarks that were not run this time
+            with open(args.baseline) as f:
+                previous = json.load(f).get("benchmarks", {})
+            results["benchmarks"] = {**previous, **results["benchmarks"]}
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if failures:
+        print(f"\n{len(failures)} benchmark(s) failed: {', '.join(failures)}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+    if failures or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Radar chart benchmark: template renderer vs the original create_radar_chart,
+plus a concurrency check that parallel renders do not clash.
+
+Run from backend/:
+    python -m benchmarks.radar_bench --repeat 20 --threads 8
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from radar_chart_auto import create_radar_chart, render_radar_chart
+
+PROMPTS = ["car", "bus", "crab", "tree", "map", "clock"]
+
+
+def make_inputs(n: int, seed: int = 0) -> List[Tuple[List[str], List[float]]]:
+    rng = np.random.default_rng(seed)
+    return [(PROMPTS, rng.random(len(PROMPTS)).round(4).tolist()) for _ in range(n)]
+
+
+def time_renderer(fn, inputs) -> Dict[str, float]:
+    times = []
+    for prompts, probs in inputs:
+        start = time.perf_counter()
+        result = fn(prompts=prompts, probabilities=list(probs))
+        times.append(time.perf_counter() - start)
+        if result["status"] != "success":
+            raise RuntimeError(result.get("error"))
+    times_ms = np.array(times) * 1000
+    return {
+        "mean_ms": float(times_ms.mean()),
+        "p50_ms": float(np.percentile(times_ms, 50)),
+        "p95_ms": float(np.percentile(times_ms, 95)),
+    }
+
+
+def concurrency_check(fn, inputs, threads: int) -> Dict[str, Any]:
+    """
+    Render every input serially, then all of them in parallel threads, and
+    count outputs that differ from their serial render or failed.
+    """
+    expected = [fn(prompts=p, probabilities=list(v))["image_base64"] for p, v in inputs]
+
+    def job(i):
+        prompts, probs = inputs[i]
+        return fn(prompts=prompts, probabilities=list(probs))
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(job, range(len(inputs))))
+
+    failed = sum(r["status"] != "success" for r in results)
+    mismatched = sum(
+        r["status"] == "success" and r["image_base64"] != exp
+        for r, exp in zip(results, expected)
+    )
+    return {"renders": len(inputs), "failed": failed, "mismatched": mismatched}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    inputs = make_inputs(args.repeat)
+    # First call builds the template / warms fonts; keep it out of the timings
+    render_radar_chart(prompts=PROMPTS, probabilities=[0.5] * len(PROMPTS))
+    create_radar_chart(prompts=PROMPTS, probabilities=[0.5] * len(PROMPTS))
+
+    legacy = time_renderer(create_radar_chart, inputs)
+    template = time_renderer(render_radar_chart, inputs)
+    print(f"create_radar_chart  mean {legacy['mean_ms']:.1f} ms  p50 {legacy['p50_ms']:.1f} ms  p95 {legacy['p95_ms']:.1f} ms")
+    print(f"render_radar_chart  mean {template['mean_ms']:.1f} ms  p50 {template['p50_ms']:.1f} ms  p95 {template['p95_ms']:.1f} ms")
+    print(f"speedup x{legacy['mean_ms'] / template['mean_ms']:.2f}")
+
+    concurrent_inputs = make_inputs(args.threads * 4, seed=1)
+    legacy_check = concurrency_check(create_radar_chart, concurrent_inputs, args.threads)
+    check = concurrency_check(render_radar_chart, concurrent_inputs, args.threads)
+    print(f"create_radar_chart concurrency ({args.threads} threads): {legacy_check}")
+    print(f"render_radar_chart concurrency ({args.threads} threads): {check}")
+    if check["failed"] or check["mismatched"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
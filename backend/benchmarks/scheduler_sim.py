@@ -0,0 +1,81 @@
+"""
+Final-submission queue wait under a preview backlog (inference_scheduler.py).
+
+Previews arrive faster than the inference slots can serve them (default 15/s
+against 2 slots of 0.2 s jobs, i.e. twice the capacity), so the realtime
+queue only grows; a final submission arrives every --final-every seconds.
+Jobs are sleeps, no model is needed. Reports the queue wait per class and
+exits with status 1 when the p95 wait of the finals exceeds --max-final-wait.
+
+Run from backend/:
+    python -m benchmarks.scheduler_sim
+    python -m benchmarks.scheduler_sim --preview-rate 30 --duration 10
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+from typing import Dict, List
+
+import numpy as np
+
+from inference_scheduler import InferenceScheduler
+
+
+async def simulate(scheduler: InferenceScheduler, preview_rate: float, final_every: float,
+                   job_sec: float, duration: float) -> Dict[str, List[float]]:
+    waits: Dict[str, List[float]] = {"final": [], "realtime": []}
+    tasks = []
+
+    def job(priority: str, submitted: float) -> None:
+        waits[priority].append(time.perf_counter() - submitted)
+        time.sleep(job_sec)
+
+    async def arrivals(priority: str, interval: float, start: float) -> None:
+        await asyncio.sleep(start)
+        end = time.perf_counter() + duration - start
+        while time.perf_counter() < end:
+            tasks.append(asyncio.ensure_future(scheduler.run(priority, job, priority, time.perf_counter())))
+            await asyncio.sleep(interval)
+
+    # Finals start once the preview backlog is older than the starvation limit
+    await asyncio.gather(
+        arrivals("realtime", 1.0 / preview_rate, 0.0),
+        arrivals("final", final_every, min(duration / 2, scheduler.starvation_sec + 0.5)),
+    )
+    # Drop the remaining backlog instead of serving it
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return waits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=2)
+    parser.add_argument("--preview-rate", type=float, default=15.0, help="previews per second")
+    parser.add_argument("--final-every", type=float, default=0.5, help="seconds between final submissions")
+    parser.add_argument("--job-sec", type=float, default=0.2)
+    parser.add_argument("--duration", type=float, default=8.0)
+    parser.add_argument("--max-final-wait", type=float, default=0.5, help="p95 limit (s) for the finals")
+    args = parser.parse_args()
+
+    scheduler = InferenceScheduler(slots=args.slots)
+    waits = asyncio.run(simulate(scheduler, args.preview_rate, args.final_every, args.job_sec, args.duration))
+
+    print(f"slots={args.slots} previews={args.preview_rate}/s job={args.job_sec}s "
+          f"starvation={scheduler.starvation_sec}s every {scheduler.starvation_every} grants")
+    for priority, values in waits.items():
+        if values:
+            print(f"{priority:<9} served={len(values):>4} p50={np.percentile(values, 50):.3f}s "
+                  f"p95={np.percentile(values, 95):.3f}s max={max(values):.3f}s")
+    final_p95 = float(np.percentile(waits["final"], 95)) if waits["final"] else 0.0
+    if final_p95 > args.max_final_wait:
+        print(f"FAIL: final p95 wait {final_p95:.3f}s > {args.max_final_wait}s")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Offline build of the UMAP background artifacts from Quick, Draw! bitmaps.
+
+Regenerates, with the model in config.MODEL_PATH, the three files named in
+plotting_api.UMAP_ARTIFACT_PARAMS plus the scale metadata sidecar:
+
+    background_embedding_5per_class.csv   class, emb_0 ... (--raw-per-class rows per class)
+    background_Umap.csv                   class, umap_x, umap_y, scale_x, scale_y, cluster
+    background_Umap_top72.joblib          the fitted UMAP reducer
+    background_Umap.meta.json             scale coefficients (umap_auto.write_umap_metadata)
+
+Input is a directory of Quick, Draw! numpy bitmap files ({class}.npy or
+full_numpy_bitmap_{class}.npy, N x 784 uint8, white strokes on black, i.e.
+what process_image_to_model_input produces from the canvas). Stages:
+
+1. embed    --per-class drawings per class are read from the memory-mapped
+            files in --chunk rows and embedded by a process pool, each
+            worker holding the embed_model of ml_utils.load_model(). Results
+            go to a disk-backed array in --work-dir, not to memory.
+2. fit      the reducer is fitted on at most --fit-per-class rows per class.
+3. project  all embeddings are transformed in chunks to a disk-backed 2D array.
+4. write    scale_x/scale_y standardise each axis (mean 0, std 1); cluster is
+            a MiniBatchKMeans of the scaled points fitted chunk by chunk; the
+            CSV is appended chunk by chunk.
+
+Memory therefore depends on --chunk, --workers and --fit-per-class, not on
+--per-class. Outputs are written under temporary names and renamed at the
+end; restart the API afterwards (the ANN index rebuilds itself, its sidecar
+no longer matches the new CSV).
+
+Run from backend/:
+    python build_artifacts.py --data-dir ~/quickdraw/numpy_bitmap --per-class 2000
+    python build_artifacts.py --data-dir ... --classes "apple,police car" --out ./feature/new
+"""
+
+import os
+import time
+import shutil
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import joblib
+
+from umap_auto import write_umap_metadata, _file_sha256
+
+BITMAP_SIZE = 28 * 28
+
+_embed_model = None
+
+
+# ---------- Stage 1: embedding (worker processes) ----------
+
+def _init_worker() -> None:
+    """Load the model once per worker (TensorFlow is not fork-safe: workers are spawned)."""
+    global _embed_model
+    import ml_utils
+    _, _embed_model = ml_utils.load_model()
+    if _embed_model is None:
+        raise RuntimeError("Could not load the model for embedding")
+
+
+def _embed_chunk(offset: int, bitmaps: np.ndarray, batch_size: int):
+    x = bitmaps.reshape(-1, 28, 28, 1).astype(np.float32) / 255.0
+    embeddings = _embed_model.predict(x, batch_size=batch_size, verbose=0)
+    return offset, np.asarray(embeddings, dtype=np.float32).reshape(len(x), -1)
+
+
+def bitmap_path(data_dir: str, class_name: str) -> str:
+    for name in dict.fromkeys((class_name, class_name.replace("_", " "), class_name.replace(" ", "_"))):
+        for filename in (f"{name}.npy", f"full_numpy_bitmap_{name}.npy"):
+            path = os.path.join(data_dir, filename)
+            if os.path.exists(path):
+                return path
+    raise FileNotFoundError(f"No bitmap file for class '{class_name}' in {data_dir}")
+
+
+def select_rows(n_available: int, n: Optional[int], rng: np.random.Generator) -> np.ndarray:
+    """Sorted random rows (sequential reads from the memory map), or all rows."""
+    if n is None or n >= n_available:
+        return np.arange(n_available)
+    return np.sort(rng.choice(n_available, size=n, replace=False))
+
+
+def class_rows(codes: np.ndarray, code: int, n: Optional[int], rng: np.random.Generator) -> np.ndarray:
+    """Up to n random rows (positions in the embedding array) of one class."""
+    rows = np.flatnonzero(codes == code)
+    return rows[select_rows(len(rows), n, rng)]
+
+
+def embed_bitmaps(data_dir: str, classes: List[str], work_dir: str, per_class: Optional[int],
+                  chunk: int = 2048, workers: int = 2, batch_size: int = 256, seed: int = 42) -> Dict[str, Any]:
+    """
+    Embed the selected drawings of every class into {work_dir}/embeddings.npy
+    (float32, disk-backed); row class codes go to {work_dir}/class_codes.npy.
+    """
+    rng = np.random.default_rng(seed)
+    sources = []
+    for code, class_name in enumerate(classes):
+        bitmaps = np.load(bitmap_path(data_dir, class_name), mmap_mode="r")
+        if bitmaps.ndim != 2 or bitmaps.shape[1] != BITMAP_SIZE:
+            raise ValueError(f"{class_name}: expected N x {BITMAP_SIZE} bitmaps, got {bitmaps.shape}")
+        sources.append((code, bitmaps, select_rows(len(bitmaps), per_class, rng)))
+    total = sum(len(rows) for _, _, rows in sources)
+
+    codes = np.lib.format.open_memmap(os.path.join(work_dir, "class_codes.npy"), mode="w+",
+                                      dtype=np.int16, shape=(total,))
+    embeddings = None
+    in_flight = deque()
+    done = chunks_done = 0
+    t0 = time.perf_counter()
+
+    def collect(future) -> None:
+        nonlocal embeddings, done, chunks_done
+        offset, result = future.result()
+        if embeddings is None:
+            # Embedding width is only known once the first chunk is back
+            embeddings = np.lib.format.open_memmap(os.path.join(work_dir, "embeddings.npy"), mode="w+",
+                                                   dtype=np.float32, shape=(total, result.shape[1]))
+        embeddings[offset:offset + len(result)] = result
+        done += len(result)
+        chunks_done += 1
+        if done == total or chunks_done % 20 == 0:
+            print(f"[Build] embedded {done}/{total} ({done / (time.perf_counter() - t0):.0f}/s)")
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+        offset = 0
+        for code, bitmaps, rows in sources:
+            for start in range(0, len(rows), chunk):
+                part = np.ascontiguousarray(bitmaps[rows[start:start + chunk]])
+                codes[offset:offset + len(part)] = code
+                # At most 2 chunks per worker queued: reading never runs ahead of embedding
+                if len(in_flight) >= 2 * workers:
+                    collect(in_flight.popleft())
+                in_flight.append(pool.submit(_embed_chunk, offset, part, batch_size))
+                offset += len(part)
+        while in_flight:
+            collect(in_flight.popleft())
+
+    codes.flush()
+    embeddings.flush()
+    return {"embeddings": embeddings, "codes": codes, "total": total}
+
+
+# ---------- Stages 2-4: reducer, projection, CSVs ----------
+
+def fit_reducer(embeddings: np.ndarray, codes: np.ndarray, n_classes: int, fit_per_class: Optional[int],
+                seed: int = 42, **umap_kwargs) -> Any:
+    import umap
+
+    rng = np.random.default_rng(seed)
+    rows = np.concatenate([class_rows(codes, code, fit_per_class, rng) for code in range(n_classes)])
+    print(f"[Build] fitting UMAP on {len(rows)} rows")
+    reducer = umap.UMAP(n_components=2, random_state=seed, **umap_kwargs)
+    reducer.fit(np.asarray(embeddings[rows]))
+    return reducer
+
+
+def project(reducer: Any, embeddings: np.ndarray, work_dir: str, chunk: int) -> np.ndarray:
+    coords = np.lib.format.open_memmap(os.path.join(work_dir, "umap.npy"), mode="w+",
+                                       dtype=np.float32, shape=(len(embeddings), 2))
+    for start in range(0, len(embeddings), chunk):
+        coords[start:start + chunk] = reducer.transform(np.asarray(embeddings[start:start + chunk]))
+    coords.flush()
+    return coords
+
+
+def write_background_umap(path: str, coords: np.ndarray, codes: np.ndarray, classes: List[str],
+                          n_clusters: int, chunk: int, seed: int = 42) -> Dict[str, List[float]]:
+    """Append the 2D CSV chunk by chunk; returns the scale coefficients."""
+    from sklearn.cluster import MiniBatchKMeans
+
+    # Per-axis mean / std in one pass (float64 sums of float32 chunks)
+    sums, squares = np.zeros(2), np.zeros(2)
+    for start in range(0, len(coords), chunk):
+        part = coords[start:start + chunk].astype(np.float64)
+        sums += part.sum(axis=0)
+        squares += (part ** 2).sum(axis=0)
+    mean = sums / len(coords)
+    std = np.sqrt(np.maximum(squares / len(coords) - mean ** 2, 1e-12))
+
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=seed, n_init=3, batch_size=chunk)
+    # The first partial_fit needs at least n_clusters rows
+    first = max(chunk, n_clusters)
+    kmeans.partial_fit((coords[:first] - mean) / std)
+    for start in range(first, len(coords), chunk):
+        kmeans.partial_fit((coords[start:start + chunk] - mean) / std)
+
+    class_names = np.asarray(classes, dtype=object)
+    for start in range(0, len(coords), chunk):
+        part = np.asarray(coords[start:start + chunk], dtype=np.float64)
+        scaled = (part - mean) / std
+        frame = pd.DataFrame({
+            "class": class_names[codes[start:start + chunk]],
+            "umap_x": part[:, 0],
+            "umap_y": part[:, 1],
+            "scale_x": scaled[:, 0],
+            "scale_y": scaled[:, 1],
+            "cluster": kmeans.predict(scaled).astype(float),
+        })
+        frame.to_csv(path, mode="a" if start else "w", header=not start, index=False, float_format="%.7g")
+
+    # scale = (umap - mean) / std, as the [m, c] of umap_auto._apply_linear_scale
+    return {axis: [float(1 / std[i]), float(-mean[i] / std[i])] for i, axis in enumerate(("x", "y"))}
+
+
+def write_raw_embeddings(path: str, embeddings: np.ndarray, codes: np.ndarray, classes: List[str],
+                         per_class: int, seed: int = 42) -> None:
+    rng = np.random.default_rng(seed)
+    frames = []
+    for code, class_name in enumerate(classes):
+        rows = class_rows(codes, code, per_class, rng)
+        frame = pd.DataFrame(np.asarray(embeddings[rows]), columns=[f"emb_{i}" for i in range(embeddings.shape[1])])
+        frame.insert(0, "class", class_name)
+        frames.append(frame)
+    pd.concat(frames, ignore_index=True).to_csv(path, index=False)
+
+
+def build(data_dir: str, classes: List[str], out_dir: str, per_class: Optional[int] = 2000,
+          fit_per_class: Optional[int] = 2000, raw_per_class: int = 5, n_clusters: int = 6,
+          chunk: int = 2048, workers: int = 2, batch_size: int = 256, seed: int = 42,
+          work_dir: Optional[str] = None, keep_work: bool = False, **umap_kwargs) -> Dict[str, str]:
+    from plotting_api import UMAP_ARTIFACT_PARAMS as P
+
+    os.makedirs(out_dir, exist_ok=True)
+    work_dir = work_dir or os.path.join(out_dir, ".build")
+    os.makedirs(work_dir, exist_ok=True)
+    paths = {
+        "raw_embedding_csv": os.path.join(out_dir, os.path.basename(P["raw_embedding_csv"])),
+        "umap_background_csv": os.path.join(out_dir, os.path.basename(P["umap_background_csv"])),
+        "umap_reducer_path": os.path.join(out_dir, os.path.basename(P["umap_reducer_path"])),
+    }
+    staged = {name: path + ".tmp" for name, path in paths.items()}
+
+    t0 = time.perf_counter()
+    embedded = embed_bitmaps(data_dir, classes, work_dir, per_class, chunk, workers, batch_size, seed)
+    embeddings, codes = embedded["embeddings"], embedded["codes"]
+    print(f"[Build] {embedded['total']} drawings embedded ({time.perf_counter() - t0:.1f}s)")
+
+    reducer = fit_reducer(embeddings, codes, len(classes), fit_per_class, seed, **umap_kwargs)
+    joblib.dump(reducer, staged["umap_reducer_path"])
+    coords = project(reducer, embeddings, work_dir, chunk)
+    print(f"[Build] projected ({time.perf_counter() - t0:.1f}s)")
+
+    coefficients = write_background_umap(staged["umap_background_csv"], coords, codes, classes, n_clusters, chunk, seed)
+    write_raw_embeddings(staged["raw_embedding_csv"], embeddings, codes, classes, raw_per_class, seed)
+
+    for name, path in paths.items():
+        os.replace(staged[name], path)
+    metadata = {
+        "source": os.path.basename(paths["umap_background_csv"]),
+        "source_sha256": _file_sha256(paths["umap_background_csv"]),
+        "num_rows": int(len(coords)),
+        "scale_coefficients": coefficients,
+    }
+    paths["metadata"] = write_umap_metadata(paths["umap_background_csv"], metadata)
+
+    del embeddings, codes, coords
+    if not keep_work:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"[Build] wrote {', '.join(paths.values())} ({time.perf_counter() - t0:.1f}s)")
+    return paths
+
+
+def default_classes() -> List[str]:
+    """Classes of the current background artifact, so a rebuild keeps the same set."""
+    from plotting_api import UMAP_ARTIFACT_PARAMS as P
+    return pd.read_csv(P["raw_embedding_csv"], usecols=[P["bg_class_col"]])[P["bg_class_col"]].drop_duplicates().tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", required=True, help="directory of Quick, Draw! numpy bitmap files")
+    parser.add_argument("--out", default="./feature")
+    parser.add_argument("--classes", default=None, help="comma separated (default: classes of the current artifact)")
+    parser.add_argument("--per-class", type=int, default=2000, help="drawings per class (0 = all)")
+    parser.add_argument("--fit-per-class", type=int, default=2000, help="drawings per class to fit UMAP on (0 = all)")
+    parser.add_argument("--raw-per-class", type=int, default=5)
+    parser.add_argument("--clusters", type=int, default=6)
+    parser.add_argument("--chunk", type=int, default=2048)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--n-neighbors", type=int, default=15)
+    parser.add_argument("--min-dist", type=float, default=0.1)
+    parser.add_argument("--metric", default="euclidean")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--work-dir", default=None, help="disk-backed intermediate arrays (default: OUT/.build)")
+    parser.add_argument("--keep-work", action="store_true")
+    args = parser.parse_args()
+
+    classes = [c.strip() for c in args.classes.split(",")] if args.classes else default_classes()
+    build(
+        args.data_dir, classes, args.out,
+        per_class=args.per_class or None, fit_per_class=args.fit_per_class or None,
+        raw_per_class=args.raw_per_class, n_clusters=args.clusters, chunk=args.chunk,
+        workers=args.workers, batch_size=args.batch_size, seed=args.seed,
+        work_dir=args.work_dir, keep_work=args.keep_work,
+        n_neighbors=args.n_neighbors, min_dist=args.min_dist, metric=args.metric,
+    )
+
+
+if __name__ == "__main__":
+    main()
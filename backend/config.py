@@ -12,5 +12,56 @@ REDIS_EXPIRE_SEC = 86400  # 24 hours
 
 UPLOAD_DIR = "uploads"
 
+# Plot rendering worker pool (0 workers = render in a thread of the API process, one job at a time)
+RENDER_POOL_SIZE = 2
+RENDER_POOL_MAX_QUEUE = 16
+RENDER_POOL_TIMEOUT_SEC = 30
+
+# Warm-up after startup: False = serve /api/health at once and report
+# /api/ready when warm-up finishes; True = finish warm-up before serving
+WARMUP_ENABLED = True
+WARMUP_BLOCKING = False
+
+# Model calls run in INFERENCE_SLOTS threads, final submissions before realtime
+# previews; a call waiting INFERENCE_STARVATION_SEC may go first (never ahead of a
+# final) for at most one of every INFERENCE_STARVATION_EVERY grants (inference_scheduler.py)
+INFERENCE_SLOTS = 2
+INFERENCE_STARVATION_SEC = 2.0
+INFERENCE_STARVATION_EVERY = 4
+
+# Realtime preview frames waiting or running before new ones are skipped as
+# "overloaded" (see realtime_queue.py)
+REALTIME_MAX_BACKLOG = 32
+
+# Preview interval advised to sketch.js (next_poll_ms): REALTIME_POLL_MIN_MS when
+# idle, growing with the realtime backlog and recent frame latency up to the max
+REALTIME_POLL_MIN_MS = 500
+REALTIME_POLL_MAX_MS = 4000
+
+# Per-request Server-Timing header and opt-in profiling (X-Debug-Profile header,
+# honoured only for clients in PROFILE_TRUSTED_IPS)
+SERVER_TIMING_ENABLED = True
+PROFILE_TRUSTED_IPS = ["127.0.0.1", "::1"]
+PROFILE_DIR = "profiles"
+
+# Nearest-neighbour index over the background embeddings (ann_index.py)
+ANN_METRIC = "cosine"
+ANN_N_NEIGHBORS = 30
+ANN_MAX_K = 20
+# Exact search (one matrix product) below this many background rows; above it
+# the NN-descent index, prepared in the background on first use
+ANN_MIN_ROWS = 50000
+
+# Each worker checks the deployed model version (model:desired in Redis, set by
+# POST /api/debug/models) this often and hot-swaps to it (model_rollout.py)
+MODEL_WATCH_INTERVAL_SEC = 5.0
+
+# Background points per class on the UMAP plots; the only value /api/umap-background
+# serves, so clients cannot make the worker cache arbitrary reductions
+UMAP_BACKGROUND_SAMPLES_PER_CLASS = 500
+
+# Rendered plots are cached per drawing-set version, so entries never go stale
+PLOT_CACHE_TTL_SEC = 86400
+
 
 API_CLIENT = ""
\ No newline at end of file
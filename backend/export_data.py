@@ -0,0 +1,387 @@
+"""
+Streaming export of sessions and drawings for offline analysis.
+
+Walks the session:* hashes with SCAN (never KEYS), --batch keys at a time.
+Each batch is fetched in two pipelined round trips (session hashes and their
+drawing lists, then the drawing hashes), turned into rows by a generator and
+written out before the next batch is read (each batch is one Parquet row
+group, built column by column with the embeddings as one (n, dim) float32
+array), so memory is bounded by one batch whatever the size of the
+keyspace. --sleep spaces the batches out to keep the load on a live server
+low.
+
+Output in --out, a new pair of part files every --part-sessions sessions:
+
+    sessions-00000.parquet|.ndjson   one row per session
+    drawings-00000.parquet|.ndjson   one row per drawing: probability of the
+                                     prompt, top class, all predictions as
+                                     JSON, the embedding as float32 columns
+                                     emb_000 ... (null when missing)
+    images/{session_id}_{round}.png             with --images
+    images/{session_id}_{round}_original.png
+    export_state.json                SCAN cursor after the last complete part
+
+Parts are written to .tmp files and renamed once complete, and only then is
+the cursor saved, so --resume continues after the last complete part. SCAN
+may return a key more than once (when Redis resizes its table during the
+walk); session_id, and (session_id, round) for drawings, identify rows.
+
+Parquet needs pyarrow.
+
+Run from backend/:
+    python export_data.py --out exports --format parquet --images
+    python export_data.py --out exports --resume
+"""
+
+import os
+import json
+import time
+import base64
+import argparse
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from redis_utils import get_redis
+
+STATE_FILE = "export_state.json"
+FORMATS = {"parquet": ".parquet", "ndjson": ".ndjson"}
+
+SESSION_COLUMNS = {
+    "session_id": "string",
+    "player_name": "string",
+    "gender": "string",
+    "age": "int64",
+    "difficulty": "string",
+    "timestamp": "string",
+    "num_rounds": "int64",
+    "prompts": "string",    # JSON list
+    "rounds": "string",     # JSON list of the choices per round
+}
+DRAWING_COLUMNS = {
+    "session_id": "string",
+    "round": "int64",
+    "prompt": "string",
+    "time_spent_sec": "float64",
+    "timed_out": "bool",
+    "timestamp": "string",
+    "prompt_probability": "float64",
+    "top_class": "string",
+    "top_probability": "float64",
+    "predictions": "string",      # JSON object class -> probability
+    "round_choices": "string",    # JSON list
+    "model_version": "string",
+    "image_file": "string",
+    "original_image_file": "string",
+}
+DRAWING_FIELDS = ["session_id", "round", "prompt", "time_spent_sec", "timed_out", "timestamp",
+                  "predictions", "round_choices", "model_version", "embedding"]
+IMAGE_FIELDS = ["image_base64", "original_image_data"]
+
+
+def embedding_columns(dim: int) -> List[str]:
+    return [f"emb_{i:03d}" for i in range(dim)]
+
+
+def _int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _json(value: Optional[str], default: Any) -> Any:
+    try:
+        return json.loads(value) if value else default
+    except ValueError:
+        return default
+
+
+def _image_extension(data: bytes) -> str:
+    if data.startswith(b"\x89PNG"):
+        return ".png"
+    if data.startswith(b"\xff\xd8"):
+        return ".jpg"
+    return ".bin"
+
+
+def probe_embedding_dim(r, count: int = 500) -> int:
+    """Length of the first stored drawing embedding (0 when there is none)."""
+    for key in r.scan_iter(match="drawing:*", count=count):
+        embedding = _json(r.hget(key, "embedding"), None)
+        if embedding:
+            return len(embedding)
+    return 0
+
+
+def scan_session_batches(r, cursor: int = 0, batch: int = 200) -> Iterator[Tuple[int, List[str]]]:
+    """(cursor after the batch, session hash keys) until SCAN has covered the keyspace."""
+    while True:
+        cursor, keys = r.scan(cursor=cursor, match="session:*", count=batch)
+        cursor = int(cursor)
+        # session:{id}:drawings lists match the pattern too
+        yield cursor, [k for k in keys if k.count(":") == 1]
+        if cursor == 0:
+            return
+
+
+def fetch_batch(r, keys: List[str], images: bool) -> List[Tuple[Dict[str, str], List[Dict[str, Optional[str]]]]]:
+    """Session hashes with their drawing hashes, in two pipelined round trips."""
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.hgetall(key)
+        pipe.lrange(f"{key}:drawings", 0, -1)
+    results = pipe.execute() if keys else []
+
+    fields = DRAWING_FIELDS + IMAGE_FIELDS if images else DRAWING_FIELDS
+    # A resubmitted round is pushed to the list again: keep each drawing once
+    drawing_ids = [list(dict.fromkeys(ids)) for ids in results[1::2]]
+    pipe = r.pipeline(transaction=False)
+    for ids in drawing_ids:
+        for drawing_id in ids:
+            pipe.hmget(drawing_id, fields)
+    values = iter(pipe.execute() if any(drawing_ids) else [])
+
+    batch = []
+    for session, ids in zip(results[0::2], drawing_ids):
+        drawings = [dict(zip(fields, next(values))) for _ in ids]
+        if session:
+            batch.append((session, [d for d in drawings if d.get("session_id") is not None]))
+    return batch
+
+
+def session_row(session: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        "session_id": session.get("session_id"),
+        "player_name": session.get("player_name"),
+        "gender": session.get("gender"),
+        "age": _int(session.get("age")),
+        "difficulty": session.get("difficulty"),
+        "timestamp": session.get("timestamp"),
+        "num_rounds": len(_json(session.get("rounds"), [])),
+        "prompts": session.get("prompts"),
+        "rounds": session.get("rounds"),
+    }
+
+
+def drawing_row(drawing: Dict[str, Optional[str]], embedding_dim: int,
+                image_dir: Optional[str]) -> Tuple[Dict[str, Any], Optional[List[float]]]:
+    """Row of one drawing, and its embedding (None when missing or not embedding_dim long)."""
+    predictions = _json(drawing.get("predictions"), {})
+    top_class = max(predictions, key=predictions.get) if predictions else None
+    prompt = drawing.get("prompt")
+    row = {
+        "session_id": drawing.get("session_id"),
+        "round": _int(drawing.get("round")),
+        "prompt": prompt,
+        "time_spent_sec": _float(drawing.get("time_spent_sec")),
+        "timed_out": bool(_int(drawing.get("timed_out"))),
+        "timestamp": drawing.get("timestamp"),
+        "prompt_probability": _float(predictions.get(prompt, 0.0)) if predictions else None,
+        "top_class": top_class,
+        "top_probability": _float(predictions[top_class]) if top_class else None,
+        "predictions": drawing.get("predictions"),
+        "round_choices": drawing.get("round_choices"),
+        "model_version": drawing.get("model_version"),
+        "image_file": None,
+        "original_image_file": None,
+    }
+
+    embedding = _json(drawing.get("embedding"), None)
+    if not isinstance(embedding, list) or len(embedding) != embedding_dim:
+        embedding = None
+
+    if image_dir is not None:
+        name = f"{row['session_id']}_{row['round']}"
+        for field, column, suffix in (("image_base64", "image_file", ""),
+                                      ("original_image_data", "original_image_file", "_original")):
+            if not drawing.get(field):
+                continue
+            data = base64.b64decode(drawing[field])
+            filename = name + suffix + _image_extension(data)
+            with open(os.path.join(image_dir, filename), "wb") as f:
+                f.write(data)
+            row[column] = os.path.join("images", filename)
+    return row, embedding
+
+
+def iter_rows(r, cursor: int, batch: int, embedding_dim: int, image_dir: Optional[str], sleep: float = 0.0
+              ) -> Iterator[Tuple[int, List[Dict[str, Any]], List[Dict[str, Any]], np.ndarray, int]]:
+    """
+    Per SCAN batch: (cursor after it, session rows, drawing rows, their
+    embeddings as an (n, embedding_dim) float32 array with NaN rows where
+    missing, drawings without a usable embedding).
+    """
+    for cursor, keys in scan_session_batches(r, cursor, batch):
+        sessions, drawings = [], []
+        embeddings: List[Optional[List[float]]] = []
+        for session, session_drawings in fetch_batch(r, keys, image_dir is not None):
+            sessions.append(session_row(session))
+            for drawing in sorted(session_drawings, key=lambda d: _int(d.get("round")) or 0):
+                row, embedding = drawing_row(drawing, embedding_dim, image_dir)
+                drawings.append(row)
+                embeddings.append(embedding)
+        matrix = np.full((len(drawings), embedding_dim), np.nan, dtype=np.float32)
+        missing = 0
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing += 1
+            else:
+                matrix[i] = embedding
+        yield cursor, sessions, drawings, matrix, missing if embedding_dim else 0
+        if sleep and cursor != 0:
+            time.sleep(sleep)
+
+
+class NdjsonPart:
+    def __init__(self, path: str, columns: Dict[str, str], emb_columns: Sequence[str] = ()):
+        self.path = path
+        self.emb_columns = list(emb_columns)
+        self.rows = 0
+        self.f = open(path + ".tmp", "w", encoding="utf-8")
+
+    def write(self, rows: List[Dict[str, Any]], embeddings: Optional[np.ndarray] = None) -> None:
+        for i, row in enumerate(rows):
+            if self.emb_columns:
+                row = {**row, **{c: None if v != v else v for c, v in zip(self.emb_columns, embeddings[i].tolist())}}
+            self.f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.rows += len(rows)
+
+    def close(self) -> None:
+        self.f.close()
+        os.replace(self.path + ".tmp", self.path)
+
+
+class ParquetPart:
+    """One Parquet file; every write() becomes its own row group."""
+
+    def __init__(self, path: str, columns: Dict[str, str], emb_columns: Sequence[str] = ()):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow), or use --format ndjson")
+        self.pa = pa
+        self.path = path
+        self.rows = 0
+        types = {"string": pa.string(), "int64": pa.int64(), "float64": pa.float64(), "bool": pa.bool_()}
+        self.columns = [(name, types[t]) for name, t in columns.items()]
+        self.emb_columns = list(emb_columns)
+        self.schema = pa.schema(self.columns + [(name, pa.float32()) for name in self.emb_columns])
+        self.writer = pq.ParquetWriter(path + ".tmp", self.schema, compression="zstd")
+
+    def write(self, rows: List[Dict[str, Any]], embeddings: Optional[np.ndarray] = None) -> None:
+        if not rows:
+            return
+        pa = self.pa
+        arrays = [pa.array([row[name] for row in rows], type=t) for name, t in self.columns]
+        if self.emb_columns:
+            missing = np.isnan(embeddings[:, 0])
+            by_column = np.ascontiguousarray(embeddings.T)
+            arrays += [pa.array(column, type=pa.float32(), mask=missing) for column in by_column]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.rows += len(rows)
+
+    def close(self) -> None:
+        self.writer.close()
+        os.replace(self.path + ".tmp", self.path)
+
+
+def _load_state(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_state(path: str, state: Dict[str, Any]) -> None:
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def export(r, out_dir: str, fmt: str = "parquet", batch: int = 200, part_sessions: int = 10000,
+           images: bool = False, resume: bool = False, sleep: float = 0.0,
+           embedding_dim: Optional[int] = None) -> Dict[str, Any]:
+    """Export (or continue exporting) into out_dir; returns the final state."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    os.makedirs(out_dir, exist_ok=True)
+    state_path = os.path.join(out_dir, STATE_FILE)
+    state = _load_state(state_path) if resume else None
+    if state is None:
+        if embedding_dim is None:
+            embedding_dim = probe_embedding_dim(r)
+        state = {"format": fmt, "images": images, "embedding_dim": embedding_dim, "cursor": 0, "part": 0,
+                 "sessions": 0, "drawings": 0, "bad_embeddings": 0, "done": False}
+        _save_state(state_path, state)
+    elif state["done"]:
+        print(f"[Export] {out_dir} is already complete")
+        return state
+    # A resumed export keeps its format and columns so all parts share one schema
+    fmt, images, emb_columns = state["format"], state["images"], embedding_columns(state["embedding_dim"])
+
+    image_dir = os.path.join(out_dir, "images") if images else None
+    if image_dir:
+        os.makedirs(image_dir, exist_ok=True)
+    part_class = ParquetPart if fmt == "parquet" else NdjsonPart
+
+    rows = iter_rows(r, state["cursor"], batch, state["embedding_dim"], image_dir, sleep)
+    while not state["done"]:
+        suffix = f"-{state['part']:05d}{FORMATS[fmt]}"
+        sessions = part_class(os.path.join(out_dir, "sessions" + suffix), SESSION_COLUMNS)
+        drawings = part_class(os.path.join(out_dir, "drawings" + suffix), DRAWING_COLUMNS, emb_columns)
+        cursor, bad_embeddings = state["cursor"], 0
+        for cursor, session_rows, drawing_rows, embeddings, bad in rows:
+            sessions.write(session_rows)
+            drawings.write(drawing_rows, embeddings)
+            bad_embeddings += bad
+            if sessions.rows >= part_sessions:
+                break
+        sessions.close()
+        drawings.close()
+
+        # Saved only once the part files are complete
+        state.update(
+            cursor=cursor, part=state["part"] + 1, done=cursor == 0,
+            sessions=state["sessions"] + sessions.rows, drawings=state["drawings"] + drawings.rows,
+            bad_embeddings=state["bad_embeddings"] + bad_embeddings,
+        )
+        _save_state(state_path, state)
+        print(f"[Export] part {state['part'] - 1}: {sessions.rows} sessions, {drawings.rows} drawings "
+              f"(total {state['sessions']} / {state['drawings']})")
+
+    if state["bad_embeddings"]:
+        print(f"[Export] {state['bad_embeddings']} drawings had no embedding of length {state['embedding_dim']}")
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="exports")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    parser.add_argument("--batch", type=int, default=200,
+                        help="SCAN COUNT / sessions per pipelined fetch and per Parquet row group")
+    parser.add_argument("--part-sessions", type=int, default=10000, help="sessions per part file")
+    parser.add_argument("--images", action="store_true", help="write drawings as image side files")
+    parser.add_argument("--sleep", type=float, default=0.0, help="seconds to wait between batches")
+    parser.add_argument("--embedding-dim", type=int, default=None, help="default: length of the first stored embedding")
+    parser.add_argument("--resume", action="store_true", help="continue from export_state.json in --out")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    state = export(get_redis(), args.out, fmt=args.format, batch=args.batch, part_sessions=args.part_sessions,
+                   images=args.images, resume=args.resume, sleep=args.sleep, embedding_dim=args.embedding_dim)
+    print(f"[Export] {state['sessions']} sessions, {state['drawings']} drawings in {state['part']} parts "
+          f"to {args.out} ({time.perf_counter() - t0:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
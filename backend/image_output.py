@@ -0,0 +1,119 @@
+"""
+Image output stage shared by the UMAP and radar plots.
+
+Plots are rendered once at full ("print") size and stored in Redis as raw
+PNG bytes. Smaller size tiers and other formats are derived from that master
+on request and cached next to it under `{redis_key}:{tier}.{format}`.
+"""
+
+import io
+import base64
+from typing import Optional, Tuple
+
+from PIL import Image
+from redis_utils import get_redis_binary
+
+# Size tier -> maximum image width in pixels (None = full render size)
+SIZE_TIERS = {
+    "thumbnail": 480,
+    "screen": 1280,
+    "print": None,
+}
+IMAGE_FORMATS = {
+    "png": "image/png",
+    "webp": "image/webp",
+}
+DEFAULT_TIER = "print"
+DEFAULT_FORMAT = "png"
+
+_PNG_MAGIC = b"\x89PNG"
+_WEBP_MAGIC = b"RIFF"
+
+
+def normalize_output(size: Optional[str], image_format: Optional[str]) -> Tuple[str, str]:
+    """
+    Validate a (size tier, format) request; None falls back to the defaults.
+    Raises ValueError for unknown values.
+    """
+    tier = (size or DEFAULT_TIER).lower()
+    fmt = (image_format or DEFAULT_FORMAT).lower()
+    if tier not in SIZE_TIERS:
+        raise ValueError(f"Unknown size '{size}', expected one of {list(SIZE_TIERS)}")
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format '{image_format}', expected one of {list(IMAGE_FORMATS)}")
+    return tier, fmt
+
+
+def mime_type(image_format: str) -> str:
+    return IMAGE_FORMATS[image_format]
+
+
+def variant_key(redis_key: str, tier: str, image_format: str) -> str:
+    """Redis key of a size/format variant (the master is stored under redis_key itself)."""
+    if tier == DEFAULT_TIER and image_format == DEFAULT_FORMAT:
+        return redis_key
+    return f"{redis_key}:{tier}.{image_format}"
+
+
+def encode_image(image_bytes: bytes, tier: str, image_format: str) -> bytes:
+    """
+    Re-encode a master image for a size tier and format.
+    PNG is written with optimize=True, WebP losslessly.
+    """
+    img = Image.open(io.BytesIO(image_bytes))
+    img.load()
+
+    max_width = SIZE_TIERS[tier]
+    if max_width is not None and img.width > max_width:
+        height = max(1, round(img.height * max_width / img.width))
+        img = img.resize((max_width, height), Image.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    if image_format == "webp":
+        img.save(buffer, format="WEBP", lossless=True, method=4)
+    else:
+        img.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def decode_stored_image(value: Optional[bytes]) -> Optional[bytes]:
+    """
+    Raw image bytes from a stored value. Entries written before raw storage
+    hold base64 text instead and are decoded here.
+    """
+    if not value:
+        return None
+    if value.startswith(_PNG_MAGIC) or value.startswith(_WEBP_MAGIC):
+        return value
+    try:
+        return base64.b64decode(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def store_image(redis_key: str, image_bytes: bytes, expire_sec: Optional[int] = None) -> None:
+    """Store raw image bytes (no base64) in Redis."""
+    get_redis_binary().set(redis_key, image_bytes, ex=expire_sec)
+
+
+def load_image(redis_key: str) -> Optional[bytes]:
+    return decode_stored_image(get_redis_binary().get(redis_key))
+
+
+def load_cached_variant(redis_key: str, tier: str, image_format: str) -> Optional[bytes]:
+    """Stored variant bytes, or None if the variant has not been derived yet."""
+    return load_image(variant_key(redis_key, tier, image_format))
+
+
+def store_variant(redis_key: str, tier: str, image_format: str, image_bytes: bytes) -> None:
+    """Store a derived variant with the same remaining TTL as its master."""
+    r = get_redis_binary()
+    ttl_ms = r.pttl(redis_key)
+    if ttl_ms and ttl_ms > 0:
+        r.set(variant_key(redis_key, tier, image_format), image_bytes, px=ttl_ms)
+    else:
+        r.set(variant_key(redis_key, tier, image_format), image_bytes)
+
+
+def to_base64(image_bytes: bytes) -> str:
+    return base64.b64encode(image_bytes).decode("utf-8")
@@ -0,0 +1,123 @@
+"""
+Priority scheduling of model calls.
+
+All inference runs in INFERENCE_SLOTS threads. When a slot frees up it goes
+to the waiting call of the highest priority class:
+
+    final     /api/predict submissions (decide the round result)
+    batch     bulk / offline model calls
+    realtime  /api/predict-realtime previews (cosmetic, frequent)
+
+so a final submission waits for at most the calls already running, however
+many previews are queued. Starvation protection: while no final submission
+is waiting, a call that has waited INFERENCE_STARVATION_SEC may jump the
+priority order, but for at most one of every INFERENCE_STARVATION_EVERY
+grants. Under a steady preview backlog every queued frame is "starved", so an
+unconditional rule would turn the scheduler into FIFO. Queue wait per class
+is exported as quickdraw_inference_queue_wait_seconds
+(benchmarks/scheduler_sim.py checks the final wait under overload).
+"""
+
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from config import INFERENCE_SLOTS, INFERENCE_STARVATION_SEC, INFERENCE_STARVATION_EVERY
+from metrics import observe_queue_wait
+
+PRIORITY_CLASSES = ("final", "batch", "realtime")   # highest priority first
+
+
+class InferenceScheduler:
+    def __init__(self, slots: int = INFERENCE_SLOTS, starvation_sec: float = INFERENCE_STARVATION_SEC,
+                 starvation_every: int = INFERENCE_STARVATION_EVERY):
+        self.slots = slots
+        self.starvation_sec = starvation_sec
+        self.starvation_every = starvation_every
+        self._since_starved = starvation_every    # grants since a starved call last jumped the order
+        self.busy = 0
+        self._waiters: Dict[str, Deque[Tuple[float, asyncio.Future]]] = {c: deque() for c in PRIORITY_CLASSES}
+
+    def depth(self, priority: Optional[str] = None) -> int:
+        """Calls waiting for a slot (of one class, or all)."""
+        if priority is not None:
+            return len(self._waiters[priority])
+        return sum(len(q) for q in self._waiters.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "slots": self.slots,
+            "busy": self.busy,
+            "waiting": {c: len(q) for c, q in self._waiters.items()},
+        }
+
+    def _next_class(self) -> Optional[str]:
+        heads = [(q[0][0], c) for c, q in self._waiters.items() if q]
+        if not heads:
+            return None
+        by_priority = next(c for c in PRIORITY_CLASSES if self._waiters[c])
+        enqueued, oldest = min(heads)
+        # A waiting final submission is never overtaken
+        if (by_priority != "final" and oldest != by_priority
+                and self._since_starved >= self.starvation_every
+                and time.perf_counter() - enqueued >= self.starvation_sec):
+            self._since_starved = 0
+            return oldest
+        self._since_starved += 1
+        return by_priority
+
+    def _dispatch(self) -> None:
+        while self.busy < self.slots:
+            priority = self._next_class()
+            if priority is None:
+                return
+            enqueued, future = self._waiters[priority].popleft()
+            if future.done():
+                continue
+            self.busy += 1
+            future.set_result(None)
+            observe_queue_wait(priority, time.perf_counter() - enqueued)
+
+    async def acquire(self, priority: str) -> None:
+        if priority not in self._waiters:
+            raise ValueError(f"Unknown priority class: {priority}")
+        if self.busy < self.slots and self.depth() == 0:
+            self.busy += 1
+            observe_queue_wait(priority, 0.0)
+            return
+
+        entry = (time.perf_counter(), asyncio.get_running_loop().create_future())
+        self._waiters[priority].append(entry)
+        try:
+            await entry[1]
+        except asyncio.CancelledError:
+            if entry[1].done() and not entry[1].cancelled():
+                self.release()    # granted just before the cancellation
+            else:
+                try:
+                    self._waiters[priority].remove(entry)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self) -> None:
+        self.busy -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: str):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def run(self, priority: str, fn: Callable[..., Any], *args) -> Any:
+        """Run `fn(*args)` in a thread once a slot is granted to this class."""
+        async with self.slot(priority):
+            return await asyncio.to_thread(fn, *args)
+
+
+inference_scheduler = InferenceScheduler()
@@ -0,0 +1,196 @@
+"""
+Leaderboards and percentiles kept up to date as drawings are stored.
+
+predict_drawing calls `record_drawing` for every stored drawing, which
+updates in one MULTI transaction:
+
+    lb:scores:{session_id}   HASH  round -> probability of the prompt (source of the session totals)
+    lb:prompt:{prompt}       ZSET  "{session_id}:{round}" -> probability of the prompt
+    lb:session_total         ZSET  session_id -> total score so far (sum of prompt probability x 100)
+    lb:game_total            ZSET  session_id -> total score, once all rounds are in
+    lb:drawings:{dimension}  HASH  difficulty / age band -> drawings scored
+    lb:games:{dimension}     HASH  difficulty / age band -> games completed
+    lb:score_sum:{dimension} HASH  difficulty / age band -> sum of drawing scores
+
+Rank, percentile (ZCOUNT + ZCARD) and top N (ZREVRANGE) are O(log n) reads;
+nothing scans drawing:* hashes. A re-submitted round replaces its previous
+score instead of adding to it: the session's scores hash is WATCHed while
+the previous score and the totals are read, and the transaction is retried
+if a concurrent submission of the same session changed it. Only writers of
+the same session contend; the shared keys are written, never watched. The
+score matches the score page: the probability of the prompt x 100 per
+round, summed over the game.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import redis
+
+SESSION_SCORES_KEY = "lb:scores:{session_id}"
+PROMPT_KEY = "lb:prompt:{prompt}"
+SESSION_TOTAL_KEY = "lb:session_total"
+GAME_TOTAL_KEY = "lb:game_total"
+DIMENSIONS = ("difficulty", "age_band")
+
+
+def age_band(age: Any) -> str:
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return "unknown"
+    if age < 0:
+        return "unknown"
+    low = age // 10 * 10
+    return f"{low}-{low + 9}"
+
+
+def drawing_score(prompt: str, probs_map: Dict[str, float]) -> float:
+    """Probability of the prompt (0..1), as shown x 100 on the score page."""
+    return float(probs_map.get(prompt, 0.0))
+
+
+def record_drawing(r, session_id: str, round_no: int, prompt: str, probs_map: Dict[str, float],
+                   session_data: Optional[Dict[str, str]], total_rounds: int) -> Dict[str, Any]:
+    """Add (or replace) one drawing's score in all aggregates."""
+    session_data = session_data or {}
+    score = drawing_score(prompt, probs_map)
+    member = f"{session_id}:{round_no}"
+    prompt_key = PROMPT_KEY.format(prompt=prompt)
+    groups = {"difficulty": session_data.get("difficulty") or "unknown", "age_band": age_band(session_data.get("age"))}
+
+    scores_key = SESSION_SCORES_KEY.format(session_id=session_id)
+    field = str(round_no)
+
+    with r.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(scores_key)
+                scores = {k: float(v) for k, v in pipe.hgetall(scores_key).items()}
+                previous = scores.get(field)
+                delta = score - (previous or 0.0)
+                scores[field] = score
+                total = sum(scores.values()) * 100
+                rounds = len(scores)
+
+                pipe.multi()
+                pipe.hset(scores_key, field, score)
+                pipe.zadd(prompt_key, {member: score})
+                pipe.zadd(SESSION_TOTAL_KEY, {session_id: total})
+                for dimension, group in groups.items():
+                    if previous is None:
+                        pipe.hincrby(f"lb:drawings:{dimension}", group, 1)
+                    pipe.hincrbyfloat(f"lb:score_sum:{dimension}", group, delta * 100)
+                # The game counts on the game leaderboard once every round has a score
+                if total_rounds and rounds >= total_rounds:
+                    pipe.zadd(GAME_TOTAL_KEY, {session_id: total})
+                    if previous is None and rounds == total_rounds:
+                        for dimension, group in groups.items():
+                            pipe.hincrby(f"lb:games:{dimension}", group, 1)
+                pipe.execute()
+                break
+            except redis.WatchError:
+                continue
+    return {"score": score * 100, "session_total": total, "rounds": rounds}
+
+
+def percentile(below: int, count: int) -> Optional[float]:
+    """Share of entries (%) scoring strictly below, from ZCOUNT and ZCARD; None for an empty board."""
+    return round(100.0 * below / count, 1) if count else None
+
+
+def top_games(r, n: int = 10) -> List[Dict[str, Any]]:
+    """Top n completed games with the player name."""
+    entries = r.zrevrange(GAME_TOTAL_KEY, 0, n - 1, withscores=True)
+    pipe = r.pipeline()
+    for session_id, _ in entries:
+        pipe.hmget(f"session:{session_id}", "player_name", "difficulty")
+    details = pipe.execute() if entries else []
+    return [
+        {"rank": i + 1, "session_id": session_id, "player_name": name, "difficulty": difficulty,
+         "total_score": round(score, 2)}
+        for i, ((session_id, score), (name, difficulty)) in enumerate(zip(entries, details))
+    ]
+
+
+def top_drawings(r, prompt: str, n: int = 10) -> List[Dict[str, Any]]:
+    """Top n drawings of one prompt (session, round, score)."""
+    entries = r.zrevrange(PROMPT_KEY.format(prompt=prompt), 0, n - 1, withscores=True)
+    result = []
+    for i, (member, score) in enumerate(entries):
+        session_id, _, round_no = member.rpartition(":")
+        result.append({"rank": i + 1, "session_id": session_id, "round": int(round_no), "score": round(score * 100, 2)})
+    return result
+
+
+def session_standing(r, session_id: str, drawings: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Where a session stands: total score, rank and percentile among completed
+    games (None until the session's game is completed), and per drawing the
+    percentile among all drawings of its prompt. `drawings` are (round,
+    prompt) pairs of the session. Two pipelined round trips.
+    """
+    keys = [PROMPT_KEY.format(prompt=drawing["prompt"]) for drawing in drawings]
+    pipe = r.pipeline()
+    pipe.zscore(SESSION_TOTAL_KEY, session_id)
+    pipe.zscore(GAME_TOTAL_KEY, session_id)
+    pipe.zrevrank(GAME_TOTAL_KEY, session_id)
+    pipe.zcard(GAME_TOTAL_KEY)
+    for key, drawing in zip(keys, drawings):
+        pipe.zscore(key, f"{session_id}:{drawing['round']}")
+        pipe.zcard(key)
+    total, game_total, position, games, *per_round = pipe.execute()
+    completed = game_total is not None
+    scored = [(drawing, key, score, count)
+              for drawing, key, score, count in zip(drawings, keys, per_round[0::2], per_round[1::2])
+              if score is not None]
+
+    # Second round trip: the counts below each score
+    pipe = r.pipeline()
+    for _, key, score, _ in scored:
+        pipe.zcount(key, "-inf", f"({score}")
+    if completed:
+        # Only finished games are compared with the totals of finished games
+        pipe.zcount(GAME_TOTAL_KEY, "-inf", f"({game_total}")
+    below = pipe.execute() if scored or completed else []
+
+    rounds = [
+        {
+            "round": drawing["round"],
+            "prompt": drawing["prompt"],
+            "score": round(score * 100, 2),
+            "percentile": percentile(below[i], count),
+            "drawings": count,
+        }
+        for i, (drawing, key, score, count) in enumerate(scored)
+    ]
+    return {
+        "session_id": session_id,
+        "total_score": None if total is None else round(total, 2),
+        "completed": completed,
+        "rank": position + 1 if completed and position is not None else None,
+        "percentile": percentile(below[-1], games) if completed else None,
+        "games": games,
+        "rounds": sorted(rounds, key=lambda x: x["round"]),
+    }
+
+
+def group_stats(r) -> Dict[str, Any]:
+    """Drawings, completed games and average drawing score per difficulty / age band."""
+    pipe = r.pipeline()
+    for dimension in DIMENSIONS:
+        pipe.hgetall(f"lb:drawings:{dimension}")
+        pipe.hgetall(f"lb:games:{dimension}")
+        pipe.hgetall(f"lb:score_sum:{dimension}")
+    results = pipe.execute()
+    stats = {}
+    for i, dimension in enumerate(DIMENSIONS):
+        drawings, games, sums = results[3 * i: 3 * i + 3]
+        stats[dimension] = {
+            group: {
+                "drawings": int(count),
+                "games": int(games.get(group, 0)),
+                "avg_score": round(float(sums.get(group, 0)) / int(count), 2) if int(count) else None,
+            }
+            for group, count in sorted(drawings.items())
+        }
+    return stats
@@ -0,0 +1,36 @@
+"""
+Per-process memory figures from /proc (Linux).
+
+RSS counts shared pages in full for every process, so it overstates the cost
+of forked workers. PSS splits each shared page between the processes sharing
+it (summing PSS over all workers gives real usage), and USS (private pages) is
+what a worker would free on exit.
+"""
+
+import os
+from typing import Dict, Optional, Union
+
+
+def process_memory(pid: Union[int, str] = "self") -> Optional[Dict[str, float]]:
+    """
+    Memory of a process in MB: {"rss", "pss", "uss", "shared"}.
+    Returns None where /proc/<pid>/smaps_rollup is not available.
+    """
+    path = f"/proc/{pid}/smaps_rollup"
+    if not os.path.exists(path):
+        return None
+
+    fields = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+
+    mb = lambda kb: round(kb / 1024, 2)
+    return {
+        "rss": mb(fields.get("Rss", 0)),
+        "pss": mb(fields.get("Pss", 0)),
+        "uss": mb(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)),
+        "shared": mb(fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)),
+    }
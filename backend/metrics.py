@@ -0,0 +1,228 @@
+"""
+In-process metrics with a Prometheus text endpoint (GET /metrics).
+
+Small built-in histogram / counter types instead of a client library: an
+observation is a bisect plus a few additions under a lock, cheap enough to
+leave on in production. Metrics are per process; with serve.py every worker
+exposes its own and Prometheus sums them. Stages timed inside render pool
+workers are captured there and replayed in the API process that ran the job
+(capture_stages / replay_stages).
+
+    with stage_timer("inference"):
+        model.predict(...)
+"""
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets (seconds), from sub-millisecond Redis calls to slow renders
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels[n] for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels[n] for n in self.labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels[n] for n in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(labels[n] for n in self.labels))
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "quickdraw_request_duration_seconds", "HTTP request latency per route.",
+    labels=("method", "route", "status"),
+)
+STAGE_SECONDS = Histogram(
+    "quickdraw_stage_duration_seconds",
+    "Time spent per processing stage (base64, preprocess, inference, embedding, redis, csv_load, "
+    "reducer_load, umap_projection, umap_render, radar_render, image_encode, ann_build, ann_query).",
+    labels=("stage",),
+)
+CACHE_REQUESTS = Counter(
+    "quickdraw_cache_requests_total", "Cache lookups by cache and result (hit / miss).",
+    labels=("cache", "result"),
+)
+INFERENCE_BATCH_SIZE = Histogram(
+    "quickdraw_inference_batch_size", "Number of drawings per model call.",
+    labels=("model",), buckets=BATCH_BUCKETS,
+)
+INFERENCE_QUEUE_WAIT_SECONDS = Histogram(
+    "quickdraw_inference_queue_wait_seconds", "Wait for an inference slot per priority class.",
+    labels=("priority",),
+)
+REALTIME_FRAMES = Counter(
+    "quickdraw_realtime_frames_total", "Realtime preview frames by outcome (computed / superseded / overloaded).",
+    labels=("result",),
+)
+
+REGISTRY = [REQUEST_SECONDS, STAGE_SECONDS, CACHE_REQUESTS, INFERENCE_BATCH_SIZE,
+            INFERENCE_QUEUE_WAIT_SECONDS, REALTIME_FRAMES]
+
+# Stage totals of the current request (stage -> [seconds, calls]), for Server-Timing
+_request_stages: ContextVar[Optional[Dict[str, list]]] = ContextVar("request_stages", default=None)
+# Stage observations of the current render job, sent back from a worker process
+_captured_stages: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("captured_stages", default=None)
+
+
+def begin_request_stages() -> Tuple[Dict[str, list], object]:
+    """Start collecting stage timings for this request; returns (stages, reset token)."""
+    stages: Dict[str, list] = {}
+    return stages, _request_stages.set(stages)
+
+
+def end_request_stages(token) -> None:
+    _request_stages.reset(token)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    captured = _captured_stages.get()
+    if captured is not None:
+        captured.append((stage, seconds))
+    stages = _request_stages.get()
+    if stages is not None:
+        entry = stages.get(stage)
+        if entry is None:
+            stages[stage] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+
+@contextmanager
+def capture_stages():
+    """Collect the (stage, seconds) observations made inside the block."""
+    captured: List[Tuple[str, float]] = []
+    token = _captured_stages.set(captured)
+    try:
+        yield captured
+    finally:
+        _captured_stages.reset(token)
+
+
+def replay_stages(observations: Sequence[Tuple[str, float]]) -> None:
+    """Observe stages captured in another process as if they ran here."""
+    for stage, seconds in observations:
+        observe_stage(stage, seconds)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a block as one processing stage."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - t0)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_batch(model: str, size: int) -> None:
+    INFERENCE_BATCH_SIZE.observe(size, model=model)
+
+
+def observe_queue_wait(priority: str, seconds: float) -> None:
+    INFERENCE_QUEUE_WAIT_SECONDS.observe(seconds, priority=priority)
+
+
+def record_realtime_frame(result: str) -> None:
+    REALTIME_FRAMES.inc(result=result)
+
+
+def render_latest() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def metrics_middleware(request, call_next):
+    """Record request latency labelled with the route template (not the raw path)."""
+    t0 = time.perf_counter()
+    status: Optional[int] = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - t0,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status),
+        )
@@ -1,12 +1,15 @@
 import os
 import json
 import numpy as np
-import keras
-import tensorflow as tf
 from PIL import Image
 import io
 from config import MODEL_PATH, CLASSES_PATH
+import time
+import zlib
+import random
+import hashlib
 import threading
+from contextlib import contextmanager
 
 model = None
 embed_model = None
@@ -36,26 +39,35 @@ def pick_embedding_layer(model, num_classes):
             return layer
     return None
 
-def load_model():
+def build_models(path=MODEL_PATH):
+    """Load a Keras model file and derive its embedding model (raises on failure)."""
+    # TensorFlow / Keras are imported here, not at module import, so that
+    # importing the API does not pay for them (see startup.py)
+    import keras
+    import tensorflow as tf
+    model = keras.models.load_model(path)
+    print(f"[Model] Successfully loaded model from {path}")
+    print(f"[Model] Model input shape: {model.input_shape}")
+    print(f"[Model] Model output shape: {model.output_shape}")
+
+    emb_layer = pick_embedding_layer(model, len(CLASSES))
+    if emb_layer is None:
+        L = len(model.layers)
+        if L < 2:
+            raise RuntimeError("Model too shallow to pick an embedding layer.")
+        emb_layer = model.layers[L - 2]
+        print("[Model] Embedding fallback: second last layer")
+    embed_model = tf.keras.Model(inputs=model.inputs, outputs=emb_layer.output)
+    return model, embed_model
+
+def load_model(path=MODEL_PATH):
     global model, embed_model
     try:
-        if os.path.exists(MODEL_PATH):
-            model = keras.models.load_model(MODEL_PATH)
-            print(f"[Model] Successfully loaded model from {MODEL_PATH}")
-            print(f"[Model] Model input shape: {model.input_shape}")
-            print(f"[Model] Model output shape: {model.output_shape}")
-
-            emb_layer = pick_embedding_layer(model, len(CLASSES))
-            if emb_layer is None:
-                L = len(model.layers)
-                if L < 2:
-                    raise RuntimeError("Model too shallow to pick an embedding layer.")
-                emb_layer = model.layers[L - 2]
-                print("[Model] Embedding fallback: second last layer")
-            embed_model = tf.keras.Model(inputs=model.inputs, outputs=emb_layer.output)
+        if os.path.exists(path):
+            model, embed_model = build_models(path)
             return model, embed_model
         else:
-            print(f"[Model] Model file not found at {MODEL_PATH}")
+            print(f"[Model] Model file not found at {path}")
             return None, None
     except Exception as e:
         print(f"[Model] Error loading model: {e}")
@@ -77,3 +89,149 @@ def process_image_to_model_input(image_data):
         raise
 
 CLASS_TO_IDX = {c: i for i, c in enumerate(CLASSES)}
+
+
+# ---------- Model registry (hot swap) ----------
+#
+# The API serves from `model_registry` instead of module globals. A new model
+# file is loaded and warmed while requests keep using the active version, then
+# swapped in under a lock; a request holds the ModelVersion it started with
+# (`use()`), so in-flight requests finish on the old version, which is dropped
+# once its last request is done. A candidate version can take a share of the
+# traffic (`candidate_percent`), routed by a stable hash of the session so a
+# player stays on one version. Every version must embed into the same space as
+# the UMAP artifacts (build_artifacts.py rebuilds them for a new model).
+
+def model_version_id(path):
+    """File name plus a content hash, e.g. doodleNet-model-3f2a9c1b04de."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"{os.path.splitext(os.path.basename(path))[0]}-{digest.hexdigest()[:12]}"
+
+class ModelVersion:
+    def __init__(self, version, path, model, embed_model):
+        self.version = version
+        self.path = path
+        self.model = model
+        self.embed_model = embed_model
+        self.loaded_at = time.time()
+        self.in_flight = 0
+
+    def info(self):
+        return {"version": self.version, "path": self.path, "loaded_at": self.loaded_at, "in_flight": self.in_flight}
+
+class ModelRegistry:
+    def __init__(self):
+        self.active = None
+        self.candidate = None
+        self.candidate_percent = 0
+        self.loading = None        # path being loaded
+        self.last_error = None
+        self._draining = []        # replaced versions with requests still running
+        self._lock = threading.Lock()
+
+    def models(self):
+        """(model, embed_model) of the active version, or (None, None)."""
+        active = self.active
+        return (active.model, active.embed_model) if active else (None, None)
+
+    def load(self, path, version=None, warm=True):
+        """Load and warm a model file without serving it (blocking)."""
+        model, embed_model = build_models(path)
+        if warm:
+            x = np.zeros((1, 28, 28, 1), dtype=np.float32)
+            model.predict(x, verbose=0)
+            embed_model.predict(x, verbose=0)
+        return ModelVersion(version or model_version_id(path), path, model, embed_model)
+
+    def _retire(self, old):
+        if old is not None and old is not self.active and old is not self.candidate and old.in_flight:
+            self._draining.append(old)
+
+    def activate(self, new):
+        with self._lock:
+            old, self.active = self.active, new
+            if self.candidate is new:
+                self.candidate, self.candidate_percent = None, 0
+            self._retire(old)
+        print(f"[Model] Serving {new.version}" + (f" (was {old.version})" if old else ""))
+
+    def set_candidate(self, new, percent):
+        with self._lock:
+            old, self.candidate = self.candidate, new
+            self.candidate_percent = percent if new is not None else 0
+            self._retire(old)
+        if new is not None:
+            print(f"[Model] Candidate {new.version} gets {percent}% of traffic")
+
+    def set_candidate_percent(self, percent):
+        with self._lock:
+            self.candidate_percent = percent if self.candidate is not None else 0
+
+    def promote(self):
+        """Make the candidate the active version."""
+        if self.candidate is None:
+            raise ValueError("No candidate model to promote")
+        self.activate(self.candidate)
+
+    def reload(self, path, version=None, candidate_percent=0):
+        """
+        Load `path` and switch to it: as the active version, or as candidate
+        for `candidate_percent` % of the traffic (1..99). Blocking; requests
+        keep being served meanwhile.
+        """
+        with self._lock:
+            if self.loading is not None:
+                raise RuntimeError(f"Already loading {self.loading}")
+            self.loading = path
+        try:
+            new = self.load(path, version)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = f"{path}: {e}"
+            raise
+        finally:
+            self.loading = None
+        if candidate_percent:
+            self.set_candidate(new, candidate_percent)
+        else:
+            self.activate(new)
+        return new
+
+    def choose(self, route_key=None):
+        active, candidate, percent = self.active, self.candidate, self.candidate_percent
+        if candidate is None or not percent:
+            return active
+        bucket = zlib.crc32(route_key.encode()) % 100 if route_key else random.randrange(100)
+        return candidate if bucket < percent else active
+
+    @contextmanager
+    def use(self, route_key=None):
+        """The version serving one request, kept until the request is done."""
+        with self._lock:
+            version = self.choose(route_key)
+            if version is None:
+                raise RuntimeError("Model not loaded")
+            version.in_flight += 1
+        try:
+            yield version
+        finally:
+            with self._lock:
+                version.in_flight -= 1
+                if not version.in_flight and version in self._draining:
+                    self._draining.remove(version)
+
+    def status(self):
+        with self._lock:
+            return {
+                "active": self.active.info() if self.active else None,
+                "candidate": self.candidate.info() if self.candidate else None,
+                "candidate_percent": self.candidate_percent,
+                "draining": [v.info() for v in self._draining],
+                "loading": self.loading,
+                "last_error": self.last_error,
+            }
+
+model_registry = ModelRegistry()
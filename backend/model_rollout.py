@@ -0,0 +1,97 @@
+"""
+Model deploys across all API workers.
+
+The deploy endpoints (api.py, trusted clients only) do not load anything
+themselves: they write the desired state to Redis,
+
+    model:desired   JSON {"active": {"path", "version"},
+                          "candidate": {"path", "version", "percent"} | null}
+
+and every worker runs `watch()`, which compares it with its own
+ml_utils.model_registry every MODEL_WATCH_INTERVAL_SEC and loads, warms and
+switches in a thread when they differ. Each worker keeps serving the version
+it has until the new one is ready, so a deploy needs no restart and no
+request fails. A worker that starts later loads the desired active version
+directly (api.init_resources).
+"""
+
+import json
+import asyncio
+from typing import Any, Dict, Optional
+
+from config import MODEL_PATH, MODEL_WATCH_INTERVAL_SEC
+from ml_utils import ModelRegistry, model_version_id
+
+DESIRED_KEY = "model:desired"
+
+
+def read_desired(r) -> Optional[Dict[str, Any]]:
+    raw = r.get(DESIRED_KEY)
+    return json.loads(raw) if raw else None
+
+
+def write_desired(r, desired: Dict[str, Any]) -> None:
+    r.set(DESIRED_KEY, json.dumps(desired))
+
+
+def desired_from_registry(registry: ModelRegistry) -> Dict[str, Any]:
+    """Desired state describing what this worker serves now (MODEL_PATH when nothing is loaded)."""
+    active, candidate = registry.active, registry.candidate
+    return {
+        "active": {"path": active.path, "version": active.version} if active
+        else {"path": MODEL_PATH, "version": model_version_id(MODEL_PATH)},
+        "candidate": {"path": candidate.path, "version": candidate.version, "percent": registry.candidate_percent}
+        if candidate else None,
+    }
+
+
+def in_sync(registry: ModelRegistry, desired: Dict[str, Any]) -> bool:
+    active, candidate, wanted = registry.active, registry.candidate, desired.get("candidate")
+    if active is None or active.version != desired["active"]["version"]:
+        return False
+    if wanted is None:
+        return candidate is None
+    return candidate is not None and candidate.version == wanted["version"] \
+        and registry.candidate_percent == wanted["percent"]
+
+
+def apply_desired(registry: ModelRegistry, desired: Dict[str, Any]) -> None:
+    """Bring the registry to the desired state (blocking: run in a thread)."""
+    wanted_active, wanted_candidate = desired["active"], desired.get("candidate")
+
+    if registry.active is None or registry.active.version != wanted_active["version"]:
+        # A promoted candidate is switched to without loading it again
+        if registry.candidate is not None and registry.candidate.version == wanted_active["version"]:
+            registry.promote()
+        else:
+            registry.reload(wanted_active["path"], wanted_active["version"])
+
+    if wanted_candidate is None:
+        if registry.candidate is not None:
+            registry.set_candidate(None, 0)
+    elif registry.candidate is None or registry.candidate.version != wanted_candidate["version"]:
+        registry.reload(wanted_candidate["path"], wanted_candidate["version"], wanted_candidate["percent"])
+    else:
+        registry.set_candidate_percent(wanted_candidate["percent"])
+
+
+async def watch(registry: ModelRegistry, get_redis, interval: float = MODEL_WATCH_INTERVAL_SEC) -> None:
+    """Follow model:desired for the lifetime of the worker."""
+    last_error = None
+    failed = None    # desired state that failed to apply: not retried until it changes
+    while True:
+        await asyncio.sleep(interval)
+        desired = None
+        try:
+            desired = read_desired(get_redis())
+            if desired is not None and desired != failed and not in_sync(registry, desired):
+                await asyncio.to_thread(apply_desired, registry, desired)
+            last_error = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Keep serving the current version; report each distinct failure once
+            if str(e) != last_error:
+                print(f"[Model] Could not apply the desired model state: {e}")
+            last_error = str(e)
+            failed = desired
@@ -0,0 +1,153 @@
+"""
+Background plot jobs (UMAP / radar) per session.
+
+When a session's final round is submitted the plots are rendered right away
+instead of when the score page asks for them. Each (kind, session) has at most
+one running job in this process; requests that arrive while it runs await the
+same task instead of starting a duplicate render. Across API worker processes
+a Redis lock on `lock:{kind}_plot:{session_id}` makes sure only one of them
+renders; the others wait for it and then read the cached plot. Job status is
+written to Redis under `plot_job:{session_id}` so other workers and clients
+can see it.
+"""
+
+import os
+import json
+import time
+import asyncio
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from redis_utils import get_redis
+from plotting_api import plotting_api
+
+PLOT_KINDS = ("umap", "radar")
+PLOT_JOB_EXPIRE_SEC = 3600
+PLOT_LOCK_TTL_MS = 60000        # lock expiry in case the rendering worker dies
+PLOT_LOCK_POLL_SEC = 0.1
+
+# (kind, session_id) -> running task
+_jobs: Dict[Tuple[str, str], asyncio.Task] = {}
+
+
+def job_status_key(session_id: str) -> str:
+    return f"plot_job:{session_id}"
+
+
+def set_job_status(session_id: str, kind: str, status: str, error: Optional[str] = None) -> None:
+    """Record a job state ("pending", "running", "done", "failed") in Redis."""
+    try:
+        r = get_redis()
+        key = job_status_key(session_id)
+        r.hset(key, kind, json.dumps({
+            "status": status,
+            "error": error,
+            "updated_at": datetime.now().isoformat(),
+        }))
+        r.expire(key, PLOT_JOB_EXPIRE_SEC)
+    except Exception as e:
+        print(f"[PlotJobs] Could not record {kind} job status for {session_id}: {e}")
+
+
+def get_job_status(session_id: str) -> Dict[str, Any]:
+    """Job state per plot kind, e.g. {"umap": {"status": "done", ...}}."""
+    raw = get_redis().hgetall(job_status_key(session_id))
+    return {kind: json.loads(value) for kind, value in raw.items()}
+
+
+def get_running_job(kind: str, session_id: str) -> Optional[asyncio.Task]:
+    task = _jobs.get((kind, session_id))
+    if task is not None and not task.done():
+        return task
+    return None
+
+
+def plot_lock_key(kind: str, session_id: str) -> str:
+    return f"lock:{kind}_plot:{session_id}"
+
+
+def _acquire_lock(key: str) -> Optional[str]:
+    """SET NX with expiry; returns the owner token or None if the lock is held."""
+    token = os.urandom(8).hex()
+    if get_redis().set(key, token, nx=True, px=PLOT_LOCK_TTL_MS):
+        return token
+    return None
+
+
+def _release_lock(key: str, token: str) -> None:
+    """Delete the lock only if this process still owns it."""
+    try:
+        with get_redis().pipeline() as pipe:
+            pipe.watch(key)
+            if pipe.get(key) == token:
+                pipe.multi()
+                pipe.delete(key)
+                pipe.execute()
+            else:
+                pipe.unwatch()
+    except Exception as e:
+        print(f"[PlotJobs] Could not release {key}: {e}")
+
+
+async def _wait_for_lock(key: str) -> None:
+    deadline = time.monotonic() + PLOT_LOCK_TTL_MS / 1000
+    while get_redis().exists(key) and time.monotonic() < deadline:
+        await asyncio.sleep(PLOT_LOCK_POLL_SEC)
+
+
+async def _run_job(kind: str, session_id: str, render: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+    lock_key = plot_lock_key(kind, session_id)
+    token = _acquire_lock(lock_key)
+    while token is None:
+        # Another API worker is rendering this plot: wait, then use its result
+        await _wait_for_lock(lock_key)
+        if plotting_api.lookup_cached_plot(kind, session_id, count=False) is not None:
+            set_job_status(session_id, kind, "done")
+            return {"status": "shared"}
+        token = _acquire_lock(lock_key)
+
+    set_job_status(session_id, kind, "running")
+    try:
+        result = await render()
+    except Exception as e:
+        detail = getattr(e, "detail", None) or str(e)
+        set_job_status(session_id, kind, "failed", error=detail)
+        raise
+    finally:
+        _release_lock(lock_key, token)
+    if result.get("status") == "success":
+        set_job_status(session_id, kind, "done")
+    else:
+        set_job_status(session_id, kind, "failed", error=result.get("error"))
+    return result
+
+
+def _forget(key: Tuple[str, str], task: asyncio.Task) -> None:
+    if _jobs.get(key) is task:
+        del _jobs[key]
+    # Mark a background failure as retrieved; it is already recorded in Redis
+    if not task.cancelled():
+        task.exception()
+
+
+def start_job(kind: str, session_id: str, render: Callable[[], Awaitable[Dict[str, Any]]]) -> asyncio.Task:
+    """Return the running job for (kind, session_id), starting `render()` if there is none."""
+    task = get_running_job(kind, session_id)
+    if task is not None:
+        return task
+
+    key = (kind, session_id)
+    set_job_status(session_id, kind, "pending")
+    task = asyncio.get_running_loop().create_task(_run_job(kind, session_id, render))
+    _jobs[key] = task
+    task.add_done_callback(lambda t: _forget(key, t))
+    return task
+
+
+async def run_job(kind: str, session_id: str, render: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Await the plot job for (kind, session_id), joining a running one if present.
+    The job is shielded so a client disconnect does not cancel the render.
+    Returns {"status": "shared"} when another API worker rendered the plot.
+    """
+    return await asyncio.shield(start_job(kind, session_id, render))
@@ -1,117 +1,435 @@
 """
 Enhanced plotting API with Redis storage support for both UMAP and radar charts.
+
+matplotlib / seaborn / pandas (umap_auto, radar_chart_auto) are imported on
+first use, so importing this module stays cheap for the API process.
 """
 
 import os
 import json
-from typing import Dict, Any, List, Optional
-import pandas as pd
-from redis_utils import get_redis
-from umap_auto import plot_umap_with_user
-from radar_chart_auto import create_radar_from_session_data
+import base64
+import asyncio
+import hashlib
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
+import numpy as np
+from redis_utils import get_redis, get_redis_binary
+from plot_utils import get_class_label_map
+from render_pool import RenderPool, RenderPoolBusy, render_umap_job, render_radar_job, encode_variant_job
+from image_output import (
+    DEFAULT_TIER,
+    DEFAULT_FORMAT,
+    SIZE_TIERS,
+    IMAGE_FORMATS,
+    load_image,
+    load_cached_variant,
+    store_variant,
+    variant_key,
+    to_base64,
+)
+from metrics import stage_timer, record_cache
+from config import RENDER_POOL_SIZE, RENDER_POOL_MAX_QUEUE, RENDER_POOL_TIMEOUT_SEC, PLOT_CACHE_TTL_SEC
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+PLOT_FONT_PATH = "../frontend/fonts/NotoSansTC.ttf"
+PLOT_CACHE_STATS_KEY = "plot_cache:stats"
+
+# Background artifacts and projection settings shared by the PNG and data modes
+UMAP_ARTIFACT_PARAMS = {
+    "raw_embedding_csv": "./feature/background_embedding_5per_class.csv",
+    "umap_background_csv": "./feature/background_Umap.csv",
+    "umap_reducer_path": "./feature/background_Umap_top72.joblib",
+    "feature_cols": [f"emb_{i}" for i in range(512)],
+    "input_class_col": "prompt",
+    "bg_class_col": "class",
+    "sample_size": 1,
+    "random_state": 42,
+    "normalize_class_space": True,
+    "background_sample_strategy": "uniform",
+}
 
 
 class PlottingAPI:
     """Enhanced plotting API with Redis storage support."""
     
-    def __init__(self, redis_expire_sec: int = 3600):
+    def __init__(self, redis_expire_sec: int = PLOT_CACHE_TTL_SEC, render_pool: Optional[RenderPool] = None):
         """
         Initialize plotting API.
         
         Args:
-            redis_expire_sec: Default expiration time for Redis keys
+            redis_expire_sec: Expiration time for cached plot images and metadata
+            render_pool: Worker pool for the *_async render methods (default: built from config)
         """
-        # self.redis_expire_sec = redis_expire_sec
+        self.redis_expire_sec = redis_expire_sec
         self.redis_client = get_redis()
+        self._background_assets: Dict[Optional[int], Dict[str, Any]] = {}
+        if render_pool is None:
+            render_pool = RenderPool(
+                size=RENDER_POOL_SIZE,
+                max_queue=RENDER_POOL_MAX_QUEUE,
+                timeout_sec=RENDER_POOL_TIMEOUT_SEC,
+                warm_params={
+                    "umap": UMAP_ARTIFACT_PARAMS,
+                    "samples_per_class": 500,
+                    "font_path": PLOT_FONT_PATH,
+                },
+            )
+        self.render_pool = render_pool
     
-    def create_umap_plot(
+    # ---------- Versioned plot cache ----------
+    #
+    # Plot keys carry a version hash of the session's drawing IDs and
+    # predictions: {kind}_plot:{session_id}:{version} (image) and
+    # {kind}_metadata:{session_id}:{version}. A plot rendered from an older
+    # drawing set is therefore never served, and a new drawing invalidates
+    # everything written for the session.
+    
+    def session_plot_version(self, session_id: str) -> str:
+        """Version hash of a session's drawing set (drawing IDs + predictions)."""
+        drawing_ids = sorted(self.redis_client.lrange(f"session:{session_id}:drawings", 0, -1))
+        pipe = self.redis_client.pipeline(transaction=False)
+        for drawing_id in drawing_ids:
+            pipe.hget(drawing_id, "predictions")
+        predictions = pipe.execute()
+        
+        digest = hashlib.sha256()
+        for drawing_id, prediction in zip(drawing_ids, predictions):
+            digest.update(f"{drawing_id}\x00{prediction or ''}\n".encode("utf-8"))
+        return digest.hexdigest()[:16]
+    
+    @staticmethod
+    def plot_cache_keys(kind: str, session_id: str, version: str) -> Tuple[str, str]:
+        """(image key, metadata key) of a plot version."""
+        return f"{kind}_plot:{session_id}:{version}", f"{kind}_metadata:{session_id}:{version}"
+    
+    def lookup_cached_plot(self, kind: str, session_id: str, count: bool = True) -> Optional[Dict[str, str]]:
+        """
+        Find the plot for the session's current drawing set.
+        
+        Args:
+            kind: "umap" or "radar"
+            session_id: Session ID
+            count: Record the lookup in the hit/miss counters
+        
+        Returns:
+            {"redis_key", "metadata_key", "version"} or None on a miss
+        """
+        version = self.session_plot_version(session_id)
+        redis_key, metadata_key = self.plot_cache_keys(kind, session_id, version)
+        hit = bool(self.redis_client.exists(redis_key))
+        if count:
+            self.redis_client.hincrby(PLOT_CACHE_STATS_KEY, f"{kind}_{'hits' if hit else 'misses'}", 1)
+            record_cache(f"{kind}_plot", hit)
+        if not hit:
+            return None
+        return {"redis_key": redis_key, "metadata_key": metadata_key, "version": version}
+    
+    def _store_plot(
         self,
-        user_embedding_df: pd.DataFrame,
+        kind: str,
         session_id: str,
+        version: str,
+        image_bytes: bytes,
+        metadata: Dict[str, Any],
+    ) -> Tuple[str, str]:
+        """Write a plot image and its metadata in one transaction."""
+        redis_key, metadata_key = self.plot_cache_keys(kind, session_id, version)
+        index_key = f"plot_cache:{session_id}"
+        metadata = {**metadata, "version": version}
+        
+        pipe = get_redis_binary().pipeline(transaction=True)
+        pipe.set(redis_key, image_bytes, ex=self.redis_expire_sec)
+        pipe.delete(metadata_key)
+        pipe.hset(metadata_key, mapping=metadata)
+        pipe.expire(metadata_key, self.redis_expire_sec)
+        pipe.sadd(index_key, redis_key, metadata_key)
+        pipe.expire(index_key, self.redis_expire_sec)
+        pipe.execute()
+        return redis_key, metadata_key
+    
+    def invalidate_session_plots(self, session_id: str) -> int:
+        """
+        Delete every cached plot, variant and metadata hash of a session.
+        
+        Returns:
+            Number of keys deleted
+        """
+        index_key = f"plot_cache:{session_id}"
+        keys = set(self.redis_client.smembers(index_key))
+        for key in list(keys):
+            if "_plot:" in key:
+                keys.update(variant_key(key, tier, fmt) for tier in SIZE_TIERS for fmt in IMAGE_FORMATS)
+        keys.add(index_key)
+        return self.redis_client.delete(*keys)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Hit / miss counters of the plot cache per plot kind."""
+        raw = self.redis_client.hgetall(PLOT_CACHE_STATS_KEY)
+        stats = {}
+        for kind in ("umap", "radar"):
+            hits = int(raw.get(f"{kind}_hits", 0))
+            misses = int(raw.get(f"{kind}_misses", 0))
+            total = hits + misses
+            stats[kind] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / total, 4) if total else None,
+            }
+        return stats
+    
+    def create_umap_plot(
+        self,
+        user_embedding_df: Optional["pd.DataFrame"] = None,
+        session_id: str = "",
         max_background_samples_per_class: Optional[int] = 500,
+        *,
+        user_embeddings: Optional[np.ndarray] = None,
+        user_prompts: Optional[List[str]] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """
         Create UMAP plot and store in Redis.
         
         Args:
-            user_embedding_df: User embeddings DataFrame
+            user_embedding_df: User embeddings DataFrame (legacy input)
             session_id: Session ID for Redis key generation
             max_background_samples_per_class: Maximum background samples per class (None = use all)
+            user_embeddings: (N, 512) user embedding matrix (alternative to user_embedding_df)
+            user_prompts: Prompt for each row of user_embeddings
             **kwargs: Additional arguments for plot_umap_with_user
         
         Returns:
             Dictionary with plot results and Redis key
         """
         try:
-            # Generate Redis key
-            redis_key = f"umap_plot:{session_id}"
+            num_user_points = len(user_embeddings) if user_embeddings is not None else len(user_embedding_df)
+            version = self.session_plot_version(session_id)
+            params = self._umap_params(
+                user_embedding_df, session_id, max_background_samples_per_class,
+                user_embeddings, user_prompts, kwargs
+            )
             
-            # Default paths - adjust these based on your setup
-            default_params = {
-                "raw_embedding_csv": "./feature/background_embedding_5per_class.csv",
-                "umap_background_csv": "./feature/background_Umap.csv", 
-                "umap_reducer_path": "./feature/background_Umap_top72.joblib",
-                "feature_cols": [f"emb_{i}" for i in range(512)],
-                "input_class_col": "prompt",
-                "bg_class_col": "class",
-                "cluster_col": "cluster",
-                "sample_size": 1,
-                "random_state": 42,
-                "normalize_class_space": True,
-                "max_background_samples_per_class": max_background_samples_per_class,
-                "background_sample_strategy": "uniform",
-                "figsize": (10, 7),
-                "user_marker": "^",
-                "user_color": "black", 
-                "user_size": 120,
-                "annotate": True,
-                "redis_key": redis_key,
-                "show": False,
-                "font_path": "../frontend/fonts/NotoSansTC.ttf"
-            }
+            # Create the plot
+            from umap_auto import plot_umap_with_user
+            with stage_timer("umap_render"):
+                result = plot_umap_with_user(**params)
             
-            # Update with any provided kwargs
-            default_params.update(kwargs)
+            return self._store_umap_result(result, session_id, version, num_user_points, max_background_samples_per_class)
             
-            # Create the plot
-            result = plot_umap_with_user(
-                user_embedding_df=user_embedding_df,
-                **default_params
+        except Exception as e:
+            return self._error_result(e)
+    
+    async def create_umap_plot_async(
+        self,
+        user_embedding_df: Optional["pd.DataFrame"] = None,
+        session_id: str = "",
+        max_background_samples_per_class: Optional[int] = 500,
+        *,
+        user_embeddings: Optional[np.ndarray] = None,
+        user_prompts: Optional[List[str]] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Same as create_umap_plot, but renders in the render pool and awaits the result.
+        """
+        try:
+            num_user_points = len(user_embeddings) if user_embeddings is not None else len(user_embedding_df)
+            version = self.session_plot_version(session_id)
+            params = self._umap_params(
+                user_embedding_df, session_id, max_background_samples_per_class,
+                user_embeddings, user_prompts, kwargs
             )
             
-            # Store additional metadata in Redis
-            metadata_key = f"umap_metadata:{session_id}"
-            metadata = {
-                "session_id": session_id,
-                "num_user_points": len(user_embedding_df),
-                "num_background_samples_per_class": str(max_background_samples_per_class) if max_background_samples_per_class else "all",
-                "skipped_classes": json.dumps(result.get("skipped_classes", [])),
-                "used_scaled": str(result.get("used_scaled", False)),
-                "x_col": result.get("x_col", ""),
-                "y_col": result.get("y_col", "")
-            }
+            with stage_timer("umap_render"):
+                result = await self.render_pool.run(render_umap_job, params)
             
-            self.redis_client.hset(metadata_key, mapping=metadata)
-            # self.redis_client.expire(metadata_key, self.redis_expire_sec)
+            return self._store_umap_result(result, session_id, version, num_user_points, max_background_samples_per_class)
+            
+        except Exception as e:
+            return self._error_result(e)
+    
+    def _umap_params(
+        self,
+        user_embedding_df: Optional["pd.DataFrame"],
+        session_id: str,
+        max_background_samples_per_class: Optional[int],
+        user_embeddings: Optional[np.ndarray],
+        user_prompts: Optional[List[str]],
+        kwargs: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """Build the plot_umap_with_user arguments for a session."""
+        # Default paths - adjust these based on your setup
+        default_params = {
+            **UMAP_ARTIFACT_PARAMS,
+            "cluster_col": "cluster",
+            "max_background_samples_per_class": max_background_samples_per_class,
+            "figsize": (10, 7),
+            "user_marker": "^",
+            "user_color": "black", 
+            "user_size": 120,
+            "annotate": True,
+            "return_image": True,  # stored with its metadata by _store_umap_result
+            "show": False,
+            "render_mode": "layered",
+            "font_path": PLOT_FONT_PATH
+        }
+        
+        # Update with any provided kwargs
+        default_params.update(kwargs)
+        default_params.update(
+            user_embedding_df=user_embedding_df,
+            user_embeddings=user_embeddings,
+            user_classes=user_prompts,
+        )
+        return default_params
+    
+    def _store_umap_result(
+        self,
+        result: Dict[str, Any],
+        session_id: str,
+        version: str,
+        num_user_points: int,
+        max_background_samples_per_class: Optional[int],
+    ) -> Dict[str, Any]:
+        """Store the UMAP image + metadata in Redis and build the API result."""
+        metadata = {
+            "session_id": session_id,
+            "num_user_points": num_user_points,
+            "num_background_samples_per_class": str(max_background_samples_per_class) if max_background_samples_per_class else "all",
+            "skipped_classes": json.dumps(result.get("skipped_classes", [])),
+            "used_scaled": str(result.get("used_scaled", False)),
+            "x_col": result.get("x_col", ""),
+            "y_col": result.get("y_col", "")
+        }
+        redis_key, metadata_key = self._store_plot(
+            "umap", session_id, version, base64.b64decode(result["image_base64"]), metadata
+        )
+        
+        return {
+            "status": "success",
+            "redis_key": redis_key,
+            "metadata_key": metadata_key,
+            "image_base64": result.get("image_base64"),
+            "user_points": num_user_points,
+            "skipped_classes": result.get("skipped_classes", []),
+            "background_samples_per_class": max_background_samples_per_class
+        }
+    
+    @staticmethod
+    def _error_result(e: Exception) -> Dict[str, Any]:
+        if isinstance(e, asyncio.TimeoutError):
+            error = "Plot rendering timed out"
+        else:
+            error = str(e)
+        return {
+            "status": "error",
+            "error": error,
+            "busy": isinstance(e, RenderPoolBusy),
+            "redis_key": None,
+            "image_base64": None
+        }
+    
+    def create_umap_data(
+        self,
+        user_embeddings: np.ndarray,
+        user_prompts: List[str],
+        session_id: str,
+        max_background_samples_per_class: Optional[int] = 500,
+    ) -> Dict[str, Any]:
+        """
+        Project user points for client-side UMAP rendering (no matplotlib).
+        
+        Args:
+            user_embeddings: (N, 512) user embedding matrix
+            user_prompts: Prompt for each row of user_embeddings
+            session_id: Session ID
+            max_background_samples_per_class: Background points per class in the packed asset
+        
+        Returns:
+            Dictionary with projected user points, palette and background asset info
+        """
+        try:
+            from umap_auto import project_user_umap, DEFAULT_CLUSTER_PALETTE, UMAP_TITLE
+            projected = project_user_umap(
+                user_embeddings=user_embeddings,
+                user_classes=user_prompts,
+                max_background_samples_per_class=max_background_samples_per_class,
+                **UMAP_ARTIFACT_PARAMS
+            )
+            user_umap = projected["user_umap"]
+            x_col, y_col = projected["x_col"], projected["y_col"]
+            background = projected["background"]
+            
+            points = [
+                {"class": row["class"], "label": row["label"], "x": float(row[x_col]), "y": float(row[y_col])}
+                for _, row in user_umap.iterrows()
+            ]
             
             return {
                 "status": "success",
-                "redis_key": redis_key,
-                "metadata_key": metadata_key,
-                "image_base64": result.get("image_base64"),
-                "user_points": len(user_embedding_df),
-                "skipped_classes": result.get("skipped_classes", []),
-                "background_samples_per_class": max_background_samples_per_class
+                "session_id": session_id,
+                "points": points,
+                "label_map": get_class_label_map(),
+                "palette": {str(k): v for k, v in DEFAULT_CLUSTER_PALETTE.items()},
+                "title": UMAP_TITLE,
+                "x_col": x_col,
+                "y_col": y_col,
+                "used_scaled": projected["used_scaled"],
+                "skipped_classes": projected["skipped_classes"],
+                "background": {
+                    "count": int(len(background)),
+                    "bounds": [
+                        float(background[x_col].min()), float(background[y_col].min()),
+                        float(background[x_col].max()), float(background[y_col].max()),
+                    ],
+                    "format": "xy-float32le+cluster-uint8",
+                    "samples_per_class": max_background_samples_per_class,
+                },
             }
-            
         except Exception as e:
             return {
                 "status": "error",
                 "error": str(e),
-                "redis_key": None,
-                "image_base64": None
+                "points": []
+            }
+    
+    def get_umap_background_asset(
+        self,
+        max_background_samples_per_class: Optional[int] = 500,
+    ) -> Dict[str, Any]:
+        """
+        Packed background point cloud for client-side rendering (cached per process).
+        
+        Returns:
+            Dictionary with "content" (bytes), "etag" and "count"
+        """
+        key = max_background_samples_per_class
+        asset = self._background_assets.get(key)
+        record_cache("umap_background_asset", asset is not None)
+        if asset is None:
+            from umap_auto import load_reduced_background_umap, pack_background_points
+            params = UMAP_ARTIFACT_PARAMS
+            background = load_reduced_background_umap(
+                params["umap_background_csv"],
+                samples_per_class=max_background_samples_per_class,
+                random_state=params["random_state"],
+                strategy=params["background_sample_strategy"],
+                normalize_class_space=params["normalize_class_space"],
+            )
+            use_scaled = {"scale_x", "scale_y"}.issubset(background.columns)
+            content = pack_background_points(
+                background,
+                x_col="scale_x" if use_scaled else "umap_x",
+                y_col="scale_y" if use_scaled else "umap_y",
+            )
+            asset = {
+                "content": content,
+                "etag": hashlib.sha256(content).hexdigest()[:32],
+                "count": len(background),
             }
+            self._background_assets[key] = asset
+        return asset
     
     def create_radar_plot(
         self,
@@ -131,50 +449,71 @@ class PlottingAPI:
             Dictionary with plot results and Redis key
         """
         try:
-            # Generate Redis key
-            redis_key = f"radar_plot:{session_id}"
+            version = self.session_plot_version(session_id)
             
             # Create radar chart
-            result = create_radar_from_session_data(
-                session_drawings=session_drawings,
-                **kwargs
-            )
+            from radar_chart_auto import create_radar_from_session_data
+            with stage_timer("radar_render"):
+                result = create_radar_from_session_data(
+                    session_drawings=session_drawings,
+                    **kwargs
+                )
             
-            if result["status"] == "success":
-                # Store in Redis
-                self.redis_client.set(redis_key, result["image_base64"])
-                # self.redis_client.expire(redis_key, self.redis_expire_sec)
-
-                # Store metadata
-                metadata_key = f"radar_metadata:{session_id}"
-                metadata = {
-                    "session_id": session_id,
-                    "num_drawings": len(session_drawings),
-                    "prompts": json.dumps(result.get("prompts", [])),
-                    "probabilities": json.dumps(result.get("probabilities", []))
-                }
-                
-                self.redis_client.hset(metadata_key, mapping=metadata)
-                # self.redis_client.expire(metadata_key, self.redis_expire_sec)
+            return self._store_radar_result(result, session_drawings, session_id, version)
                 
-                return {
-                    "status": "success",
-                    "redis_key": redis_key,
-                    "metadata_key": metadata_key,
-                    "image_base64": result["image_base64"],
-                    "prompts": result.get("prompts", []),
-                    "probabilities": result.get("probabilities", [])
-                }
-            else:
-                return result
+        except Exception as e:
+            return self._error_result(e)
+    
+    async def create_radar_plot_async(
+        self,
+        session_drawings: List[Dict[str, Any]],
+        session_id: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Same as create_radar_plot, but renders in the render pool and awaits the result.
+        """
+        try:
+            version = self.session_plot_version(session_id)
+            with stage_timer("radar_render"):
+                result = await self.render_pool.run(render_radar_job, session_drawings, kwargs)
+            
+            return self._store_radar_result(result, session_drawings, session_id, version)
                 
         except Exception as e:
-            return {
-                "status": "error", 
-                "error": str(e),
-                "redis_key": None,
-                "image_base64": None
-            }
+            return self._error_result(e)
+    
+    def _store_radar_result(
+        self,
+        result: Dict[str, Any],
+        session_drawings: List[Dict[str, Any]],
+        session_id: str,
+        version: str,
+    ) -> Dict[str, Any]:
+        """Store a rendered radar chart + metadata in Redis and build the API result."""
+        if result["status"] != "success":
+            return result
+        
+        # Store metadata
+        metadata = {
+            "session_id": session_id,
+            "num_drawings": len(session_drawings),
+            "prompts": json.dumps(result.get("prompts", [])),
+            "probabilities": json.dumps(result.get("probabilities", []))
+        }
+        # Image (raw PNG bytes) and metadata are written together
+        redis_key, metadata_key = self._store_plot(
+            "radar", session_id, version, base64.b64decode(result["image_base64"]), metadata
+        )
+        
+        return {
+            "status": "success",
+            "redis_key": redis_key,
+            "metadata_key": metadata_key,
+            "image_base64": result["image_base64"],
+            "prompts": result.get("prompts", []),
+            "probabilities": result.get("probabilities", [])
+        }
     
     def get_plot_from_redis(self, redis_key: str) -> Optional[str]:
         """
@@ -187,11 +526,54 @@ class PlottingAPI:
             Base64 encoded image string or None if not found
         """
         try:
-            return self.redis_client.get(redis_key)
+            image_bytes = load_image(redis_key)
+            return to_base64(image_bytes) if image_bytes else None
         except Exception as e:
             print(f"Error retrieving plot from Redis: {e}")
             return None
     
+    async def get_plot_image_async(
+        self,
+        redis_key: str,
+        size: str = DEFAULT_TIER,
+        image_format: str = DEFAULT_FORMAT,
+        master: Optional[bytes] = None,
+    ) -> Optional[bytes]:
+        """
+        Retrieve a plot image in the requested size tier and format.
+        Missing variants are derived from the stored master in the render pool
+        and cached next to it.
+        
+        Args:
+            redis_key: Redis key of the master plot
+            size: Size tier (see image_output.SIZE_TIERS)
+            image_format: "png" or "webp"
+            master: Master image bytes if already at hand (skips the Redis read)
+        
+        Returns:
+            Raw image bytes or None if the plot has not been rendered
+        """
+        try:
+            image_bytes = load_cached_variant(redis_key, size, image_format)
+            record_cache("plot_image", image_bytes is not None)
+            if image_bytes is not None:
+                return image_bytes
+            
+            if master is None:
+                master = load_image(redis_key)
+            if master is None:
+                return None
+            
+            with stage_timer("image_encode"):
+                image_bytes = await self.render_pool.run(encode_variant_job, master, size, image_format)
+            store_variant(redis_key, size, image_format, image_bytes)
+            return image_bytes
+        except RenderPoolBusy:
+            raise
+        except Exception as e:
+            print(f"Error retrieving plot variant from Redis: {e}")
+            return None
+    
     def get_metadata_from_redis(self, metadata_key: str) -> Optional[Dict[str, Any]]:
         """
         Retrieve plot metadata from Redis.
@@ -222,7 +604,7 @@ class PlottingAPI:
     
     def create_both_plots(
         self,
-        user_embedding_df: pd.DataFrame,
+        user_embedding_df: "pd.DataFrame",
         session_drawings: List[Dict[str, Any]],
         session_id: str,
         max_background_samples_per_class: Optional[int] = 500,
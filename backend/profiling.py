@@ -0,0 +1,111 @@
+"""
+Per-request Server-Timing header and an opt-in cProfile hook.
+
+Every response carries a `Server-Timing` header with the time the request
+spent in each processing stage recorded through `metrics.stage_timer`
+(base64, preprocess, inference, embedding, redis, umap_projection,
+umap_render, ...) plus the total, so the browser devtools show where a slow
+request went:
+
+    Server-Timing: inference;dur=41.2, redis;dur=1.3;desc="3 calls", total;dur=47.9
+
+A request sent with `X-Debug-Profile: 1` from an address in
+PROFILE_TRUSTED_IPS is run under cProfile. The profile is written to
+PROFILE_DIR, its id is returned in `X-Profile-Id` and the stats can be read
+from GET /api/debug/profiles/{profile_id}. cProfile covers the event loop
+thread (the whole process, not just this request), so only one profile runs
+at a time; work done in worker threads or the render pool is not included.
+"""
+
+import io
+import os
+import re
+import time
+import pstats
+import cProfile
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+from config import SERVER_TIMING_ENABLED, PROFILE_TRUSTED_IPS, PROFILE_DIR
+from metrics import begin_request_stages, end_request_stages
+
+PROFILE_HEADER = "x-debug-profile"
+_PROFILE_ID = re.compile(r"^[0-9]{8}T[0-9]{6}_[0-9a-f]{6}$")
+_profile_lock = threading.Lock()
+
+
+def format_server_timing(stages: Dict[str, list], total: float) -> str:
+    """Stage totals (seconds) as a Server-Timing header value in ms."""
+    parts = []
+    for stage, (seconds, calls) in sorted(stages.items(), key=lambda item: -item[1][0]):
+        entry = f"{stage};dur={seconds * 1000:.1f}"
+        if calls > 1:
+            entry += f';desc="{calls} calls"'
+        parts.append(entry)
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def is_trusted(request) -> bool:
+    # The peer address only: X-Forwarded-For is client controlled
+    return request.client is not None and request.client.host in PROFILE_TRUSTED_IPS
+
+
+def wants_profile(request) -> bool:
+    value = request.headers.get(PROFILE_HEADER, "").strip().lower()
+    return value in ("1", "true", "yes") and is_trusted(request)
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    return os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+
+
+def save_profile(profiler: cProfile.Profile) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}_{os.urandom(3).hex()}"
+    profiler.dump_stats(profile_path(profile_id))
+    return profile_id
+
+
+def profile_stats_text(profile_id: str, sort: str = "cumulative", limit: int = 60) -> Optional[str]:
+    """pstats report of a stored profile, or None if it does not exist."""
+    path = profile_path(profile_id)
+    if path is None or not os.path.exists(path):
+        return None
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+
+async def server_timing_middleware(request, call_next):
+    """Collect stage timings for the request and optionally profile it."""
+    stages, token = begin_request_stages()
+    profiler = None
+    if wants_profile(request) and _profile_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    t0 = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        total = time.perf_counter() - t0
+        end_request_stages(token)
+        if profiler is not None:
+            profiler.disable()
+            _profile_lock.release()
+
+    if SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = format_server_timing(stages, total)
+        # Lets the frontend (another origin) read the timings in devtools / PerformanceResourceTiming
+        response.headers["Timing-Allow-Origin"] = "*"
+    if profiler is not None:
+        profile_id = save_profile(profiler)
+        response.headers["X-Profile-Id"] = profile_id
+        print(f"[Profile] {request.method} {request.url.path} profiled as {profile_id}")
+    elif wants_profile(request):
+        response.headers["X-Profile-Id"] = "busy"
+    return response
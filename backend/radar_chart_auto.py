@@ -2,11 +2,15 @@
 Radar chart visualization functions for API integration
 """
 import os
+import io
 import base64
+import threading
 import matplotlib.pyplot as plt
 import numpy as np
 from typing import List, Dict, Any, Optional
 from matplotlib import font_manager as fm
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import matplotlib.patches as patches
 
 def create_radar_chart(
@@ -121,6 +125,142 @@ def create_radar_chart(
             "probabilities": probabilities
         }
 
+# ---------- Template-based renderer ----------
+
+RADAR_COLOR = '#1f77b4'
+_template_local = threading.local()
+
+def _load_font(font_path: Optional[str]):
+    if font_path and os.path.exists(font_path):
+        try:
+            return fm.FontProperties(fname=font_path)
+        except Exception:
+            return None
+    return None
+
+def _build_radar_template(n_axes: int, figsize, font_path: Optional[str]) -> Dict[str, Any]:
+    """
+    Build the static parts of a radar chart (polar axes, grid, y ticks, border)
+    once for `n_axes` spokes. Only data, x tick labels and title change per render.
+    """
+    prop = _load_font(font_path)
+
+    # Standalone Agg figure: no pyplot global state involved
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    fig.patch.set_facecolor('white')
+    ax = fig.add_subplot(111, projection='polar')
+
+    angles = [n / float(n_axes) * 2 * np.pi for n in range(n_axes)]
+    closed_angles = angles + angles[:1]
+    zeros = [0.0] * (n_axes + 1)
+
+    line, = ax.plot(closed_angles, zeros, 'o-', linewidth=2, label='準確度', color=RADAR_COLOR)
+    fill, = ax.fill(closed_angles, zeros, alpha=0.25, color=RADAR_COLOR)
+
+    ax.set_xticks(angles)
+    ax.set_xticklabels([""] * n_axes, fontproperties=prop, fontsize=15)
+    ax.set_ylim(0, 100)
+    ax.set_yticks([20, 40, 60, 80, 100])
+    ax.set_yticklabels(['20%', '40%', '60%', '80%', '100%'], fontsize=17)
+    ax.grid(True)
+
+    title = ax.set_title("", fontproperties=prop, fontsize=17, fontweight='bold', pad=15)
+
+    border = patches.Rectangle(
+        (0.02, 0.02), 0.96, 0.96,
+        transform=fig.transFigure,
+        linewidth=2,
+        edgecolor="black",
+        facecolor="none",
+        zorder=1000
+    )
+    fig.patches.append(border)
+
+    return {
+        "fig": fig,
+        "ax": ax,
+        "line": line,
+        "fill": fill,
+        "title": title,
+        "angles": np.asarray(closed_angles),
+        "prop": prop,
+    }
+
+def get_radar_template(n_axes: int, figsize=(10, 10), font_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Cached radar template for this thread (one figure per thread, so parallel
+    renders never share a figure).
+    """
+    templates = getattr(_template_local, "templates", None)
+    if templates is None:
+        templates = _template_local.templates = {}
+    key = (n_axes, tuple(figsize), font_path)
+    template = templates.get(key)
+    if template is None:
+        template = _build_radar_template(n_axes, figsize, font_path)
+        templates[key] = template
+    return template
+
+def render_radar_chart(
+    prompts: List[str],
+    probabilities: List[float],
+    figsize=(10, 10),
+    title: str = "AI預測繪圖準確度雷達圖",
+    font_path: Optional[str] = None,
+    dpi: int = 150,
+) -> Dict[str, Any]:
+    """
+    Same output as create_radar_chart, rendered from a pre-built template and
+    encoded in memory (no temporary file).
+    """
+    try:
+        from plot_utils import get_class_label_map
+        label_map = get_class_label_map()
+        labels = [label_map.get(prompt, prompt) for prompt in prompts]
+        if not labels:
+            raise ValueError("No prompts to plot")
+
+        values = [prob * 100 for prob in probabilities]
+        values += values[:1]
+
+        template = get_radar_template(len(labels), figsize, font_path)
+        fig, ax = template["fig"], template["ax"]
+        angles = template["angles"]
+
+        template["line"].set_data(angles, values)
+        template["fill"].set_xy(np.column_stack([angles, values]))
+        ax.set_xticklabels(labels, fontproperties=template["prop"], fontsize=15)
+        template["title"].set_text(title)
+
+        buffer = io.BytesIO()
+        fig.savefig(
+            buffer,
+            format='png',
+            dpi=dpi,
+            bbox_inches="tight",
+            pad_inches=0.05,
+            facecolor='white',
+            edgecolor='none'
+        )
+        image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+        return {
+            "status": "success",
+            "image_base64": image_base64,
+            "prompts": prompts,
+            "probabilities": probabilities
+        }
+
+    except Exception as e:
+        return {
+            "status": "error",
+            "error": str(e),
+            "image_base64": None,
+            "prompts": prompts,
+            "probabilities": probabilities
+        }
+
 def create_radar_from_session_data(
     session_drawings: List[Dict[str, Any]],
     **kwargs
@@ -154,7 +294,9 @@ def create_radar_from_session_data(
             "probabilities": []
         }
     
-    return create_radar_chart(
+    # Writing to a file still goes through the original renderer
+    renderer = create_radar_chart if kwargs.get("output_path") else render_radar_chart
+    return renderer(
         prompts=prompts,
         probabilities=probabilities,
         font_path=font_path,
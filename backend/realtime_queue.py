@@ -0,0 +1,128 @@
+"""
+Latest-frame-wins queue and admission control for realtime previews.
+
+sketch.js posts the canvas every 900 ms. When inference falls behind, the
+requests of one player pile up although only the newest frame is still
+shown. Every realtime request waits here for an inference slot (lowest
+priority class of inference_scheduler.py):
+
+- per session, at most one frame waits: a newer frame supersedes the
+  waiting one, which returns at once as skipped ("superseded");
+- when REALTIME_MAX_BACKLOG frames are already waiting or running, a new
+  frame is shed as skipped ("overloaded") instead of queueing.
+
+Only /api/predict-realtime goes through this queue; final /api/predict
+submissions are never skipped. The queue is per worker process.
+
+Each response also advises the client when to send its next frame
+(`advised_poll_ms`): short when idle, longer as the backlog fills up or frames
+get slow, so the total preview load follows the capacity of the worker.
+"""
+
+import time
+import asyncio
+from typing import Any, Callable, Dict, Optional
+
+from config import REALTIME_MAX_BACKLOG, REALTIME_POLL_MIN_MS, REALTIME_POLL_MAX_MS
+from metrics import record_realtime_frame
+from inference_scheduler import InferenceScheduler, inference_scheduler
+
+
+class _Frame:
+    def __init__(self):
+        self.superseded = asyncio.Event()
+
+
+class RealtimeQueue:
+    def __init__(self, scheduler: InferenceScheduler = inference_scheduler, max_backlog: int = REALTIME_MAX_BACKLOG):
+        self.scheduler = scheduler
+        self.max_backlog = max_backlog
+        self._waiting: Dict[str, _Frame] = {}
+        self.backlog = 0    # frames waiting or running
+        self.latency_ms = 0.0    # moving average of computed frames (wait + inference)
+
+    def _observe_latency(self, seconds: float) -> None:
+        self.latency_ms += 0.2 * (seconds * 1000 - self.latency_ms)
+
+    def advised_poll_ms(self) -> int:
+        """Interval the client should wait before its next frame."""
+        # Realtime frames waiting or running, plus higher priority calls queued ahead of them
+        queued = self.backlog + self.scheduler.depth("final") + self.scheduler.depth("batch")
+        load = min(1.0, queued / self.max_backlog)
+        interval = REALTIME_POLL_MIN_MS + (REALTIME_POLL_MAX_MS - REALTIME_POLL_MIN_MS) * load
+        # Never ask for frames faster than they are currently answered
+        interval = max(interval, 2 * self.latency_ms)
+        return int(min(interval, REALTIME_POLL_MAX_MS))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "backlog": self.backlog,
+            "waiting_sessions": len(self._waiting),
+            "max_backlog": self.max_backlog,
+            "latency_ms": round(self.latency_ms, 1),
+            "advised_poll_ms": self.advised_poll_ms(),
+        }
+
+    async def _wait_for_slot(self, frame: _Frame) -> bool:
+        """Acquire an inference slot; False if the frame was superseded first."""
+        acquire = asyncio.ensure_future(self.scheduler.acquire("realtime"))
+        superseded = asyncio.ensure_future(frame.superseded.wait())
+
+        def give_up() -> None:
+            if acquire.done() and not acquire.cancelled():
+                self.scheduler.release()
+            else:
+                acquire.cancel()
+
+        try:
+            await asyncio.wait({acquire, superseded}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            superseded.cancel()
+            give_up()
+            raise
+        superseded.cancel()
+        if frame.superseded.is_set():
+            give_up()
+            return False
+        return True
+
+    async def run(self, session_key: Optional[str], fn: Callable[..., Any], *args) -> Dict[str, Any]:
+        """
+        Run `fn(*args)` in a thread once a slot is free.
+        Returns {"status": "success", "result": ...} or {"status": "skipped", "reason": ...}.
+        """
+        if self.backlog >= self.max_backlog:
+            record_realtime_frame("overloaded")
+            return {"status": "skipped", "reason": "overloaded"}
+
+        t0 = time.perf_counter()
+        frame = _Frame()
+        if session_key is not None:
+            previous = self._waiting.get(session_key)
+            if previous is not None:
+                previous.superseded.set()
+            self._waiting[session_key] = frame
+
+        self.backlog += 1
+        acquired = False
+        try:
+            acquired = await self._wait_for_slot(frame)
+            # Running (or skipped): a newer frame now waits instead of superseding this one
+            if session_key is not None and self._waiting.get(session_key) is frame:
+                del self._waiting[session_key]
+            if not acquired:
+                record_realtime_frame("superseded")
+                return {"status": "skipped", "reason": "superseded"}
+            record_realtime_frame("computed")
+            result = await asyncio.to_thread(fn, *args)
+            self._observe_latency(time.perf_counter() - t0)
+            return {"status": "success", "result": result}
+        finally:
+            if session_key is not None and self._waiting.get(session_key) is frame:
+                del self._waiting[session_key]    # cancelled while waiting
+            if acquired:
+                self.scheduler.release()
+            self.backlog -= 1
+
+
+realtime_queue = RealtimeQueue()
@@ -1,7 +1,29 @@
 import redis
 import os
+from metrics import stage_timer
 
 _redis_client = None
+_redis_binary_client = None
+
+
+class InstrumentedRedis(redis.Redis):
+    """Redis client that records every round trip in the "redis" stage metric."""
+
+    def execute_command(self, *args, **options):
+        with stage_timer("redis"):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        pipe = super().pipeline(transaction=transaction, shard_hint=shard_hint)
+        execute = pipe.execute
+
+        def timed_execute(*args, **kwargs):
+            with stage_timer("redis"):
+                return execute(*args, **kwargs)
+
+        pipe.execute = timed_execute
+        return pipe
+
 
 def get_redis():
     """Get or create a Redis client (singleton)."""
@@ -11,5 +33,15 @@ def get_redis():
         redis_host = os.getenv("REDIS_HOST", "localhost")
         redis_port = int(os.getenv("REDIS_PORT", "6379"))
         redis_db = int(os.getenv("REDIS_DB", "0"))
-        _redis_client = redis.Redis(host=redis_host, port=redis_port, db=redis_db, decode_responses=True)
+        _redis_client = InstrumentedRedis(host=redis_host, port=redis_port, db=redis_db, decode_responses=True)
     return _redis_client
+
+def get_redis_binary():
+    """Get or create a Redis client that returns raw bytes (for image data)."""
+    global _redis_binary_client
+    if _redis_binary_client is None:
+        redis_host = os.getenv("REDIS_HOST", "localhost")
+        redis_port = int(os.getenv("REDIS_PORT", "6379"))
+        redis_db = int(os.getenv("REDIS_DB", "0"))
+        _redis_binary_client = InstrumentedRedis(host=redis_host, port=redis_port, db=redis_db, decode_responses=False)
+    return _redis_binary_client
@@ -0,0 +1,230 @@
+"""
+Process pool for matplotlib plot rendering (UMAP and radar charts).
+
+pyplot keeps global state and rendering is CPU-bound, so plots are drawn in
+worker processes instead of the API process. Each worker imports matplotlib,
+loads the background artifacts / UMAP reducer and warms the font cache once
+at startup, so a render job only pays for the drawing itself.
+
+The pool is started once, by api.init_resources, before TensorFlow is
+imported (forking after it is unsafe); a request never starts it. When a
+worker dies (OOM, segfault) the executor is broken for good: it is replaced
+in a background thread, with spawned workers since TensorFlow is loaded by
+then, and renders fail with RenderPoolUnavailable (503) until it is back.
+"""
+
+import os
+import sys
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import capture_stages, replay_stages
+
+
+class RenderPoolBusy(RuntimeError):
+    """Raised when the render queue limit is reached."""
+
+
+class RenderPoolUnavailable(RenderPoolBusy):
+    """Raised when the pool is not started or is being replaced after a worker crash."""
+
+
+# ---------- Worker side ----------
+
+def _init_worker(warm_params: Optional[Dict[str, Any]]) -> None:
+    """Worker initializer: import matplotlib, load artifacts, warm font cache."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib import font_manager as fm
+
+    warm_params = warm_params or {}
+    umap_params = warm_params.get("umap")
+    if umap_params:
+        try:
+            # No-op when the API process preloaded them before forking (serve.py)
+            from umap_auto import preload_umap_artifacts
+            preload_umap_artifacts(umap_params, samples_per_class=warm_params.get("samples_per_class", 500))
+        except Exception as e:
+            print(f"[RenderPool] Worker {os.getpid()} could not preload UMAP artifacts: {e}")
+
+    # Font cache: resolve fonts and render text once
+    try:
+        prop = None
+        font_path = warm_params.get("font_path")
+        if font_path and os.path.exists(font_path):
+            prop = fm.FontProperties(fname=font_path)
+        fm.findfont(fm.FontProperties())
+        fig = plt.figure(figsize=(1, 1))
+        fig.text(0.5, 0.5, "UMAP 雷達圖 100%", fontproperties=prop)
+        fig.canvas.draw()
+        plt.close(fig)
+    except Exception as e:
+        print(f"[RenderPool] Worker {os.getpid()} font warm-up failed: {e}")
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def render_umap_job(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Render a UMAP plot (runs in a worker)."""
+    from umap_auto import plot_umap_with_user
+    return plot_umap_with_user(**params)
+
+
+def render_radar_job(session_drawings, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Render a radar chart (runs in a worker)."""
+    from radar_chart_auto import create_radar_from_session_data
+    return create_radar_from_session_data(session_drawings=session_drawings, **kwargs)
+
+
+def encode_variant_job(image_bytes: bytes, tier: str, image_format: str) -> bytes:
+    """Re-encode a rendered plot for a size tier / format (runs in a worker)."""
+    from image_output import encode_image
+    return encode_image(image_bytes, tier, image_format)
+
+
+def _run_timed(fn: Callable[..., Any], *args: Any) -> Tuple[Any, List[Tuple[str, float]]]:
+    """Run a job and return its stage timings with the result (runs in a worker)."""
+    with capture_stages() as observations:
+        result = fn(*args)
+    return result, observations
+
+
+# ---------- API side ----------
+
+class RenderPool:
+    """Pre-warmed process pool with a queue limit and per-job timeout."""
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_queue: int = 16,
+        timeout_sec: float = 30.0,
+        warm_params: Optional[Dict[str, Any]] = None,
+        start_method: str = "fork",
+    ):
+        """
+        Args:
+            size: Number of worker processes (0 = render in a thread of the API process)
+            max_queue: Maximum number of submitted-but-unfinished jobs
+            timeout_sec: Seconds to wait for a job before giving up
+            warm_params: Artifact paths / font passed to the worker initializer
+            start_method: multiprocessing start method for the workers
+        """
+        self.size = size
+        self.max_queue = max_queue
+        self.timeout_sec = timeout_sec
+        self.warm_params = warm_params
+        self.start_method = start_method
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._restarting = False
+        self._inline_lock = threading.Lock()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _create_executor(self, start_method: str) -> ProcessPoolExecutor:
+        executor = ProcessPoolExecutor(
+            max_workers=self.size,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker,
+            initargs=(self.warm_params,),
+        )
+        # Submitting `size` jobs at once makes the executor spawn every worker now
+        pings = [executor.submit(_ping) for _ in range(self.size)]
+        pids = {p.result() for p in pings}
+        print(f"[RenderPool] {len(pids)} render worker(s) ready ({start_method})")
+        return executor
+
+    def start(self) -> None:
+        """Create the workers and wait until all of them finished warming up."""
+        if self.size <= 0 or self._executor is not None:
+            return
+        self._executor = self._create_executor(self.start_method)
+
+    def _replace_broken(self, broken: ProcessPoolExecutor) -> None:
+        """Swap out a broken executor in a background thread (once per crash)."""
+        with self._lock:
+            if self._executor is not broken or self._restarting:
+                return
+            self._executor = None
+            self._restarting = True
+        print("[RenderPool] A render worker died, restarting the pool")
+
+        def restart() -> None:
+            broken.shutdown(wait=False, cancel_futures=True)
+            # Forking a process that has loaded TensorFlow is unsafe
+            start_method = "spawn" if "tensorflow" in sys.modules else self.start_method
+            try:
+                executor = self._create_executor(start_method)
+            except Exception as e:
+                print(f"[RenderPool] Could not restart the render workers: {e}")
+                executor = None
+            with self._lock:
+                self._executor = executor
+                self._restarting = False
+
+        threading.Thread(target=restart, name="render-pool-restart", daemon=True).start()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _run_inline(self, fn: Callable[..., Any], *args: Any) -> Any:
+        # pyplot is not thread-safe: inline jobs run one at a time
+        try:
+            with self._inline_lock:
+                return fn(*args)
+        finally:
+            self._release()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Submit `fn(*args)` to a worker and await the result. Stages timed in
+        the worker (csv_load, umap_projection, redis, ...) are observed here.
+        Raises RenderPoolBusy when the queue is full and asyncio.TimeoutError on timeout.
+        With size 0 the job runs in a thread of this process, under the same limits.
+        """
+        with self._lock:
+            executor = self._executor
+            if executor is None and self.size > 0:
+                state = "restarting" if self._restarting else "not started"
+                raise RenderPoolUnavailable(f"Render pool is {state}")
+            if self._pending >= self.max_queue:
+                raise RenderPoolBusy(f"Render queue is full ({self._pending} jobs pending)")
+            self._pending += 1
+        if self.size <= 0:
+            # Stage timers observe directly: to_thread carries the request context along
+            return await asyncio.wait_for(asyncio.to_thread(self._run_inline, fn, *args), timeout=self.timeout_sec)
+        try:
+            future = executor.submit(_run_timed, fn, *args)
+        except BrokenProcessPool:
+            self._release()
+            self._replace_broken(executor)
+            raise RenderPoolUnavailable("Render pool is restarting")
+        except Exception:
+            self._release()
+            raise
+        # The slot is released when the worker finishes, even if the caller timed out
+        future.add_done_callback(self._release)
+        try:
+            result, observations = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout_sec)
+        except BrokenProcessPool:
+            self._replace_broken(executor)
+            raise RenderPoolUnavailable("Render pool is restarting")
+        replay_stages(observations)
+        return result
@@ -0,0 +1,145 @@
+"""
+Multi-worker launcher for the API.
+
+    python serve.py --workers 4 --port 8000
+
+The parent process imports the plotting libraries and loads the read-only
+UMAP artifacts (background embeddings, reduced background, scale metadata,
+reducer), freezes the GC, binds the listening socket and then forks the
+workers. The artifacts are shared between the workers copy-on-write instead
+of being loaded once per worker as with `uvicorn --workers`.
+
+TensorFlow is not fork-safe, so each worker still imports it and loads the
+model in its own lifespan (api.init_resources). Dead workers are restarted.
+See benchmarks/memory_report.py for the per-worker memory comparison.
+"""
+
+import os
+import gc
+import sys
+import signal
+import random
+import socket
+import argparse
+
+import numpy as np
+import uvicorn
+
+from startup import startup_report
+
+
+def preload_shared_state(report=startup_report) -> None:
+    """Load everything read-only that the workers can share (runs in the parent)."""
+    report.import_modules("preload: plotting (matplotlib/seaborn)", "umap_auto", "radar_chart_auto")
+
+    from umap_auto import preload_umap_artifacts
+    from plotting_api import plotting_api, UMAP_ARTIFACT_PARAMS
+
+    with report.stage("preload: umap artifacts", "init"):
+        try:
+            preload_umap_artifacts(UMAP_ARTIFACT_PARAMS, samples_per_class=500)
+            plotting_api.get_umap_background_asset(max_background_samples_per_class=500)
+        except Exception as e:
+            print(f"[Serve] Could not preload UMAP artifacts: {e}")
+
+    # Keep the preloaded objects out of GC passes so the collector does not
+    # write to (and un-share) their pages in the workers
+    gc.collect()
+    gc.freeze()
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, host: str, port: int) -> None:
+    """Worker process body: serve the app on the inherited socket."""
+    # Drop the supervisor's handlers inherited through fork (uvicorn installs its own)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # Forked children start with the parent's RNG state (game rounds use `random`)
+    random.seed()
+    np.random.seed()
+
+    from app import app
+    config = uvicorn.Config(app, host=host, port=port, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def serve(workers: int, host: str, port: int, preload: bool = True) -> None:
+    if preload:
+        print("[Serve] Preloading shared artifacts...")
+        preload_shared_state()
+    else:
+        print("[Serve] Preloading disabled, every worker loads its own artifacts")
+
+    # Importing the app here shares its modules too (it does not load TF or the model)
+    import app  # noqa: F401
+
+    sock = bind_socket(host, port)
+    children = {}
+    stopping = False
+
+    def spawn(index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(sock, host, port)
+            except BaseException as e:
+                print(f"[Serve] Worker {index} crashed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = index
+        print(f"[Serve] Worker {index} started (pid {pid})")
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for i in range(workers):
+        spawn(i)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            print(f"[Serve] Worker {index} (pid {pid}) exited with status {status}, restarting")
+            spawn(index)
+
+    sock.close()
+    print("[Serve] All workers stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--no-preload", action="store_true", help="load artifacts in every worker instead")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs os.fork (Linux/macOS); use `python app.py` instead")
+    serve(args.workers, args.host, args.port, preload=not args.no_preload)
+
+
+if __name__ == "__main__":
+    main()
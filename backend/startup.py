@@ -0,0 +1,81 @@
+"""
+Staged startup for the API process.
+
+Importing the API only pulls in FastAPI, numpy, PIL and redis. The heavy
+parts (matplotlib / seaborn / UMAP artifacts for plotting, TensorFlow / Keras
+for the model) are imported and initialised in the FastAPI lifespan, one stage
+at a time, and each stage is timed. Warm-up steps (warmup.py) are recorded
+in the same report. The report is logged when the worker starts and served
+at GET /api/startup.
+"""
+
+import time
+import importlib
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+
+class StartupReport:
+    """Wall-clock time per startup stage, split into imports, initialisation and warm-up."""
+
+    def __init__(self):
+        self.stages: List[Dict[str, Any]] = []
+        self.completed = False   # imports + initialisation done
+        self.ready = False       # warm-up done, worker should receive traffic
+
+    @contextmanager
+    def stage(self, name: str, kind: str = "init"):
+        """Time a block as one stage; kind is "import", "init" or "warmup"."""
+        t0 = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            self.record(name, time.perf_counter() - t0, kind, error)
+
+    def record(self, name: str, seconds: float, kind: str = "init", error: str = None) -> None:
+        self.stages.append({
+            "stage": name,
+            "kind": kind,
+            "seconds": round(seconds, 4),
+            "error": error,
+        })
+
+    def import_modules(self, name: str, *modules: str) -> None:
+        """Import modules as one "import" stage; a missing optional module is recorded, not raised."""
+        with self.stage(name, "import"):
+            for module in modules:
+                try:
+                    importlib.import_module(module)
+                except ImportError as e:
+                    print(f"[Startup] Could not import {module}: {e}")
+
+    def summary(self) -> Dict[str, Any]:
+        totals = {"import": 0.0, "init": 0.0, "warmup": 0.0}
+        for s in self.stages:
+            totals[s["kind"]] = totals.get(s["kind"], 0.0) + s["seconds"]
+        return {
+            "completed": self.completed,
+            "ready": self.ready,
+            "total_sec": round(sum(totals.values()), 4),
+            "import_sec": round(totals["import"], 4),
+            "init_sec": round(totals["init"], 4),
+            "warmup_sec": round(totals["warmup"], 4),
+            "stages": list(self.stages),
+        }
+
+    def log(self) -> None:
+        summary = self.summary()
+        state = "Ready" if summary["ready"] else "Started" if summary["completed"] else "Incomplete"
+        print(f"[Startup] {state} after {summary['total_sec']:.2f}s "
+              f"(imports {summary['import_sec']:.2f}s, init {summary['init_sec']:.2f}s, "
+              f"warm-up {summary['warmup_sec']:.2f}s)")
+        for s in summary["stages"]:
+            status = f"  FAILED: {s['error']}" if s["error"] else ""
+            print(f"[Startup]   {s['kind']:<6} {s['stage']:<32} {s['seconds']:>8.3f}s{status}")
+
+
+startup_report = StartupReport()
@@ -4,24 +4,36 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib import patches
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib import font_manager as fm
 import seaborn as sns
 import joblib
 import base64
+import hashlib
 import io
-from redis_utils import get_redis
+import json
+import threading
+from PIL import Image
+from image_output import store_image
+from metrics import stage_timer
 
 ArrayLike = Union[np.ndarray, pd.DataFrame, Sequence[Sequence[float]]]
 
 # ---------- Helper: reduce background samples ----------
 
 def reduce_background_umap_samples(
-    background_umap_csv: str,
+    background_umap_csv: Union[str, pd.DataFrame],
     samples_per_class: Optional[int] = 500,
     random_state: Optional[int] = 42,
     strategy: str = 'uniform'
 ) -> pd.DataFrame:
-    df = pd.read_csv(background_umap_csv)
+    # Accept an already loaded (cached) background frame as well as a CSV path
+    if isinstance(background_umap_csv, pd.DataFrame):
+        df = background_umap_csv
+    else:
+        with stage_timer("csv_load"):
+            df = pd.read_csv(background_umap_csv)
     original_count = len(df)
     
     # If samples_per_class is None, return all samples
@@ -74,8 +86,125 @@ def reduce_background_umap_samples(
     
     return reduced_df
 
+# ---------- Helper: background embedding matrix ----------
+
+def build_class_index(classes: Sequence[str]) -> Dict[str, np.ndarray]:
+    """
+    Map each class name to the (ascending) row positions it occupies.
+    """
+    classes = np.asarray(classes, dtype=object)
+    order = np.argsort(classes.astype(str), kind="stable")
+    uniq, starts = np.unique(classes[order].astype(str), return_index=True)
+    return {str(c): rows for c, rows in zip(uniq, np.split(order, starts[1:]))}
+
+_BACKGROUND_EMBEDDING_CACHE: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+
+def load_background_embeddings(
+    raw_embedding_csv: str,
+    feature_cols: Optional[List[str]] = None,
+    bg_class_col: str = "class",
+    normalize_class_space: bool = False,
+) -> Dict[str, Any]:
+    """
+    Load background embeddings once as a float matrix plus a class-to-rows index.
+    Cached per (path, columns, normalization) for the lifetime of the process.
+    """
+    key = (
+        os.path.abspath(raw_embedding_csv),
+        tuple(feature_cols) if feature_cols else None,
+        bg_class_col,
+        normalize_class_space,
+    )
+    cached = _BACKGROUND_EMBEDDING_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    with stage_timer("csv_load"):
+        raw_embedding = pd.read_csv(raw_embedding_csv)
+    if bg_class_col not in raw_embedding.columns:
+        raise KeyError(f"`bg_class_col='{bg_class_col}'` not found in raw_embedding.")
+    if feature_cols is None:
+        feature_cols = [c for c in raw_embedding.columns if c.startswith("emb_")]
+    if not feature_cols:
+        raise ValueError("Cannot infer feature_cols (need columns starting with 'emb_').")
+    for c in feature_cols:
+        if c not in raw_embedding.columns:
+            raise KeyError(f"raw_embedding missing column: {c}")
+
+    classes = raw_embedding[bg_class_col].astype(str)
+    if normalize_class_space:
+        classes = classes.str.replace(" ", "_")
+    classes = classes.to_numpy()
+
+    cached = {
+        "matrix": raw_embedding[feature_cols].to_numpy(dtype=np.float64),
+        "classes": classes,
+        "class_index": build_class_index(classes),
+        "feature_cols": list(feature_cols),
+    }
+    _BACKGROUND_EMBEDDING_CACHE[key] = cached
+    return cached
+
 # ---------- Core: sampling + smoothing ----------
 
+def sample_and_smooth_matrix(
+    user_matrix: ArrayLike,
+    user_classes: Sequence[str],
+    bg_matrix: np.ndarray,
+    class_index: Dict[str, np.ndarray],
+    *,
+    sample_size: int = 1,
+    random_state: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Array-native sampling + smoothing.
+
+    Each user row is averaged with `sample_size` background rows of the same class:
+    final = (mean(sampled) * sample_size + user) / (sample_size + 1).
+    Row draws follow the same seed stream as `DataFrame.sample` did in the
+    original per-row implementation, so seeded results are unchanged.
+
+    Returns:
+        {"mixed": (K, D) array, "classes": kept class names, "skipped_classes": [...]}
+    """
+    user_matrix = np.asarray(user_matrix, dtype=np.float64)
+    if user_matrix.ndim != 2:
+        raise ValueError("user_matrix must be 2D (n_samples, n_features).")
+    if len(user_classes) != len(user_matrix):
+        raise ValueError("user_classes must have one entry per user_matrix row.")
+    if user_matrix.shape[1] != bg_matrix.shape[1]:
+        raise ValueError("user_matrix and bg_matrix must have the same number of features.")
+
+    user_classes = [str(c) for c in user_classes]
+    keep = [i for i, c in enumerate(user_classes) if len(class_index.get(c, ())) > 0]
+    skipped = [c for c in user_classes if len(class_index.get(c, ())) == 0]
+    kept_classes = [user_classes[i] for i in keep]
+
+    if not keep:
+        return {
+            "mixed": np.empty((0, user_matrix.shape[1]), dtype=np.float64),
+            "classes": [],
+            "skipped_classes": skipped,
+        }
+
+    # One seed per kept row, drawn in a single call (same stream as the old per-row draws)
+    rng = np.random.default_rng(random_state)
+    seeds = rng.integers(0, 2**32 - 1, size=len(keep))
+
+    picked = []
+    for cls, seed in zip(kept_classes, seeds):
+        rows = class_index[cls]
+        n = min(sample_size, len(rows))
+        pos = np.random.RandomState(int(seed)).choice(len(rows), size=n, replace=len(rows) < sample_size)
+        picked.append(rows[pos])
+
+    counts = np.fromiter((len(p) for p in picked), dtype=np.intp, count=len(picked))
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    sampled_avg = np.add.reduceat(bg_matrix[np.concatenate(picked)], offsets, axis=0) / counts[:, None]
+
+    mixed = (sampled_avg * sample_size + user_matrix[keep]) / (sample_size + 1)
+    return {"mixed": mixed, "classes": kept_classes, "skipped_classes": skipped}
+
 def sample_and_smooth_embeddings(
     inputdata: pd.DataFrame,
     raw_embedding: pd.DataFrame,
@@ -88,6 +217,7 @@ def sample_and_smooth_embeddings(
 ) -> Dict[str, Any]:
     """
     Sample and smooth embeddings for user input data.
+    DataFrame wrapper around `sample_and_smooth_matrix`.
     """
     if input_class_col not in inputdata.columns:
         raise KeyError(f"`input_class_col='{input_class_col}'` not found in inputdata.")
@@ -99,36 +229,22 @@ def sample_and_smooth_embeddings(
         if c not in raw_embedding.columns:
             raise KeyError(f"raw_embedding missing column: {c}")
 
-    rng = np.random.default_rng(random_state) if random_state is not None else None
-
-    results, skipped = [], []
-    for _, row in inputdata.iterrows():
-        cls = row[input_class_col]
-        candidates = raw_embedding[raw_embedding[bg_class_col] == cls]
-        if len(candidates) == 0:
-            skipped.append(cls)
-            continue
-
-        seed = int(rng.integers(0, 2**32 - 1)) if rng is not None else None
-        sampled = candidates.sample(
-            n=min(sample_size, len(candidates)),
-            replace=(len(candidates) < sample_size),
-            random_state=seed
-        )
-
-        sampled_avg = sampled[[*feature_cols]].mean(axis=0).values
-        input_vec = row[[*feature_cols]].values
-        final_vec = (sampled_avg * sample_size + input_vec) / (sample_size + 1)
-
-        results.append({input_class_col: cls, "final_emb": final_vec})
+    res = sample_and_smooth_matrix(
+        inputdata[feature_cols].to_numpy(dtype=np.float64),
+        inputdata[input_class_col].tolist(),
+        raw_embedding[feature_cols].to_numpy(dtype=np.float64),
+        build_class_index(raw_embedding[bg_class_col].to_numpy()),
+        sample_size=sample_size,
+        random_state=random_state,
+    )
 
-    if len(results) == 0:
+    if len(res["classes"]) == 0:
         mix_df = pd.DataFrame(columns=[input_class_col] + feature_cols)
     else:
-        mix_df = pd.DataFrame([r["final_emb"] for r in results], columns=feature_cols)
-        mix_df.insert(0, input_class_col, [r[input_class_col] for r in results])
+        mix_df = pd.DataFrame(res["mixed"], columns=feature_cols)
+        mix_df.insert(0, input_class_col, res["classes"])
 
-    return {"mix_df": mix_df, "skipped_classes": skipped}
+    return {"mix_df": mix_df, "skipped_classes": res["skipped_classes"]}
 
 # ---------- Helper: scale fitting / application ----------
 
@@ -145,38 +261,201 @@ def _fit_linear_scale(src: np.ndarray, dst: np.ndarray) -> Tuple[float, float]:
 def _apply_linear_scale(x: np.ndarray, m: float, c: float) -> np.ndarray:
     return m * x + c
 
+# ---------- Helper: background UMAP artifact + metadata ----------
+
+_BACKGROUND_UMAP_CACHE: Dict[Tuple[str, bool], pd.DataFrame] = {}
+_UMAP_METADATA_CACHE: Dict[str, Dict[str, Any]] = {}
+
+def load_background_umap(umap_background_csv: str, normalize_class_space: bool = False) -> pd.DataFrame:
+    """
+    Load the background 2D CSV once per process.
+    The returned frame is shared; callers must not modify it in place.
+    """
+    key = (os.path.abspath(umap_background_csv), normalize_class_space)
+    df = _BACKGROUND_UMAP_CACHE.get(key)
+    if df is None:
+        with stage_timer("csv_load"):
+            df = pd.read_csv(umap_background_csv)
+        if normalize_class_space and "class" in df.columns:
+            df["class"] = df["class"].astype(str).str.replace(" ", "_")
+        _BACKGROUND_UMAP_CACHE[key] = df
+    return df
+
+_REDUCED_BACKGROUND_CACHE: Dict[Tuple[Any, ...], pd.DataFrame] = {}
+
+def load_reduced_background_umap(
+    umap_background_csv: str,
+    samples_per_class: Optional[int] = 500,
+    random_state: Optional[int] = 42,
+    strategy: str = 'uniform',
+    normalize_class_space: bool = False,
+) -> pd.DataFrame:
+    """
+    Background 2D points reduced per class.
+    A seeded reduction is deterministic, so it is cached per process.
+    """
+    df = load_background_umap(umap_background_csv, normalize_class_space)
+    if samples_per_class is None:
+        return df
+    if random_state is None:
+        return reduce_background_umap_samples(df, samples_per_class, random_state, strategy)
+
+    key = (os.path.abspath(umap_background_csv), samples_per_class, random_state, strategy, normalize_class_space)
+    reduced = _REDUCED_BACKGROUND_CACHE.get(key)
+    if reduced is None:
+        reduced = reduce_background_umap_samples(df, samples_per_class, random_state, strategy)
+        _REDUCED_BACKGROUND_CACHE[key] = reduced
+    return reduced
+
+def umap_metadata_path(umap_background_csv: str) -> str:
+    """Sidecar metadata file stored next to the background CSV."""
+    return os.path.splitext(umap_background_csv)[0] + ".meta.json"
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def compute_umap_scale_coefficients(background_Umap: pd.DataFrame) -> Optional[Dict[str, List[float]]]:
+    """
+    Fit the umap -> scale mapping per axis.
+    Returns {"x": [m, c], "y": [m, c]} or None if the frame has no scale_x/scale_y.
+    """
+    if not {"umap_x", "umap_y", "scale_x", "scale_y"}.issubset(background_Umap.columns):
+        return None
+    mx, cx = _fit_linear_scale(background_Umap["umap_x"].values, background_Umap["scale_x"].values)
+    my, cy = _fit_linear_scale(background_Umap["umap_y"].values, background_Umap["scale_y"].values)
+    return {"x": [mx, cx], "y": [my, cy]}
+
+def build_umap_metadata(umap_background_csv: str, background_Umap: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+    """
+    Compute the artifact metadata for a background CSV (scale coefficients etc).
+    """
+    if background_Umap is None:
+        background_Umap = load_background_umap(umap_background_csv)
+    return {
+        "source": os.path.basename(umap_background_csv),
+        "source_sha256": _file_sha256(umap_background_csv),
+        "num_rows": int(len(background_Umap)),
+        "scale_coefficients": compute_umap_scale_coefficients(background_Umap),
+    }
+
+def write_umap_metadata(umap_background_csv: str, metadata: Dict[str, Any]) -> str:
+    path = umap_metadata_path(umap_background_csv)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+    return path
+
+def load_umap_metadata(umap_background_csv: str) -> Dict[str, Any]:
+    """
+    Load the artifact metadata for a background CSV.
+    Reads the sidecar file when it matches the CSV contents; otherwise the
+    metadata is rebuilt and the sidecar rewritten (best effort).
+    Cached per process.
+    """
+    key = os.path.abspath(umap_background_csv)
+    metadata = _UMAP_METADATA_CACHE.get(key)
+    if metadata is not None:
+        return metadata
+
+    sidecar = umap_metadata_path(umap_background_csv)
+    digest = _file_sha256(umap_background_csv)
+    if os.path.exists(sidecar):
+        try:
+            with open(sidecar, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            metadata = None
+        if metadata is not None and metadata.get("source_sha256") != digest:
+            metadata = None
+
+    if metadata is None:
+        metadata = build_umap_metadata(umap_background_csv)
+        try:
+            write_umap_metadata(umap_background_csv, metadata)
+        except OSError as e:
+            print(f"Could not write UMAP metadata to {sidecar}: {e}")
+
+    _UMAP_METADATA_CACHE[key] = metadata
+    return metadata
+
+_REDUCER_CACHE: Dict[str, Any] = {}
+
+def load_umap_reducer(umap_reducer_path: str) -> Any:
+    """Load the fitted UMAP reducer once per process."""
+    key = os.path.abspath(umap_reducer_path)
+    reducer = _REDUCER_CACHE.get(key)
+    if reducer is None:
+        with stage_timer("reducer_load"):
+            reducer = joblib.load(umap_reducer_path)
+        if not hasattr(reducer, "transform"):
+            raise ValueError("Loaded UMAP reducer has no `.transform()`.")
+        _REDUCER_CACHE[key] = reducer
+    return reducer
+
+def preload_umap_artifacts(params: Dict[str, Any], samples_per_class: Optional[int] = 500) -> None:
+    """
+    Fill the per-process artifact caches (background embeddings, reduced
+    background, scale metadata, reducer) for the given UMAP_ARTIFACT_PARAMS-style
+    settings. Done once before forking, the cached arrays are shared by the
+    children copy-on-write.
+    """
+    load_background_embeddings(
+        params["raw_embedding_csv"],
+        feature_cols=params.get("feature_cols"),
+        bg_class_col=params.get("bg_class_col", "class"),
+        normalize_class_space=params.get("normalize_class_space", False),
+    )
+    load_reduced_background_umap(
+        params["umap_background_csv"],
+        samples_per_class=samples_per_class,
+        random_state=params.get("random_state", 42),
+        strategy=params.get("background_sample_strategy", "uniform"),
+        normalize_class_space=params.get("normalize_class_space", False),
+    )
+    load_umap_metadata(params["umap_background_csv"])
+    if os.path.exists(params["umap_reducer_path"]):
+        load_umap_reducer(params["umap_reducer_path"])
+
+# ---------- Helper: packed background point cloud ----------
+
+def pack_background_points(
+    background_data: pd.DataFrame,
+    x_col: str,
+    y_col: str,
+    cluster_col: str = "cluster",
+) -> bytes:
+    """
+    Pack background points for client-side rendering:
+    little-endian float32 [x0, y0, x1, y1, ...] followed by one uint8 cluster code per point
+    (255 = no cluster). 9 bytes per point.
+    """
+    xy = np.empty((len(background_data), 2), dtype="<f4")
+    xy[:, 0] = background_data[x_col].to_numpy(dtype=np.float32)
+    xy[:, 1] = background_data[y_col].to_numpy(dtype=np.float32)
+    if cluster_col in background_data.columns:
+        codes = background_data[cluster_col].fillna(255).to_numpy().astype(np.uint8)
+    else:
+        codes = np.full(len(background_data), 255, dtype=np.uint8)
+    return xy.tobytes() + codes.tobytes()
+
 # ---------- Plotting helper functions ----------
 
-def create_plot_with_border(
+def _draw_background_points(
+    ax: plt.Axes,
     background_data: pd.DataFrame,
-    user_data: pd.DataFrame,
     x_col: str,
     y_col: str,
     cluster_col: str,
     fixed_palette: Dict[int, str],
-    figsize: Tuple[float, float],
     background_size: int,
     background_alpha: float,
-    user_marker: str,
-    user_color: str,
-    user_size: int,
-    title: str,
-    font_prop: Optional[object] = None,
-) -> plt.Figure:
+) -> None:
     """
-    Create a properly centered plot with white border that won't be cut off.
+    Scatter the background points (coloured by cluster when available).
     """
-    # Create figure with proper spacing for border
-    fig = plt.figure(figsize=figsize)
-    
-    # Add subplot with margins to accommodate border
-    ax = fig.add_subplot(111)
-    
-    # Set background color to white
-    fig.patch.set_facecolor('white')
-    ax.set_facecolor('white')
-    
-    # Plot background points
     if cluster_col in background_data.columns:
         sns.scatterplot(
             data=background_data,
@@ -200,7 +479,15 @@ def create_plot_with_border(
             ax=ax
         )
 
-    # Plot user points
+def _draw_user_points(
+    ax: plt.Axes,
+    user_data: pd.DataFrame,
+    x_col: str,
+    y_col: str,
+    user_marker: str,
+    user_color: str,
+    user_size: int,
+) -> None:
     sns.scatterplot(
         data=user_data,
         x=x_col, y=y_col,
@@ -212,6 +499,57 @@ def create_plot_with_border(
         ax=ax
     )
 
+def _add_plot_border(fig: plt.Figure) -> patches.Rectangle:
+    # Use figure coordinates to ensure border is always visible
+    border = patches.Rectangle(
+        (0.02, 0.02), 0.96, 0.96,  # Leave 2% margin on all sides
+        transform=fig.transFigure,
+        linewidth=3, 
+        edgecolor="black", 
+        facecolor="none",
+        zorder=1000  # Ensure border is on top
+    )
+    fig.patches.append(border)
+    return border
+
+def create_plot_with_border(
+    background_data: pd.DataFrame,
+    user_data: pd.DataFrame,
+    x_col: str,
+    y_col: str,
+    cluster_col: str,
+    fixed_palette: Dict[int, str],
+    figsize: Tuple[float, float],
+    background_size: int,
+    background_alpha: float,
+    user_marker: str,
+    user_color: str,
+    user_size: int,
+    title: str,
+    font_prop: Optional[object] = None,
+) -> plt.Figure:
+    """
+    Create a properly centered plot with white border that won't be cut off.
+    """
+    # Create figure with proper spacing for border
+    fig = plt.figure(figsize=figsize)
+    
+    # Add subplot with margins to accommodate border
+    ax = fig.add_subplot(111)
+    
+    # Set background color to white
+    fig.patch.set_facecolor('white')
+    ax.set_facecolor('white')
+    
+    # Plot background points
+    _draw_background_points(
+        ax, background_data, x_col, y_col, cluster_col,
+        fixed_palette, background_size, background_alpha
+    )
+
+    # Plot user points
+    _draw_user_points(ax, user_data, x_col, y_col, user_marker, user_color, user_size)
+
     # Set title with proper font
     ax.set_title(title, fontproperties=font_prop, fontsize=17, fontweight="bold", pad=20)
     
@@ -224,19 +562,147 @@ def create_plot_with_border(
     ax.autoscale_view(tight=True)
     
     # Add white border around the entire plot area with proper margins
-    # Use figure coordinates to ensure border is always visible
-    border = patches.Rectangle(
-        (0.02, 0.02), 0.96, 0.96,  # Leave 2% margin on all sides
-        transform=fig.transFigure,
-        linewidth=3, 
-        edgecolor="black", 
-        facecolor="none",
-        zorder=1000  # Ensure border is on top
-    )
-    fig.patches.append(border)
+    _add_plot_border(fig)
     
     return fig
 
+# ---------- Pre-rendered background layer ----------
+
+_UMAP_LAYER_CACHE: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+
+def get_umap_background_layer(
+    cache_key: Tuple[Any, ...],
+    background_data: pd.DataFrame,
+    x_col: str,
+    y_col: str,
+    cluster_col: str,
+    fixed_palette: Dict[int, str],
+    figsize: Tuple[float, float],
+    dpi: int,
+    background_size: int,
+    background_alpha: float,
+    title: str,
+    font_prop: Optional[object] = None,
+) -> Dict[str, Any]:
+    """
+    Render background scatter, title and border once and keep the raster
+    together with the figure / axes it was drawn on (same axis transform).
+    Cached per `cache_key` (artifact + figure settings).
+    """
+    layer = _UMAP_LAYER_CACHE.get(cache_key)
+    if layer is not None:
+        return layer
+
+    # Standalone Agg figure (not registered with pyplot)
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    fig.patch.set_facecolor('white')
+    ax.set_facecolor('white')
+
+    _draw_background_points(
+        ax, background_data, x_col, y_col, cluster_col,
+        fixed_palette, background_size, background_alpha
+    )
+    ax.set_title(title, fontproperties=font_prop, fontsize=17, fontweight="bold", pad=20)
+    if ax.get_legend():
+        ax.get_legend().remove()
+    ax.axis("off")
+    ax.autoscale_view(tight=True)
+    border = _add_plot_border(fig)
+
+    fig.canvas.draw()
+    layer = {
+        "fig": fig,
+        "ax": ax,
+        "border": border,
+        "background": fig.canvas.copy_from_bbox(fig.bbox),
+        "xlim": ax.get_xlim(),
+        "ylim": ax.get_ylim(),
+        "data_bounds": tuple(ax.dataLim.extents),  # (x0, y0, x1, y1)
+        "dpi": dpi,
+        "lock": threading.Lock(),
+    }
+    _UMAP_LAYER_CACHE[cache_key] = layer
+    return layer
+
+def render_user_on_layer(
+    layer: Dict[str, Any],
+    user_data: pd.DataFrame,
+    x_col: str,
+    y_col: str,
+    user_marker: str,
+    user_color: str,
+    user_size: int,
+    annotate: bool,
+    label_dx: float,
+    label_dy: float,
+    label_fontsize: int,
+    font_prop: Optional[object] = None,
+    pad_inches: float = 0.1,
+) -> Optional[bytes]:
+    """
+    Composite user markers + labels onto a cached background layer and
+    encode the result as PNG (cropped like bbox_inches="tight").
+
+    Returns None when the layer cannot reproduce the full render, e.g. a
+    user point outside the background extent (which would change the axis
+    limits) or labels reaching past the figure edge.
+    """
+    x0, y0, x1, y1 = layer["data_bounds"]
+    if len(user_data) > 0:
+        ux = user_data[x_col].to_numpy(dtype=float)
+        uy = user_data[y_col].to_numpy(dtype=float)
+        if ux.min() < x0 or ux.max() > x1 or uy.min() < y0 or uy.max() > y1:
+            return None
+
+    fig, ax = layer["fig"], layer["ax"]
+    dpi = layer["dpi"]
+    with layer["lock"]:
+        n_collections, n_texts = len(ax.collections), len(ax.texts)
+        _draw_user_points(ax, user_data, x_col, y_col, user_marker, user_color, user_size)
+        if ax.get_legend():
+            ax.get_legend().remove()
+        if annotate:
+            add_text_annotations(
+                ax=ax,
+                user_data=user_data,
+                x_col=x_col,
+                y_col=y_col,
+                label_dx=label_dx,
+                label_dy=label_dy,
+                label_fontsize=label_fontsize,
+                font_prop=font_prop
+            )
+        ax.set_xlim(layer["xlim"])
+        ax.set_ylim(layer["ylim"])
+        new_artists = list(ax.collections[n_collections:]) + list(ax.texts[n_texts:])
+
+        try:
+            canvas = fig.canvas
+            canvas.restore_region(layer["background"])
+            for artist in new_artists:
+                ax.draw_artist(artist)
+            fig.draw_artist(layer["border"])  # border stays on top, as in the full render
+
+            bbox = fig.get_tightbbox(canvas.get_renderer()).padded(pad_inches)
+            width_px, height_px = fig.bbox.width, fig.bbox.height
+            left = int(round(bbox.x0 * dpi))
+            right = left + int(bbox.width * dpi)
+            top = int(round(height_px - bbox.y1 * dpi))
+            bottom = top + int(bbox.height * dpi)
+            if left < 0 or top < 0 or right > width_px or bottom > height_px:
+                return None
+
+            rgba = np.asarray(canvas.buffer_rgba())[top:bottom, left:right].copy()
+        finally:
+            for artist in new_artists:
+                artist.remove()
+
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, mode="RGBA").save(buffer, format="PNG", dpi=(dpi, dpi))
+    return buffer.getvalue()
+
 def add_text_annotations(
     ax: plt.Axes,
     user_data: pd.DataFrame,
@@ -277,7 +743,7 @@ def save_plot_to_redis(
     expire_sec: int = 3600
 ) -> str:
     """
-    Save plot to Redis as base64 encoded image.
+    Save plot to Redis as a raw PNG (base64 string is returned).
     
     Args:
         fig: Matplotlib figure
@@ -288,6 +754,13 @@ def save_plot_to_redis(
     Returns:
         base64 encoded image string
     """
+    image_bytes = encode_plot_png(fig, dpi=dpi)
+    return store_png_to_redis(image_bytes, redis_key, expire_sec=expire_sec)
+
+def encode_plot_png(fig: plt.Figure, dpi: int = 200) -> bytes:
+    """
+    Encode a figure as PNG bytes (tight bbox, white background).
+    """
     # Save figure to bytes buffer
     buffer = io.BytesIO()
     fig.savefig(
@@ -301,15 +774,16 @@ def save_plot_to_redis(
     )
     buffer.seek(0)
     
-    # Encode to base64
-    image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    image_bytes = buffer.getvalue()
     buffer.close()
-    
-    # Store in Redis
-    redis_client = get_redis()
-    redis_client.set(redis_key, image_base64, ex=expire_sec)
-    
-    return image_base64
+    return image_bytes
+
+def store_png_to_redis(image_bytes: bytes, redis_key: str, expire_sec: int = 3600) -> str:
+    """
+    Store encoded PNG bytes in Redis (raw bytes) and return the base64 string.
+    """
+    store_image(redis_key, image_bytes, expire_sec=expire_sec)
+    return base64.b64encode(image_bytes).decode('utf-8')
 
 def save_plot_properly(
     fig: plt.Figure,
@@ -334,108 +808,112 @@ def save_plot_properly(
 
 # ---------- Main plotting function ----------
 
-def plot_umap_with_user(
-    *,
-    raw_embedding_csv: str,         # background embeddings CSV (must have 'class' + emb_*)
-    umap_background_csv: str,       # background 2D CSV (must have umap_x, umap_y; optional scale_x, scale_y, class, cluster)
-    user_embedding_df: pd.DataFrame,        # user 6 images embeddings dataframe (must have 'prompt' + emb_*)
-    umap_reducer_path: str,         # fitted UMAP reducer (.joblib) with .transform()
+DEFAULT_CLUSTER_PALETTE: Dict[int, str] = {
+    0: "#1f77b4",  # blue
+    1: "#ff7f0e",  # orange
+    2: "#2ca02c",  # green
+    3: "#fa7d7e",  # red
+    4: "#9467bd",  # purple
+    5: "#e377c2",  # pink-ish
+}
 
-    # columns
+UMAP_TITLE = "我畫的圖與與訓練資料的 UMAP 分佈"
+
+
+def project_user_umap(
+    *,
+    raw_embedding_csv: str,
+    umap_background_csv: str,
+    umap_reducer_path: str,
+    user_embedding_df: Optional[pd.DataFrame] = None,
+    user_embeddings: Optional[ArrayLike] = None,
+    user_classes: Optional[Sequence[str]] = None,
     feature_cols: Optional[List[str]] = None,
     input_class_col: str = "prompt",
     bg_class_col: str = "class",
-    cluster_col: str = "cluster",
-
-    # sampling + smoothing
     sample_size: int = 1,
     random_state: Optional[int] = None,
-    normalize_class_space: bool = False,  # replace spaces with underscores to align categories
-    
-    # background reduction
-    max_background_samples_per_class: Optional[int] = None,  # e.g., 500 samples per class
-    background_sample_strategy: str = 'uniform',  # 'uniform' or 'stratified'
-
-    # scaling to match your "scale_x / scale_y" style
-    # Option A: learn from background if it already has scale_x/scale_y;
-    # Option B: specify offsets explicitly:
+    normalize_class_space: bool = False,
+    max_background_samples_per_class: Optional[int] = None,
+    background_sample_strategy: str = 'uniform',
     x_offset: Optional[float] = None,
     x_scale: Optional[float] = None,
     y_offset: Optional[float] = None,
     y_scale: Optional[float] = None,
-
-    # seaborn styling
-    figsize: Tuple[float, float] = (10, 7),
-    fixed_palette: Optional[Dict[int, str]] = None,   # cluster -> color
-    background_size: int = 30,
-    background_alpha: float = 0.9,
-    user_marker: str = "^",
-    user_color: str = "black",
-    user_size: int = 120,
-    annotate: bool = True,     # e.g., {"soccer_ball":"足球", ...}
-    label_fontsize: int = 15,
-    label_dx: float = 0.02,
-    label_dy: float = 0.02,
-    font_path: Optional[str] = None,                  # e.g., NotoSansCJK .ttc
-
-    # output
-    output_path: Optional[str] = None,
-    redis_key: Optional[str] = None,
-    show: bool = False,
 ) -> Dict[str, Any]:
-    # ---- read CSVs ----
-    raw_embedding = pd.read_csv(raw_embedding_csv)
-    background_Umap = pd.read_csv(umap_background_csv)
-    user_embedding = user_embedding_df  # Direct DataFrame instead of CSV
-    
-    # ---- reduce background samples if requested ----
-    if max_background_samples_per_class is not None:
-        background_Umap = reduce_background_umap_samples(
-            umap_background_csv,
-            samples_per_class=max_background_samples_per_class,
-            random_state=random_state,
-            strategy=background_sample_strategy
-        )
+    """
+    Smooth + project user embeddings into the background's display space.
+    No plotting; shared by the PNG renderer and the client-side data mode.
+    """
+    # ---- user inputs (matrix + class names) ----
+    if user_embeddings is not None:
+        if user_classes is None:
+            raise ValueError("`user_classes` is required together with `user_embeddings`.")
+        user_matrix = np.asarray(user_embeddings, dtype=np.float64)
+        user_class_list = [str(c) for c in user_classes]
+    elif user_embedding_df is not None:
+        if input_class_col not in user_embedding_df.columns:
+            raise KeyError(f"`input_class_col='{input_class_col}'` not found in inputdata.")
+        user_matrix = None
+        user_class_list = user_embedding_df[input_class_col].astype(str).tolist()
+    else:
+        raise ValueError("Provide either `user_embedding_df` or `user_embeddings` + `user_classes`.")
 
     if normalize_class_space:
-        if bg_class_col in raw_embedding.columns:
-            raw_embedding[bg_class_col] = raw_embedding[bg_class_col].astype(str).str.replace(" ", "_")
-        if input_class_col in user_embedding.columns:
-            user_embedding[input_class_col] = user_embedding[input_class_col].astype(str).str.replace(" ", "_")
-        if "class" in background_Umap.columns:
-            background_Umap["class"] = background_Umap["class"].astype(str).str.replace(" ", "_")
+        user_class_list = [c.replace(" ", "_") for c in user_class_list]
 
     # ---- feature cols ----
-    if feature_cols is None:
-        feature_cols = [c for c in raw_embedding.columns if c.startswith("emb_")]
+    if feature_cols is None and user_matrix is None:
+        bg_cols = pd.read_csv(raw_embedding_csv, nrows=0).columns
+        feature_cols = [c for c in bg_cols if c.startswith("emb_")]
         if not feature_cols:
-            feature_cols = [c for c in user_embedding.columns if c.startswith("emb_")]
-    if not feature_cols:
-        raise ValueError("Cannot infer feature_cols (need columns starting with 'emb_').")
+            feature_cols = [c for c in user_embedding_df.columns if c.startswith("emb_")]
+        if not feature_cols:
+            raise ValueError("Cannot infer feature_cols (need columns starting with 'emb_').")
+
+    # ---- background embeddings (cached matrix + class index) ----
+    background_emb = load_background_embeddings(
+        raw_embedding_csv,
+        feature_cols=feature_cols,
+        bg_class_col=bg_class_col,
+        normalize_class_space=normalize_class_space,
+    )
+    feature_cols = background_emb["feature_cols"]
+    if user_matrix is None:
+        for c in feature_cols:
+            if c not in user_embedding_df.columns:
+                raise KeyError(f"inputdata missing column: {c}")
+        user_matrix = user_embedding_df[feature_cols].to_numpy(dtype=np.float64)
+
+    # ---- background 2D points (cached artifact) ----
+    background_Umap = load_reduced_background_umap(
+        umap_background_csv,
+        samples_per_class=max_background_samples_per_class,
+        random_state=random_state,
+        strategy=background_sample_strategy,
+        normalize_class_space=normalize_class_space,
+    )
 
-    # ---- load reducer ----
-    reducer = joblib.load(umap_reducer_path)
-    if not hasattr(reducer, "transform"):
-        raise ValueError("Loaded UMAP reducer has no `.transform()`.")
+    # ---- load reducer (cached) ----
+    reducer = load_umap_reducer(umap_reducer_path)
 
     # ---- sampling + smoothing ----
-    mix_res = sample_and_smooth_embeddings(
-        inputdata=user_embedding,
-        raw_embedding=raw_embedding,
-        feature_cols=feature_cols,
+    mix_res = sample_and_smooth_matrix(
+        user_matrix,
+        user_class_list,
+        background_emb["matrix"],
+        background_emb["class_index"],
         sample_size=sample_size,
         random_state=random_state,
-        input_class_col=input_class_col,
-        bg_class_col=bg_class_col,
     )
-    mix_df = mix_res["mix_df"]
     skipped = mix_res["skipped_classes"]
 
     # ---- project user to 2D ----
-    if len(mix_df) > 0:
-        user_2d = reducer.transform(mix_df[feature_cols].values)
+    if len(mix_res["classes"]) > 0:
+        with stage_timer("umap_projection"):
+            user_2d = reducer.transform(mix_res["mixed"])
         mix_df_umap = pd.DataFrame({
-            "class": mix_df[input_class_col].values,
+            "class": mix_res["classes"],
             "umap_x": user_2d[:, 0],
             "umap_y": user_2d[:, 1],
         })
@@ -446,11 +924,11 @@ def plot_umap_with_user(
     use_scaled = False
     if {"umap_x", "umap_y"}.issubset(background_Umap.columns):
         if {"scale_x", "scale_y"}.issubset(background_Umap.columns):
-            # learn per-axis linear mapping
-            mx, cx = _fit_linear_scale(background_Umap["umap_x"].values, background_Umap["scale_x"].values)
-            my, cy = _fit_linear_scale(background_Umap["umap_y"].values, background_Umap["scale_y"].values)
+            # per-axis linear mapping, precomputed once per artifact
+            coeffs = load_umap_metadata(umap_background_csv)["scale_coefficients"]
+            (mx, cx), (my, cy) = coeffs["x"], coeffs["y"]
 
-            background_Umap_plot = background_Umap.copy()
+            background_Umap_plot = background_Umap
             # apply same mapping to user
             mix_df_umap["scale_x"] = _apply_linear_scale(mix_df_umap["umap_x"].values, mx, cx)
             mix_df_umap["scale_y"] = _apply_linear_scale(mix_df_umap["umap_y"].values, my, cy)
@@ -467,7 +945,7 @@ def plot_umap_with_user(
             use_scaled = True
 
         else:
-            background_Umap_plot = background_Umap.copy()
+            background_Umap_plot = background_Umap
     else:
         raise KeyError("`umap_background_csv` must contain 'umap_x' and 'umap_y'.")
 
@@ -475,17 +953,6 @@ def plot_umap_with_user(
     x_col = "scale_x" if use_scaled else "umap_x"
     y_col = "scale_y" if use_scaled else "umap_y"
 
-    # ---- palette ----
-    if fixed_palette is None:
-        fixed_palette = {
-            0: "#1f77b4",  # blue
-            1: "#ff7f0e",  # orange
-            2: "#2ca02c",  # green
-            3: "#fa7d7e",  # red
-            4: "#9467bd",  # purple
-            5: "#e377c2",  # pink-ish
-        }
-
     # ---- labels (optional mapping, e.g., to Chinese names) ----
     from plot_utils import get_class_label_map
     label_map = get_class_label_map()
@@ -495,6 +962,100 @@ def plot_umap_with_user(
     else:
         mix_df_umap["label"] = mix_df_umap.get("class", pd.Series([""] * len(mix_df_umap)))
 
+    background_data = background_Umap if not use_scaled else background_Umap_plot
+
+    return {
+        "user_umap": mix_df_umap,
+        "background": background_data,
+        "skipped_classes": skipped,
+        "used_scaled": use_scaled,
+        "x_col": x_col,
+        "y_col": y_col,
+    }
+
+def plot_umap_with_user(
+    *,
+    raw_embedding_csv: str,         # background embeddings CSV (must have 'class' + emb_*)
+    umap_background_csv: str,       # background 2D CSV (must have umap_x, umap_y; optional scale_x, scale_y, class, cluster)
+    umap_reducer_path: str,         # fitted UMAP reducer (.joblib) with .transform()
+    user_embedding_df: Optional[pd.DataFrame] = None,  # user 6 images embeddings dataframe (must have 'prompt' + emb_*)
+    user_embeddings: Optional[ArrayLike] = None,        # or: (N, D) user embedding matrix ...
+    user_classes: Optional[Sequence[str]] = None,       # ... with one class name per row
+
+    # columns
+    feature_cols: Optional[List[str]] = None,
+    input_class_col: str = "prompt",
+    bg_class_col: str = "class",
+    cluster_col: str = "cluster",
+
+    # sampling + smoothing
+    sample_size: int = 1,
+    random_state: Optional[int] = None,
+    normalize_class_space: bool = False,  # replace spaces with underscores to align categories
+    
+    # background reduction
+    max_background_samples_per_class: Optional[int] = None,  # e.g., 500 samples per class
+    background_sample_strategy: str = 'uniform',  # 'uniform' or 'stratified'
+
+    # scaling to match your "scale_x / scale_y" style
+    # Option A: learn from background if it already has scale_x/scale_y;
+    # Option B: specify offsets explicitly:
+    x_offset: Optional[float] = None,
+    x_scale: Optional[float] = None,
+    y_offset: Optional[float] = None,
+    y_scale: Optional[float] = None,
+
+    # seaborn styling
+    figsize: Tuple[float, float] = (10, 7),
+    fixed_palette: Optional[Dict[int, str]] = None,   # cluster -> color
+    background_size: int = 30,
+    background_alpha: float = 0.9,
+    user_marker: str = "^",
+    user_color: str = "black",
+    user_size: int = 120,
+    annotate: bool = True,     # e.g., {"soccer_ball":"足球", ...}
+    label_fontsize: int = 15,
+    label_dx: float = 0.02,
+    label_dy: float = 0.02,
+    font_path: Optional[str] = None,                  # e.g., NotoSansCJK .ttc
+
+    # output
+    output_path: Optional[str] = None,
+    redis_key: Optional[str] = None,
+    return_image: bool = False,  # return the PNG as image_base64 without storing it (caller stores it)
+    show: bool = False,
+    dpi: int = 200,
+    render_mode: str = "full",  # 'full' or 'layered' (cached background raster + user overlay)
+) -> Dict[str, Any]:
+    projected = project_user_umap(
+        raw_embedding_csv=raw_embedding_csv,
+        umap_background_csv=umap_background_csv,
+        umap_reducer_path=umap_reducer_path,
+        user_embedding_df=user_embedding_df,
+        user_embeddings=user_embeddings,
+        user_classes=user_classes,
+        feature_cols=feature_cols,
+        input_class_col=input_class_col,
+        bg_class_col=bg_class_col,
+        sample_size=sample_size,
+        random_state=random_state,
+        normalize_class_space=normalize_class_space,
+        max_background_samples_per_class=max_background_samples_per_class,
+        background_sample_strategy=background_sample_strategy,
+        x_offset=x_offset,
+        x_scale=x_scale,
+        y_offset=y_offset,
+        y_scale=y_scale,
+    )
+    mix_df_umap = projected["user_umap"]
+    skipped = projected["skipped_classes"]
+    use_scaled = projected["used_scaled"]
+    x_col, y_col = projected["x_col"], projected["y_col"]
+
+    # ---- palette ----
+    if fixed_palette is None:
+        fixed_palette = DEFAULT_CLUSTER_PALETTE
+
     # ---- font (optional) ----
     prop = None
     if font_path:
@@ -504,54 +1065,105 @@ def plot_umap_with_user(
             prop = None  # fail silently; fallback to default font
 
     # ----------- Create and setup the plot -----------
-    background_data = background_Umap if not use_scaled else background_Umap_plot
-    
-    # Create the plot with proper border handling
-    fig = create_plot_with_border(
-        background_data=background_data,
-        user_data=mix_df_umap,
-        x_col=x_col,
-        y_col=y_col,
-        cluster_col=cluster_col,
-        fixed_palette=fixed_palette,
-        figsize=figsize,
-        background_size=background_size,
-        background_alpha=background_alpha,
-        user_marker=user_marker,
-        user_color=user_color,
-        user_size=user_size,
-        title="我畫的圖與與訓練資料的 UMAP 分佈",
-        font_prop=prop
-    )
-    
-    # Get the current axes for text annotations
-    ax = fig.gca()
-    
-    # Add text annotations if requested
-    if annotate:
-        add_text_annotations(
-            ax=ax,
+    background_data = projected["background"]
+    title = UMAP_TITLE
+
+    # ---- layered mode: reuse the pre-rendered background ----
+    # Only for in-memory output, and only when the background sample is deterministic.
+    image_base64 = None
+    rendered = False
+    layer_cacheable = max_background_samples_per_class is None or random_state is not None
+    if render_mode == "layered" and (redis_key or return_image) and not output_path and not show and layer_cacheable:
+        layer_key = (
+            os.path.abspath(umap_background_csv), normalize_class_space,
+            max_background_samples_per_class, background_sample_strategy, random_state,
+            x_col, y_col, cluster_col, x_offset, x_scale, y_offset, y_scale,
+            tuple(sorted(fixed_palette.items())), tuple(figsize), dpi,
+            background_size, background_alpha, title, font_path,
+        )
+        layer = get_umap_background_layer(
+            layer_key,
+            background_data=background_data,
+            x_col=x_col,
+            y_col=y_col,
+            cluster_col=cluster_col,
+            fixed_palette=fixed_palette,
+            figsize=figsize,
+            dpi=dpi,
+            background_size=background_size,
+            background_alpha=background_alpha,
+            title=title,
+            font_prop=prop
+        )
+        image_bytes = render_user_on_layer(
+            layer,
             user_data=mix_df_umap,
             x_col=x_col,
             y_col=y_col,
+            user_marker=user_marker,
+            user_color=user_color,
+            user_size=user_size,
+            annotate=annotate,
             label_dx=label_dx,
             label_dy=label_dy,
             label_fontsize=label_fontsize,
             font_prop=prop
         )
+        if image_bytes is not None:
+            if redis_key:
+                image_base64 = store_png_to_redis(image_bytes, redis_key)
+            else:
+                image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+            rendered = True
 
-    # Save or show the plot
-    image_base64 = None
-    if redis_key:
-        image_base64 = save_plot_to_redis(fig, redis_key)
-    
-    if output_path:
-        save_plot_properly(fig, output_path)
+    if not rendered:
+        # Create the plot with proper border handling
+        fig = create_plot_with_border(
+            background_data=background_data,
+            user_data=mix_df_umap,
+            x_col=x_col,
+            y_col=y_col,
+            cluster_col=cluster_col,
+            fixed_palette=fixed_palette,
+            figsize=figsize,
+            background_size=background_size,
+            background_alpha=background_alpha,
+            user_marker=user_marker,
+            user_color=user_color,
+            user_size=user_size,
+            title=title,
+            font_prop=prop
+        )
+        
+        # Get the current axes for text annotations
+        ax = fig.gca()
+        
+        # Add text annotations if requested
+        if annotate:
+            add_text_annotations(
+                ax=ax,
+                user_data=mix_df_umap,
+                x_col=x_col,
+                y_col=y_col,
+                label_dx=label_dx,
+                label_dy=label_dy,
+                label_fontsize=label_fontsize,
+                font_prop=prop
+            )
 
-    if show:
-        plt.show()
-    else:
-        plt.close(fig)
+        # Save or show the plot
+        if redis_key:
+            image_base64 = save_plot_to_redis(fig, redis_key, dpi=dpi)
+        elif return_image:
+            image_base64 = base64.b64encode(encode_plot_png(fig, dpi=dpi)).decode('utf-8')
+        
+        if output_path:
+            save_plot_properly(fig, output_path, dpi=dpi)
+
+        if show:
+            plt.show()
+        else:
+            plt.close(fig)
 
     return {
         "user_umap": mix_df_umap,    # includes umap_x/umap_y and possibly scale_x/scale_y + label
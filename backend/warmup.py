@@ -0,0 +1,127 @@
+"""
+Warm-up run after startup, before a worker reports ready.
+
+The first prediction after boot pays TensorFlow graph tracing, the first UMAP
+projection pays numba JIT compilation in `reducer.transform`, and the first
+plot pays the matplotlib font scan and background layer render (the first
+similar-drawings query loads the background matrix). Warm-up pushes
+representative dummy inputs through each of these once, times every step in
+the startup report and then marks the worker ready (GET /api/ready).
+"""
+
+import time
+import asyncio
+from typing import Any, List, Tuple
+
+import numpy as np
+
+from config import NUM_ROUNDS
+from ml_utils import CLASSES
+from startup import StartupReport, startup_report
+from plotting_api import plotting_api, UMAP_ARTIFACT_PARAMS
+from render_pool import render_umap_job, render_radar_job
+
+_started = False
+
+
+def warm_model(model, embed_model) -> None:
+    """One predict call per model with a blank 28x28 drawing (traces the graph)."""
+    x = np.zeros((1, 28, 28, 1), dtype=np.float32)
+    if model is not None:
+        model.predict(x, verbose=0)
+    if embed_model is not None:
+        embed_model.predict(x, verbose=0)
+
+
+def sample_user_embeddings(num_points: int = NUM_ROUNDS) -> Tuple[np.ndarray, List[str]]:
+    """One background embedding for each of the first `num_points` classes, as a fake session."""
+    from umap_auto import load_background_embeddings
+
+    params = UMAP_ARTIFACT_PARAMS
+    background = load_background_embeddings(
+        params["raw_embedding_csv"],
+        feature_cols=params["feature_cols"],
+        bg_class_col=params["bg_class_col"],
+        normalize_class_space=params["normalize_class_space"],
+    )
+    classes = list(background["class_index"])[:num_points]
+    rows = [background["class_index"][c][0] for c in classes]
+    return background["matrix"][rows], classes
+
+
+def warm_projection(embeddings: np.ndarray, classes: List[str]) -> None:
+    """Sampling + smoothing + reducer.transform in the API process (data mode)."""
+    result = plotting_api.create_umap_data(
+        user_embeddings=embeddings,
+        user_prompts=classes,
+        session_id="warmup",
+    )
+    if result["status"] != "success":
+        raise RuntimeError(result["error"])
+
+
+async def warm_umap_render(embeddings: np.ndarray, classes: List[str]) -> None:
+    """Render a UMAP plot on every render worker (background layer, fonts, reducer)."""
+    pool = plotting_api.render_pool
+    params = plotting_api._umap_params(None, "warmup", 500, embeddings, classes, {})
+    await asyncio.gather(*[pool.run(render_umap_job, params) for _ in range(max(1, pool.size))])
+
+
+async def warm_radar_render(classes: List[str]) -> None:
+    """Render a radar chart on every render worker (figure template, fonts)."""
+    pool = plotting_api.render_pool
+    drawings = [{"prompt": c, "predictions": {c: 0.5}} for c in classes]
+    results = await asyncio.gather(*[pool.run(render_radar_job, drawings, {}) for _ in range(max(1, pool.size))])
+    for result in results:
+        if result["status"] != "success":
+            raise RuntimeError(result["error"])
+
+
+def warm_ann_index(embeddings: np.ndarray) -> None:
+    """First similar-drawings query (loads the background matrix; starts a large index build)."""
+    from ann_index import similar_drawings
+    similar_drawings(embeddings, k=5)
+
+
+async def _step(report: StartupReport, name: str, fn, *args) -> Any:
+    """
+    Run one warm-up step and return its result. A failure is logged and
+    recorded (result None) but does not stop the warm-up.
+    """
+    t0 = time.perf_counter()
+    result, error = None, None
+    try:
+        if asyncio.iscoroutinefunction(fn):
+            result = await fn(*args)
+        else:
+            # Blocking steps (TF predict, numba JIT) run off the event loop
+            result = await asyncio.to_thread(fn, *args)
+    except Exception as e:
+        error = str(e)
+    seconds = time.perf_counter() - t0
+    report.record(name, seconds, "warmup", error)
+    status = f"failed: {error}" if error else "done"
+    print(f"[Warmup] {name} {status} ({seconds:.3f}s)")
+    return result
+
+
+async def run_warmup(model, embed_model, report: StartupReport = startup_report) -> None:
+    """Warm the model, the UMAP projection and both renderers, then mark the worker ready."""
+    global _started
+    if _started:
+        return
+    _started = True
+    print("[Warmup] Starting warm-up...")
+    await _step(report, "model predict", warm_model, model, embed_model)
+
+    sample = await _step(report, "background sample", sample_user_embeddings)
+    if sample is not None:
+        embeddings, classes = sample
+        await _step(report, "umap projection", warm_projection, embeddings, classes)
+        await _step(report, "umap render", warm_umap_render, embeddings, classes)
+        await _step(report, "ann index", warm_ann_index, embeddings)
+
+    await _step(report, "radar render", warm_radar_render, CLASSES[:NUM_ROUNDS])
+
+    report.ready = True
+    report.log()
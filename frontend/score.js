@@ -24,10 +24,21 @@ async function fetchPlayerDrawings(sessionId) {
     }
 }
 
+// Smaller WebP plots on phones, full-size PNG elsewhere
+function plotOutputQuery() {
+    const isMobile = window.innerWidth <= 768;
+    const size = isMobile ? 'screen' : 'print';
+    const imageFormat = isMobile ? 'webp' : 'png';
+    return `size=${size}&image_format=${imageFormat}`;
+}
+
 async function fetchUMAPVisualization(sessionId) {
     try {
+        if (useClientUMAP()) {
+            return await fetchUMAPClientRendered(sessionId);
+        }
         console.log(`Fetching UMAP visualization for session: ${sessionId}`);
-        const response = await fetch(`http://localhost:8000/api/umap/${sessionId}`);
+        const response = await fetch(`http://localhost:8000/api/umap/${sessionId}?${plotOutputQuery()}`);
         
         if (!response.ok) {
             const errorText = await response.text();
@@ -44,10 +55,137 @@ async function fetchUMAPVisualization(sessionId) {
     }
 }
 
+// Client-side UMAP rendering (?umap=client): the server returns projected
+// coordinates and a packed background point cloud instead of a PNG.
+const UMAP_CANVAS_WIDTH = 2000;   // 10 x 7 inch at 200 dpi, same as the server PNG
+const UMAP_CANVAS_HEIGHT = 1400;
+const umapBackgroundCache = {};
+
+function useClientUMAP() {
+    return new URLSearchParams(window.location.search).get('umap') === 'client';
+}
+
+async function fetchUMAPBackground(url) {
+    if (!umapBackgroundCache[url]) {
+        umapBackgroundCache[url] = fetch(`http://localhost:8000${url}`).then(response => {
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            return response.arrayBuffer();
+        });
+    }
+    return umapBackgroundCache[url];
+}
+
+function unpackUMAPBackground(buffer) {
+    // float32 little-endian [x0, y0, x1, y1, ...] followed by one uint8 cluster code per point
+    const count = buffer.byteLength / 9;
+    const view = new DataView(buffer);
+    const xs = new Float32Array(count);
+    const ys = new Float32Array(count);
+    for (let i = 0; i < count; i++) {
+        xs[i] = view.getFloat32(i * 8, true);
+        ys[i] = view.getFloat32(i * 8 + 4, true);
+    }
+    const clusters = new Uint8Array(buffer, count * 8, count);
+    return { count, xs, ys, clusters };
+}
+
+function renderUMAPCanvas(umapData, background) {
+    const canvas = document.createElement('canvas');
+    canvas.width = UMAP_CANVAS_WIDTH;
+    canvas.height = UMAP_CANVAS_HEIGHT;
+    const ctx = canvas.getContext('2d');
+    const W = canvas.width, H = canvas.height;
+    const pt = 200 / 72;  // pixels per point at 200 dpi
+
+    ctx.fillStyle = 'white';
+    ctx.fillRect(0, 0, W, H);
+
+    // Axes area (matplotlib default subplot margins) and data -> pixel mapping
+    const left = 0.125 * W, right = 0.9 * W, top = 0.12 * H, bottom = 0.89 * H;
+    const [x0, y0, x1, y1] = umapData.background.bounds;
+    const px = x => left + (x - x0) / ((x1 - x0) || 1) * (right - left);
+    const py = y => bottom - (y - y0) / ((y1 - y0) || 1) * (bottom - top);
+
+    // Background points, coloured by cluster
+    const radius = Math.sqrt(30) / 2 * pt;
+    ctx.globalAlpha = 0.9;
+    ctx.lineWidth = 0.5 * pt;
+    ctx.strokeStyle = 'white';
+    for (let i = 0; i < background.count; i++) {
+        const code = background.clusters[i];
+        ctx.fillStyle = umapData.palette[String(code)] || '#999999';
+        ctx.beginPath();
+        ctx.arc(px(background.xs[i]), py(background.ys[i]), radius, 0, 2 * Math.PI);
+        ctx.fill();
+        ctx.stroke();
+    }
+    ctx.globalAlpha = 1;
+
+    // User points (triangles) and labels
+    const tri = Math.sqrt(120) / 2 * pt;
+    ctx.font = `${15 * pt}px sans-serif`;
+    ctx.textBaseline = 'bottom';
+    (umapData.points || []).forEach(p => {
+        const x = px(p.x), y = py(p.y);
+        ctx.fillStyle = 'black';
+        ctx.beginPath();
+        ctx.moveTo(x, y - tri);
+        ctx.lineTo(x + tri, y + tri);
+        ctx.lineTo(x - tri, y + tri);
+        ctx.closePath();
+        ctx.fill();
+
+        const label = p.label || toZh(p.class);
+        const lx = px(p.x + 0.02), ly = py(p.y + 0.02);
+        const pad = 2 * pt;
+        const width = ctx.measureText(label).width;
+        ctx.fillStyle = 'rgba(255, 255, 255, 0.8)';
+        ctx.strokeStyle = 'gray';
+        ctx.lineWidth = 0.5 * pt;
+        ctx.fillRect(lx - pad, ly - 15 * pt - pad, width + 2 * pad, 15 * pt + 2 * pad);
+        ctx.strokeRect(lx - pad, ly - 15 * pt - pad, width + 2 * pad, 15 * pt + 2 * pad);
+        ctx.fillStyle = 'black';
+        ctx.fillText(label, lx, ly);
+    });
+
+    // Title and border
+    ctx.fillStyle = 'black';
+    ctx.font = `bold ${17 * pt}px sans-serif`;
+    ctx.textAlign = 'center';
+    ctx.textBaseline = 'middle';
+    ctx.fillText(umapData.title || '', W / 2, 0.07 * H);
+    ctx.lineWidth = 3 * pt;
+    ctx.strokeStyle = 'black';
+    ctx.strokeRect(0.02 * W, 0.02 * H, 0.96 * W, 0.96 * H);
+
+    return canvas;
+}
+
+async function fetchUMAPClientRendered(sessionId) {
+    console.log(`Fetching UMAP data for client rendering: ${sessionId}`);
+    const response = await fetch(`http://localhost:8000/api/umap/${sessionId}?mode=data`);
+    if (!response.ok) {
+        const errorText = await response.text();
+        throw new Error(`HTTP error! status: ${response.status}, message: ${errorText}`);
+    }
+    const umapData = await response.json();
+    const background = unpackUMAPBackground(await fetchUMAPBackground(umapData.background.url));
+    const canvas = renderUMAPCanvas(umapData, background);
+
+    // Same shape as the server-rendered response, so populateUMAPVisualization is unchanged
+    return {
+        status: 'success',
+        image_base64: canvas.toDataURL('image/png').split(',')[1],
+        embeddings_count: umapData.embeddings_count,
+        skipped_classes: umapData.skipped_classes,
+        from_cache: false
+    };
+}
+
 async function fetchRadarChart(sessionId) {
     try {
         console.log(`Fetching radar chart for session: ${sessionId}`);
-        const response = await fetch(`http://localhost:8000/api/radar/${sessionId}`);
+        const response = await fetch(`http://localhost:8000/api/radar/${sessionId}?${plotOutputQuery()}`);
         
         if (!response.ok) {
             const errorText = await response.text();
@@ -67,7 +205,7 @@ async function fetchRadarChart(sessionId) {
 async function fetchBothPlots(sessionId) {
     try {
         console.log(`Fetching both plots for session: ${sessionId}`);
-        const response = await fetch(`http://localhost:8000/api/plots/${sessionId}`);
+        const response = await fetch(`http://localhost:8000/api/plots/${sessionId}?${plotOutputQuery()}`);
         
         if (!response.ok) {
             const errorText = await response.text();
@@ -250,7 +388,7 @@ function populateUMAPVisualization(umapData) {
             umapImage.style.display = 'none';
         };
         
-        umapImage.src = `data:image/png;base64,${umapData.image_base64}`;
+        umapImage.src = `data:${umapData.mime_type || 'image/png'};base64,${umapData.image_base64}`;
         
         // Show additional info if available
         if (umapData.embeddings_count) {
@@ -313,7 +451,7 @@ function populateRadarChart(radarData) {
             radarImage.style.display = 'none';
         };
         
-        radarImage.src = `data:image/png;base64,${radarData.image_base64}`;
+        radarImage.src = `data:${radarData.mime_type || 'image/png'};base64,${radarData.image_base64}`;
         
         // Show additional info if available
         if (radarData.drawings_count) {
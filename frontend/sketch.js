@@ -9,6 +9,9 @@ const TOP_SHOW = 3;
 const NUM_ROUNDS = 6;
 const BRUSH_WEIGHT = 10;
 const API_BASE = 'http://localhost:8000/api';
+const PREVIEW_DEFAULT_MS = 900;   // preview interval until the server advises one (next_poll_ms)
+const PREVIEW_MIN_MS = 300;
+const PREVIEW_MAX_MS = 5000;
 
 // ===== State =====
 let cnv;
@@ -23,6 +26,8 @@ let activeRounds = [];
 let activePrompts = [];
 let timerId = null;
 let previewId = null;
+let previewGeneration = 0;  // bumped by start/stopPreview: a late response of an older chain never re-arms
+let previewDelayMs = PREVIEW_DEFAULT_MS;
 let timeLeftMs = TIME_LIMIT_MS;
 let drawStartAt = 0;
 let locked = false;
@@ -136,7 +141,7 @@ function startDrawing() {
   const resEl = $('res'); if (resEl) resEl.innerHTML = '';
   updateTimer();
   if (timerId) clearInterval(timerId); timerId = setInterval(updateTimer, 100);
-  if (previewId) clearInterval(previewId); previewId = setInterval(previewPredict, 900);
+  startPreview();
   showView('view-draw');
 }
 
@@ -164,7 +169,29 @@ function getInputImageAsBase64() {
   return temp.toDataURL('image/png');
 }
 
-async function previewPredict() {
+// Previews follow the interval advised by the server instead of a fixed timer
+function startPreview() {
+  stopPreview(); schedulePreview(previewGeneration);
+}
+
+function stopPreview() {
+  previewGeneration++;
+  if (previewId) { clearTimeout(previewId); previewId = null; }
+}
+
+function schedulePreview(generation) {
+  previewId = setTimeout(async () => {
+    previewId = null;
+    await previewPredict(generation);
+    if (generation === previewGeneration && !locked) schedulePreview(generation);
+  }, previewDelayMs);
+}
+
+function adviseDelay(ms) {
+  if (Number.isFinite(ms)) previewDelayMs = Math.min(PREVIEW_MAX_MS, Math.max(PREVIEW_MIN_MS, ms));
+}
+
+async function previewPredict(generation) {
   if (locked) return; const resEl = $('res'); if (!resEl) return;
   try {
     const imageData = getInputImageAsBase64();
@@ -172,10 +199,13 @@ async function previewPredict() {
     const roundChoices = activeRounds[roundIdx] || [];
     const resp = await fetch(`${API_BASE}/predict-realtime`, {
       method: 'POST', headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ image_data: imageData, choices: roundChoices })
+      body: JSON.stringify({ image_data: imageData, choices: roundChoices, session_id: sessionId })
     });
-    if (!resp.ok) { resEl.innerHTML = '即時預覽：分析中...'; return; }
+    if (!resp.ok) { adviseDelay(previewDelayMs * 2); resEl.innerHTML = '即時預覽：分析中...'; return; }
     const result = await resp.json();
+    adviseDelay(result.next_poll_ms);
+    if (generation !== previewGeneration) return; // answered after the round moved on
+    if (result.skipped) return; // server busy or a newer frame replaced this one: keep the last preview
     if (result.success && result.predictions) {
       const sorted = Object.entries(result.predictions).map(([name,p])=>({name,p})).sort((a,b)=>b.p-a.p);
       const top3 = sorted.slice(0,3);
@@ -184,6 +214,7 @@ async function previewPredict() {
       resEl.innerHTML = '即時預覽：分析中...';
     }
   } catch (e) {
+    adviseDelay(previewDelayMs * 2);
     console.error(e); resEl.innerHTML = '即時預覽：繪圖中...';
   }
 }
@@ -194,7 +225,7 @@ function getOriginalCanvasAsBase64() {
 }
 
 async function submitAnswer() {
-  if (previewId) { clearInterval(previewId); previewId = null; }
+  stopPreview();
   if (timerId) { clearInterval(timerId); timerId = null; }
 
   const spentSec = Math.max(0, (Date.now() - drawStartAt) / 1000);
@@ -271,8 +302,8 @@ async function openResultsPage() {
 // ===== Restart =====
 window.restartGame = function restartGame() {
   try { if (timerId) clearInterval(timerId); } catch(_){}
-  try { if (previewId) clearInterval(previewId); } catch(_){}
-  timerId = null; previewId = null; locked = false; timeLeftMs = TIME_LIMIT_MS; roundIdx = 0; currentPrompt = '';
+  stopPreview();
+  timerId = null; locked = false; timeLeftMs = TIME_LIMIT_MS; roundIdx = 0; currentPrompt = '';
   if (typeof background === 'function') background(255);
   const resEl = $('res'); if (resEl) resEl.innerHTML = '';
   const tu = $('timeUpMsg'); if (tu) tu.style.display = 'none';